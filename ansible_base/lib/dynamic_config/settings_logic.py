@@ -196,6 +196,49 @@ def get_dab_settings(
         # A value of False would result in more errors but be more conservative
         dab_data['ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS'] = True
 
+        # How to compute role evaluation changes, "python" compares entries in memory
+        # while "sql" has the database compare entries with INSERT ... SELECT and DELETE statements
+        # which avoids loading all child objects of a role, like all inventories in an organization
+        dab_data['ANSIBLE_BASE_EVALUATIONS_ENGINE'] = 'python'
+
+        # How role evaluations are saved for permissions to child objects, like inventories for an organization role
+        # "object" saves an entry for every child object, so evaluations are simple lookups
+        # "parent" saves one entry for the role object, and evaluations join child objects to their parent objects
+        # which avoids saving entries when child objects are created, run rebuild_rbac_evaluations after changing this
+        dab_data['ANSIBLE_BASE_EVALUATIONS_STORAGE'] = 'object'
+
+        # Role evaluations save both the permission codename and the integer permission id
+        # set this to filter evaluations by permission id, which uses smaller indexes than the codename
+        dab_data['ANSIBLE_BASE_EVALUATIONS_USE_PERMISSION_ID'] = False
+
+        # Also save role evaluations in a table with an entry for each user, instead of each role
+        # evaluations for users then use a single index lookup, without joining to their roles
+        # this takes more space and time to update, run rebuild_rbac_evaluations after enabling this
+        dab_data['ANSIBLE_BASE_EVALUATIONS_PER_USER'] = False
+
+        # How access_qs filters objects, "in" uses pk IN (distinct object ids from evaluations)
+        # while "exists" uses a correlated EXISTS subquery for each object, which avoids the DISTINCT
+        # the _BY_MODEL setting can give a different value for some models, like {"myapp.mymodel": "exists"}
+        dab_data['ANSIBLE_BASE_ACCESS_QS_STRATEGY'] = 'in'
+        dab_data['ANSIBLE_BASE_ACCESS_QS_STRATEGY_BY_MODEL'] = {}
+
+        # When to update role evaluations after changes to roles, teams, or parent objects
+        # "sync" does the updates in the same request that made the change
+        # "async" saves needed updates to an outbox table, and the process_rbac_outbox command does the updates
+        # permission checks for a user will still do any pending updates related to that user first
+        dab_data['ANSIBLE_BASE_RBAC_UPDATE_MODE'] = 'sync'
+
+        # Recomputes of role evaluations and team membership that take at least this many seconds are logged as warnings
+        # with what caused them, None to not log them, the rbac_recompute_finished signal is sent for every recompute
+        dab_data['ANSIBLE_BASE_RBAC_SLOW_RECOMPUTE_SECONDS'] = 5.0
+        # Keep totals of recomputes in each process, and give them in the Prometheus text format at the rbac_metrics endpoint
+        dab_data['ANSIBLE_BASE_RBAC_METRICS'] = False
+
+        # Name of a Django cache, shared by all processes, to save the roles and global permissions of users
+        # this avoids those queries for each request, None to query the database every request
+        dab_data['ANSIBLE_BASE_RBAC_CACHE_NAME'] = None
+        dab_data['ANSIBLE_BASE_RBAC_CACHE_TIMEOUT_SECONDS'] = 3600
+
         # User flags that can grant permission before consulting roles
         dab_data['ANSIBLE_BASE_BYPASS_SUPERUSER_FLAGS'] = ['is_superuser']
         dab_data['ANSIBLE_BASE_BYPASS_ACTION_FLAGS'] = {}
@@ -1,5 +1,10 @@
+from ansible_base.rbac.batch import rbac_batch
+from ansible_base.rbac.bulk import bulk_objects_created, bulk_parent_changed
 from ansible_base.rbac.permission_registry import permission_registry
 
 __all__ = [
+    'bulk_objects_created',
+    'bulk_parent_changed',
     'permission_registry',
+    'rbac_batch',
 ]
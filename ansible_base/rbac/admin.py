@@ -1,7 +1,16 @@
 from django.contrib import admin
 
 from ansible_base.lib.admin import ReadOnlyAdmin
-from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleTeamAssignment, RoleUserAssignment
+from ansible_base.rbac.models import (
+    ObjectRole,
+    PendingRoleUpdate,
+    RoleDefinition,
+    RoleEvaluation,
+    RoleTeamAssignment,
+    RoleUserAssignment,
+    TeamAncestor,
+    UserObjectPermission,
+)
 
 admin.site.register(RoleDefinition)
 # TODO: assignments will still not be functional in the admin pages without custom logic
@@ -9,3 +18,6 @@ admin.site.register(RoleUserAssignment)
 admin.site.register(RoleTeamAssignment)
 admin.site.register(ObjectRole, ReadOnlyAdmin)
 admin.site.register(RoleEvaluation, ReadOnlyAdmin)
+admin.site.register(TeamAncestor, ReadOnlyAdmin)
+admin.site.register(PendingRoleUpdate, ReadOnlyAdmin)
+admin.site.register(UserObjectPermission, ReadOnlyAdmin)
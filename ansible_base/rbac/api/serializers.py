@@ -258,7 +258,7 @@ class BaseAssignmentSerializer(CommonModelSerializer):
             if not obj:
                 raise ValidationError({'object_id': _('Object must be specified for this role assignment')})
 
-            check_content_obj_permission(requesting_user, obj)
+            check_content_obj_permission(requesting_user, obj, obj_permission_cache=self.context.get('obj_permission_cache'))
 
             try:
                 with transaction.atomic():
@@ -325,5 +325,13 @@ class RoleTeamAssignmentSerializer(BaseAssignmentSerializer):
         return permission_registry.team_model.access_qs(requesting_user)
 
 
+class BulkAssignmentSerializer(serializers.Serializer):
+    assignments = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        help_text=_('List of assignments, each with the same fields used to create a single assignment.'),
+    )
+
+
 class RoleMetadataSerializer(serializers.Serializer):
     allowed_permissions = serializers.DictField(help_text=_('List of permissions allowed for a role definition, given its content type.'))
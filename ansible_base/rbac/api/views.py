@@ -1,37 +1,68 @@
+import hashlib
+import json
+import time
 from collections import OrderedDict
-from typing import Type
+from functools import lru_cache
 
-from django.db import transaction
-from django.db.models import Model
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.utils.translation import gettext_lazy as _
-from rest_framework import permissions
-from rest_framework.exceptions import ValidationError
+from rest_framework import permissions, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, NotFound, PermissionDenied, ValidationError
 from rest_framework.generics import GenericAPIView
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
 
 from ansible_base.lib.utils.views.django_app_api import AnsibleBaseDjangoAppApiView
+from ansible_base.rbac import rbac_batch
 from ansible_base.rbac.api.permissions import RoleDefinitionPermissions
 from ansible_base.rbac.api.serializers import (
+    BulkAssignmentSerializer,
     RoleDefinitionDetailSerializer,
     RoleDefinitionSerializer,
     RoleMetadataSerializer,
     RoleTeamAssignmentSerializer,
     RoleUserAssignmentSerializer,
 )
+from ansible_base.rbac.batch import discard_batch_updates_on_error
 from ansible_base.rbac.evaluations import has_super_permission
+from ansible_base.rbac.instrumentation import recompute_metrics
 from ansible_base.rbac.models import RoleDefinition
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.policies import check_can_remove_assignment
-from ansible_base.rbac.validators import check_locally_managed, permissions_allowed_for_role, system_roles_enabled
+from ansible_base.rbac.validators import check_locally_managed, system_roles_enabled
 
 
-def list_combine_values(data: dict[Type[Model], list[str]]) -> list[str]:
-    "Utility method to merge everything in .values() into a single list"
-    ret = []
-    for this_list in data.values():
-        ret += this_list
-    return ret
+@lru_cache(maxsize=None)
+def get_role_metadata(include_system: bool) -> tuple[dict, str, int]:
+    """Returns the allowed_permissions data for RoleMetadataView, with its ETag and the time it was made
+
+    This only depends on the registered models and settings, so it is made once per process
+    for each value of whether system roles are enabled
+    """
+    allowed_permissions = OrderedDict()
+
+    role_model_types = [(cls._meta.model_name, cls) for cls in sorted(permission_registry.all_registered_models, key=lambda cls: cls._meta.model_name)]
+    if include_system:
+        role_model_types.append((None, None))
+    for model_name, cls in role_model_types:
+        if cls is None:
+            cls_repr = 'system'
+        else:
+            cls_repr = f"{permission_registry.get_resource_prefix(cls)}.{model_name}"
+        allowed_permissions[cls_repr] = []
+        for perm_cls, codenames in permission_registry.index.role_permissions[model_name].items():
+            prefix = permission_registry.get_resource_prefix(perm_cls)
+            allowed_permissions[cls_repr].extend(f"{prefix}.{codename}" for codename in codenames)
+
+    data = OrderedDict(allowed_permissions=allowed_permissions)
+    etag = quote_etag(hashlib.sha256(json.dumps(data).encode()).hexdigest())
+    return data, etag, int(time.time())
 
 
 class RoleMetadataView(AnsibleBaseDjangoAppApiView, GenericAPIView):
@@ -40,6 +71,7 @@ class RoleMetadataView(AnsibleBaseDjangoAppApiView, GenericAPIView):
     Information from this endpoint should be static given a server version.
     This reflects model definitions, registrations with the permission registry,
     and enablement of RBAC features in settings.
+    Responses have ETag and Last-Modified headers, so clients can revalidate their copy.
 
     allowed_permissions: Valid permissions for a role of a given content_type
     """
@@ -48,31 +80,35 @@ class RoleMetadataView(AnsibleBaseDjangoAppApiView, GenericAPIView):
     serializer_class = RoleMetadataSerializer
 
     def get(self, request, format=None):
-        data = OrderedDict()
-        allowed_permissions = OrderedDict()
+        data, etag, last_modified = get_role_metadata(system_roles_enabled())
 
-        all_models = sorted(permission_registry.all_registered_models, key=lambda cls: cls._meta.model_name)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            serializer = self.get_serializer(data)
+            response = Response(serializer.data)
 
-        role_model_types = list(all_models)
-        if system_roles_enabled():
-            role_model_types += [None]
-        for cls in role_model_types:
-            if cls is None:
-                cls_repr = 'system'
-            else:
-                cls_repr = f"{permission_registry.get_resource_prefix(cls)}.{cls._meta.model_name}"
-            allowed_permissions[cls_repr] = []
-            for codename in list_combine_values(permissions_allowed_for_role(cls)):
-                perm = permission_registry.permission_qs.get(codename=codename)
-                ct = permission_registry.content_type_model.objects.get_for_id(perm.content_type_id)
-                perm_repr = f"{permission_registry.get_resource_prefix(ct.model_class())}.{codename}"
-                allowed_permissions[cls_repr].append(perm_repr)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
-        data['allowed_permissions'] = allowed_permissions
 
-        serializer = self.get_serializer(data)
+class RBACMetricsView(AnsibleBaseDjangoAppApiView, APIView):
+    """Totals of RBAC recomputes in this server process, in the Prometheus text format
 
-        return Response(serializer.data)
+    Only available to superusers, and if ANSIBLE_BASE_RBAC_METRICS is enabled.
+    Each process keeps its own totals, so a scrape reflects the process that answered it.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    schema = None
+
+    def get(self, request, format=None):
+        if not settings.ANSIBLE_BASE_RBAC_METRICS:
+            raise NotFound(_('RBAC metrics are not enabled'))
+        if not has_super_permission(request.user):
+            raise PermissionDenied
+        return HttpResponse(recompute_metrics.prometheus_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 class RoleDefinitionViewSet(AnsibleBaseDjangoAppApiView, ModelViewSet):
@@ -116,6 +152,8 @@ class BaseAssignmentViewSet(AnsibleBaseDjangoAppApiView, ModelViewSet):
     # PUT and PATCH are not allowed because these are immutable
     http_method_names = ['get', 'post', 'head', 'options', 'delete']
     prefetch_related = ()
+    # set for bulk actions, so that permission to each object is only checked once
+    obj_permission_cache = None
 
     def get_queryset(self):
         model = self.serializer_class.Meta.model
@@ -129,11 +167,22 @@ class BaseAssignmentViewSet(AnsibleBaseDjangoAppApiView, ModelViewSet):
             new_qs = model.visible_items(self.request.user, qs)
         return super().filter_queryset(new_qs)
 
+    def get_serializer_class(self):
+        if self.action in ('bulk_create', 'bulk_delete'):
+            return BulkAssignmentSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.obj_permission_cache is not None:
+            context['obj_permission_cache'] = self.obj_permission_cache
+        return context
+
     def perform_create(self, serializer):
         return super().perform_create(serializer)
 
     def perform_destroy(self, instance):
-        check_can_remove_assignment(self.request.user, instance)
+        check_can_remove_assignment(self.request.user, instance, obj_permission_cache=self.obj_permission_cache)
         check_locally_managed(instance.role_definition.permissions.prefetch_related('content_type'), role_content_type=instance.content_type)
 
         if instance.content_type_id:
@@ -143,6 +192,68 @@ class BaseAssignmentViewSet(AnsibleBaseDjangoAppApiView, ModelViewSet):
             with transaction.atomic():
                 instance.role_definition.remove_global_permission(instance.actor)
 
+    def get_bulk_item_instance(self, item_serializer):
+        "Find the existing assignment for the actor, role definition, and object given to a bulk delete"
+        validated_data = item_serializer.validated_data
+        requesting_user = self.request.user
+        rd = validated_data['role_definition']
+        actor = item_serializer.get_actor_from_data(validated_data, requesting_user)
+        obj = item_serializer.get_object_from_data(validated_data, rd, requesting_user)
+        filter_kwargs = {'role_definition': rd, item_serializer.actor_field: actor}
+        if obj is None:
+            filter_kwargs['object_id'] = None
+        else:
+            # object_id is saved in its database form, which for UUIDs has no "-" chars, same as give_or_remove_permission
+            filter_kwargs['object_id'] = obj._meta.pk.get_db_prep_value(obj.pk, connection)
+            filter_kwargs['content_type_id'] = permission_registry.content_type_id(obj)
+        instance = self.filter_queryset(self.get_queryset()).filter(**filter_kwargs).first()
+        if instance is None:
+            raise ValidationError(_('Assignment does not exist'))
+        return instance
+
+    def process_bulk_item(self, item, delete=False) -> dict:
+        item_serializer = self.serializer_class(data=item, context=self.get_serializer_context())
+        try:
+            # savepoint, so that one failed item does not undo the others
+            with discard_batch_updates_on_error(), transaction.atomic():
+                item_serializer.is_valid(raise_exception=True)
+                if delete:
+                    self.perform_destroy(self.get_bulk_item_instance(item_serializer))
+                    return {'status': status.HTTP_204_NO_CONTENT}
+                self.perform_create(item_serializer)
+                return {'status': status.HTTP_201_CREATED, 'data': item_serializer.data}
+        except APIException as exc:
+            return {'status': exc.status_code, 'errors': exc.detail}
+
+    def process_bulk_request(self, request, delete=False) -> Response:
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        self.obj_permission_cache = {}
+        results = []
+        with transaction.atomic():
+            # RoleEvaluation entries are updated once for all of the assignments
+            with rbac_batch():
+                for item in serializer.validated_data['assignments']:
+                    results.append(self.process_bulk_item(item, delete=delete))
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def bulk_create(self, request, **kwargs):
+        """
+        Create many assignments in one request, with a result given for each item.
+        Each item in assignments takes the same fields as creating a single assignment.
+        """
+        return self.process_bulk_request(request)
+
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request, **kwargs):
+        """
+        Remove many assignments in one request, with a result given for each item.
+        Items identify the assignment by the actor, role_definition, and object_id fields.
+        """
+        return self.process_bulk_request(request, delete=True)
+
 
 class RoleTeamAssignmentViewSet(BaseAssignmentViewSet):
     """
@@ -0,0 +1,182 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+from ansible_base.rbac.instrumentation import recompute_trigger
+
+logger = logging.getLogger('ansible_base.rbac.batch')
+
+
+"""
+Role assignments normally recompute the RoleEvaluation and team membership data
+as soon as they are made, which is wasteful when many assignments are made in a loop.
+Inside of rbac_batch, the updates that each assignment needs are collected, and
+then done all at once when the outermost rbac_batch exits.
+
+Permission checks made inside of the batch will not reflect assignments made in the batch.
+"""
+
+
+def apply_updates(update_teams=(), to_update=(), team_ids=(), user_ids=()) -> None:
+    """
+    Does the team membership and RoleEvaluation updates that triggers have found to be needed
+    update_teams - object roles that changed team membership, or True to update all teams
+    to_update - object roles whose evaluations need to be updated
+    team_ids - ids of teams whose own membership roles may have changed
+    user_ids - ids of users whose per-user evaluations need to be updated, like after losing a role
+    """
+    from ansible_base.rbac.caching import (
+        compute_object_role_permissions,
+        compute_team_member_roles,
+        compute_user_object_permissions,
+        get_descendent_teams,
+        get_teams_for_roles,
+    )
+    from ansible_base.rbac.models import ObjectRole
+
+    to_update = set(to_update)
+    if update_teams or team_ids:
+        # The roles to update may have been found using team membership from before other changes
+        # so roles giving membership to any affected team, before or after, are also updated
+        if update_teams is True:
+            team_roles_qs = ObjectRole.objects.filter(provides_teams__isnull=False)
+        else:
+            affected_team_ids = get_descendent_teams(get_teams_for_roles(update_teams) | set(team_ids))
+            team_roles_qs = ObjectRole.objects.filter(provides_teams__in=affected_team_ids)
+        to_update.update(team_roles_qs.distinct())
+        if update_teams is True:
+            compute_team_member_roles()
+        else:
+            compute_team_member_roles(object_roles=update_teams, team_ids=team_ids)
+        to_update.update(team_roles_qs.distinct())
+
+    if to_update:
+        compute_object_role_permissions(object_roles=to_update)
+    if user_ids:
+        compute_user_object_permissions(user_ids=set(user_ids))
+
+
+def async_updates_enabled() -> bool:
+    return settings.ANSIBLE_BASE_RBAC_UPDATE_MODE == 'async'
+
+
+def run_updates(update_teams=(), to_update=(), team_ids=(), user_ids=()) -> None:
+    "Same as apply_updates, but only saves the updates to the outbox if async updates are enabled"
+    if async_updates_enabled():
+        from ansible_base.rbac.outbox import enqueue_updates
+
+        enqueue_updates(update_teams=update_teams, to_update=to_update, team_ids=team_ids, user_ids=user_ids)
+    else:
+        apply_updates(update_teams=update_teams, to_update=to_update, team_ids=team_ids, user_ids=user_ids)
+
+
+class PendingRBACUpdates(threading.local):
+    def __init__(self):
+        self.depth = 0
+        self.reset()
+
+    def reset(self):
+        self.update_teams = set()
+        self.to_update = set()
+        self.team_ids = set()
+        self.user_ids = set()
+
+    def add(self, update_teams=(), to_update=(), team_ids=(), user_ids=()) -> None:
+        "Accepts the same arguments as apply_updates"
+        if update_teams is True:
+            self.update_teams = True
+        elif update_teams and self.update_teams is not True:
+            self.update_teams.update(update_teams)
+        self.to_update.update(to_update)
+        self.team_ids.update(team_ids)
+        self.user_ids.update(user_ids)
+
+    def snapshot(self) -> tuple:
+        update_teams = True if self.update_teams is True else set(self.update_teams)
+        return (update_teams, set(self.to_update), set(self.team_ids), set(self.user_ids))
+
+    def restore(self, snapshot: tuple) -> None:
+        self.update_teams, self.to_update, self.team_ids, self.user_ids = snapshot
+
+    @recompute_trigger('batch')
+    def apply(self) -> None:
+        update_teams, to_update, team_ids, user_ids = self.update_teams, set(self.to_update), set(self.team_ids), set(self.user_ids)
+        self.reset()
+        if to_update:
+            from ansible_base.rbac.caching import batched_object_roles
+            from ansible_base.rbac.models import ObjectRole
+
+            # object roles may have been deleted by later changes in the batch, and have nothing to update
+            existing_roles = set()
+            for role_batch in batched_object_roles(to_update):
+                existing_roles.update(ObjectRole.objects.filter(pk__in=[object_role.pk for object_role in role_batch]))
+            to_update = existing_roles
+        logger.debug(f'Applying batched RBAC updates for {len(to_update)} object roles')
+        run_updates(update_teams=update_teams, to_update=to_update, team_ids=team_ids, user_ids=user_ids)
+
+
+pending_updates = PendingRBACUpdates()
+
+
+def defer_updates(update_teams=(), to_update=(), team_ids=(), user_ids=()) -> bool:
+    """
+    Called from triggers, if an rbac_batch is active or async updates are enabled this saves the updates
+    for later and returns True, otherwise returns False and the caller should do the updates now
+    """
+    if pending_updates.depth:
+        pending_updates.add(update_teams=update_teams, to_update=to_update, team_ids=team_ids, user_ids=user_ids)
+        return True
+    elif async_updates_enabled():
+        from ansible_base.rbac.outbox import enqueue_updates
+
+        enqueue_updates(update_teams=update_teams, to_update=to_update, team_ids=team_ids, user_ids=user_ids)
+        return True
+    return False
+
+
+@contextmanager
+def rbac_batch():
+    """
+    Context manager to do RBAC computations once for all role assignments made inside of it
+
+    with rbac_batch():
+        for user in users:
+            rd.give_permission(user, organization)
+
+    These can be nested, in which case the updates are done when the outermost one exits.
+    If an exception is raised, updates are still done unless the database transaction is broken,
+    in which case the changes from the assignments will be rolled back anyway.
+    """
+    pending_updates.depth += 1
+    try:
+        yield
+    except Exception:
+        pending_updates.depth -= 1
+        if pending_updates.depth == 0:
+            if transaction.get_connection().needs_rollback:
+                logger.info('Discarding batched RBAC updates because the transaction will be rolled back')
+                pending_updates.reset()
+            else:
+                pending_updates.apply()
+        raise
+    else:
+        pending_updates.depth -= 1
+        if pending_updates.depth == 0:
+            pending_updates.apply()
+
+
+@contextmanager
+def discard_batch_updates_on_error():
+    """
+    Use around a savepoint inside of rbac_batch, so that if the savepoint is rolled back by an exception,
+    the updates saved by the assignments that were rolled back are discarded too
+    """
+    snapshot = pending_updates.snapshot()
+    try:
+        yield
+    except Exception:
+        pending_updates.restore(snapshot)
+        raise
@@ -0,0 +1,126 @@
+import logging
+from functools import reduce
+from operator import or_
+from typing import Iterable, Optional, Type
+
+from django.db.models import Model, Q
+
+from ansible_base.rbac.batch import apply_updates, defer_updates
+from ansible_base.rbac.instrumentation import recompute_trigger
+from ansible_base.rbac.permission_registry import permission_registry
+
+logger = logging.getLogger('ansible_base.rbac.bulk')
+
+
+"""
+Objects made with bulk_create, or moved to another parent with bulk_update or QuerySet.update,
+do not send the post_save signal that RBAC uses to give them permissions from roles of their parent objects.
+After doing that, call bulk_objects_created or bulk_parent_changed with the objects,
+which finds the affected object roles with one query for all of the objects and updates them together.
+"""
+
+
+def get_parent_gfks(model: Type[Model], parent_ids: set) -> list[tuple[int, set]]:
+    """Returns content type id and object ids for parent objects of the given ids, and their parents, and so on
+
+    parent_ids are values of the parent field of model, like organization ids for inventories
+    """
+    gfks = []
+    seen = {model._meta.model_name}
+    parent_ids = {parent_id for parent_id in parent_ids if parent_id is not None}
+    while parent_ids and (parent_field_name := permission_registry.get_parent_fd_name(model)):
+        model = model._meta.get_field(parent_field_name).related_model
+        if model._meta.model_name in seen:
+            break
+        seen.add(model._meta.model_name)
+        gfks.append((permission_registry.content_type_id(model), parent_ids))
+
+        next_field_name = permission_registry.get_parent_fd_name(model)
+        if next_field_name is None:
+            break
+        parent_ids = set(model.objects.filter(pk__in=parent_ids, **{f'{next_field_name}__isnull': False}).values_list(f'{next_field_name}_id', flat=True))
+    return gfks
+
+
+def get_parent_object_roles(model: Type[Model], parent_ids: set) -> set:
+    "Returns object roles whose evaluations include objects of model with the given parent ids"
+    from ansible_base.rbac.models import ObjectRole
+
+    gfks = get_parent_gfks(model, parent_ids)
+    if not gfks:
+        return set()
+
+    q_filter = reduce(or_, [Q(content_type_id=ct_id, object_id__in=[str(object_id) for object_id in object_ids]) for ct_id, object_ids in gfks])
+    to_update = set(ObjectRole.objects.filter(q_filter))
+    if to_update:
+        # Account for parent team roles of those organization roles
+        to_update.update(ObjectRole.objects.filter(provides_teams__has_roles__in=to_update))
+    return to_update
+
+
+@recompute_trigger('parent_change')
+def update_for_parents(model: Type[Model], objs: list[Model], parent_ids: set) -> None:
+    "Shared logic of the bulk methods, parent_ids are all parents the objects have now or had before"
+    from ansible_base.rbac.evaluations import invalidate_evaluation_caches
+    from ansible_base.rbac.models import parent_evaluations_enabled
+
+    invalidate_evaluation_caches()
+    is_team = bool(model._meta.model_name == permission_registry.team_model._meta.model_name)
+    if parent_evaluations_enabled() and not is_team:
+        # Evaluations are only saved for parent objects, and child objects are joined to them when evaluating
+        to_update = set()
+    else:
+        to_update = get_parent_object_roles(model, parent_ids)
+
+    # teams changing organization changes which organization roles give membership to them
+    team_ids = [obj.pk for obj in objs] if is_team else []
+
+    logger.debug(f'Updating {len(to_update)} object roles for {len(objs)} {model._meta.model_name} objects')
+    if not defer_updates(to_update=to_update, team_ids=team_ids):
+        apply_updates(to_update=to_update, team_ids=team_ids)
+
+
+def check_bulk_objects(model: Type[Model], objs: Iterable[Model]) -> list[Model]:
+    objs = list(objs)
+    if not permission_registry.is_registered(model):
+        raise ValueError(f'Model {model._meta.model_name} is not registered with the permission registry')
+    if any(obj.pk is None for obj in objs):
+        raise ValueError('Objects must be saved and have primary keys set')
+    return objs
+
+
+def bulk_objects_created(model: Type[Model], objs: Iterable[Model]) -> None:
+    """Gives objects made without saving them one by one, like with bulk_create, permissions from roles of their parent objects
+
+    objs = Inventory.objects.bulk_create([Inventory(name=name, organization=org) for name in names])
+    bulk_objects_created(Inventory, objs)
+    """
+    objs = check_bulk_objects(model, objs)
+    parent_field_name = permission_registry.get_parent_fd_name(model)
+    if parent_field_name is None or not objs:
+        return
+    update_for_parents(model, objs, {getattr(obj, f'{parent_field_name}_id') for obj in objs})
+
+
+def bulk_parent_changed(model: Type[Model], objs: Iterable[Model], old_parent_ids: Optional[Iterable] = None) -> None:
+    """Updates permissions for objects moved to another parent without saving them one by one, like with bulk_update
+
+    old_parent_ids are the ids of the parents the objects had before. If not given, the parent ids the objects
+    had when they were loaded from the database are used, which works for objects changed and then passed to bulk_update.
+    If QuerySet.update was used, pass the previous parent ids and objects with the new parent ids.
+    """
+    objs = check_bulk_objects(model, objs)
+    parent_field_name = permission_registry.get_parent_fd_name(model)
+    if parent_field_name is None or not objs:
+        return
+
+    parent_ids = {getattr(obj, f'{parent_field_name}_id') for obj in objs}
+    if old_parent_ids is not None:
+        parent_ids.update(old_parent_ids)
+    for obj in objs:
+        if hasattr(obj, '__rbac_original_parent_id'):
+            if old_parent_ids is None:
+                parent_ids.add(getattr(obj, '__rbac_original_parent_id'))
+            # these are saved, so the old parent should not be used by later saves of the object
+            delattr(obj, '__rbac_original_parent_id')
+    update_for_parents(model, objs, parent_ids)
@@ -1,16 +1,38 @@
 import logging
 from collections import defaultdict
+from itertools import islice
 from typing import Optional
 from uuid import UUID
 
 from django.conf import settings
+from django.db.models import Q
 
-from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID
+from ansible_base.rbac.evaluations import invalidate_evaluation_caches
+from ansible_base.rbac.instrumentation import RecomputeStats, instrument_recompute
+from ansible_base.rbac.models import (
+    ObjectRole,
+    RoleDefinition,
+    RoleEvaluation,
+    RoleEvaluationUUID,
+    RoleUserAssignment,
+    TeamAncestor,
+    UserObjectPermission,
+    UserObjectPermissionUUID,
+    user_evaluations_enabled,
+)
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.prefetch import TypesPrefetch
+from ansible_base.rbac.role_cache import rbac_data_changed
+from ansible_base.rbac.sql_engine import compute_object_role_permissions_sql
 
 logger = logging.getLogger('ansible_base.rbac.caching')
 
+# Number of object roles to prefetch related data for at once when computing evaluations
+EVALUATION_BATCH_SIZE = 500
+# Number of users to load evaluations for at once when computing per-user evaluations
+USER_EVALUATION_BATCH_SIZE = 100
+EVALUATION_PREFETCH = ('permission_partials', 'permission_partials_uuid', 'provides_teams__has_roles')
+
 
 """
 This module has callable methods to fill in things marked with COMPUTED DATA in the models
@@ -24,27 +46,42 @@ Those methods are what truly dictate the object-role to object-permission transl
 """
 
 
-def all_team_parents(team_id: int, team_team_parents: dict, seen: Optional[set] = None) -> set[int]:
+def get_team_ancestors(team_id: int, team_team_parents: dict, known_ancestors: Optional[dict] = None) -> dict[int, int]:
     """
     Returns parent teams, and parent teams of parent teams, until we have them all
-        {parent_team_id, parent_team_id, ...}
+    along with the smallest number of membership links to get to that parent
+        {ancestor_team_id: depth, ancestor_team_id: depth, ...}
 
     team_id: id of the team we want to get the direct and indirect parents of
     team_team_parents: mapping of team id to ids of its parents, this is not modified by this method
-    seen: mutable set that will be added to by each call so that we can not recurse infinitely
-    """
-    parent_team_ids = set()
-    if seen is None:
-        seen = set()
-    for parent_id in team_team_parents.get(team_id, []):
-        if parent_id in seen:
-            # will be combined in a lower level of the call stack
-            # this condition prevents infinite recursion in the event of loops in the graph
-            continue
-        parent_team_ids.add(parent_id)
-        seen.add(parent_id)
-        parent_team_ids.update(all_team_parents(parent_id, team_team_parents, seen=seen))
-    return parent_team_ids
+    known_ancestors: mapping of team id to its ancestors in the same format as the return value,
+        for teams whose ancestors are already known and do not need to be walked in team_team_parents
+    """
+    ancestors = {}
+
+    def add_ancestor(ancestor_id, depth):
+        if ancestor_id not in ancestors or depth < ancestors[ancestor_id]:
+            ancestors[ancestor_id] = depth
+
+    # breadth-first, so the first time we walk to a team we have the shortest path to it
+    # only walking to each team once prevents infinite loops in the event of loops in the graph
+    walked = {team_id}
+    frontier = [team_id]
+    depth = 0
+    while frontier:
+        depth += 1
+        next_frontier = []
+        for child_id in frontier:
+            for parent_id in team_team_parents.get(child_id, []):
+                add_ancestor(parent_id, depth)
+                if known_ancestors is not None and parent_id in known_ancestors:
+                    for ancestor_id, ancestor_depth in known_ancestors[parent_id].items():
+                        add_ancestor(ancestor_id, ancestor_depth + depth)
+                elif parent_id not in walked:
+                    walked.add(parent_id)
+                    next_frontier.append(parent_id)
+        frontier = next_frontier
+    return ancestors
 
 
 def get_org_team_mapping() -> dict[int, list[int]]:
@@ -121,12 +158,197 @@ def get_parent_teams_of_teams(org_team_mapping: dict) -> dict[int, list[int]]:
     return team_team_parents
 
 
-def compute_team_member_roles():
+def member_team_roles_qs():
+    "Queryset of all object roles which list the team member permission"
+    return ObjectRole.objects.filter(role_definition__permissions__codename=permission_registry.team_permission)
+
+
+def get_teams_for_roles(object_roles) -> set[int]:
+    """
+    Returns ids of teams that the given object roles give membership to, if they list the team member permission.
+        {team_id, team_id, ...}
+
+    This only uses the content_type_id and object_id of the roles,
+    so it is still valid for roles that have since been deleted from the database.
+    """
+    team_ids = set()
+    org_ids = set()
+    for object_role in object_roles:
+        if object_role.content_type_id == permission_registry.team_ct_id:
+            team_ids.add(int(object_role.object_id))
+        elif object_role.content_type_id == permission_registry.org_ct_id:
+            org_ids.add(int(object_role.object_id))
+    team_parent_fd = permission_registry.get_parent_fd_name(permission_registry.team_model)
+    if org_ids and team_parent_fd:
+        team_ids.update(permission_registry.team_model.objects.filter(**{f'{team_parent_fd}_id__in': org_ids}).values_list('id', flat=True))
+    return team_ids
+
+
+def get_descendent_teams(team_ids: set[int]) -> set[int]:
+    """
+    Returns the given teams and all teams that those teams give membership to, directly or indirectly.
+    Changing the member roles of a team changes the member roles of all of these teams.
+    This uses the TeamAncestor table, which does not need to be updated for changes to the member roles of
+    the given teams, because that can only change ancestors of the given teams, not descendents.
+    """
+    all_team_ids = set(team_ids)
+    all_team_ids.update(TeamAncestor.objects.filter(ancestor_team_id__in=team_ids).values_list('team_id', flat=True))
+    return all_team_ids
+
+
+def get_team_member_graph(team_ids: set[int]) -> tuple[dict[int, set[int]], dict[int, set[int]]]:
+    """
+    Gives the same data as get_direct_team_member_roles and get_parent_teams_of_teams
+    but only for the given teams, with only 1 level of parent teams.
+    Returns a tuple of
+        ({team_id: {role_id, ...}, ...}, {team_id: {parent_team_id, ...}, ...})
+    """
+    direct_member_roles = defaultdict(set)
+    team_team_parents = defaultdict(set)
+    if not team_ids:
+        return (direct_member_roles, team_team_parents)
+
+    role_filter = Q(content_type_id=permission_registry.team_ct_id, object_id__in=[str(team_id) for team_id in team_ids])
+    org_team_mapping = defaultdict(list)
+    team_parent_fd = permission_registry.get_parent_fd_name(permission_registry.team_model)
+    if team_parent_fd:
+        for team_id, org_id in permission_registry.team_model.objects.filter(pk__in=team_ids).values_list('id', f'{team_parent_fd}_id'):
+            if org_id is not None:
+                org_team_mapping[org_id].append(team_id)
+        if org_team_mapping:
+            role_filter |= Q(content_type_id=permission_registry.org_ct_id, object_id__in=[str(org_id) for org_id in org_team_mapping])
+
+    for object_role in member_team_roles_qs().filter(role_filter).prefetch_related('teams'):
+        if object_role.content_type_id == permission_registry.team_ct_id:
+            target_team_ids = [int(object_role.object_id)]
+        else:
+            target_team_ids = org_team_mapping[int(object_role.object_id)]
+        for team_id in target_team_ids:
+            direct_member_roles[team_id].add(object_role.id)
+            for actor_team in object_role.teams.all():
+                team_team_parents[team_id].add(actor_team.id)
+    return (direct_member_roles, team_team_parents)
+
+
+def save_team_ancestors(all_ancestors: dict[int, dict[int, int]], team_ids: Optional[set[int]] = None) -> None:
+    """
+    Makes the TeamAncestor table match the given data
+        {team_id: {ancestor_team_id: depth, ...}, ...}
+
+    If team_ids is given, only entries for those teams are modified, otherwise this is done for all teams
     """
-    Fills in the ObjectRole.provides_teams relationship for all teams.
+    existing_qs = TeamAncestor.objects.all()
+    if team_ids is not None:
+        existing_qs = existing_qs.filter(team_id__in=team_ids)
+
+    to_delete = []
+    existing = set()
+    for entry_id, team_id, ancestor_id, depth in existing_qs.values_list('id', 'team_id', 'ancestor_team_id', 'depth'):
+        if all_ancestors.get(team_id, {}).get(ancestor_id) == depth:
+            existing.add((team_id, ancestor_id))
+        else:
+            to_delete.append(entry_id)
+
+    to_add = []
+    for team_id, ancestors in all_ancestors.items():
+        for ancestor_id, depth in ancestors.items():
+            if (team_id, ancestor_id) not in existing:
+                to_add.append(TeamAncestor(team_id=team_id, ancestor_team_id=ancestor_id, depth=depth))
+
+    if to_delete:
+        TeamAncestor.objects.filter(id__in=to_delete).delete()
+    if to_add:
+        TeamAncestor.objects.bulk_create(to_add)
+
+
+def compute_team_member_roles_incremental(object_roles=(), team_ids=(), stats: Optional[RecomputeStats] = None):
+    """
+    Same effect as compute_team_member_roles, but only for teams affected by a change.
+    object_roles - roles which gained, lost, or changed the team member permission, or had team actors change
+    team_ids - ids of teams whose own membership roles may have changed, like due to a change of organization
+    stats - if given, the number of teams and member role changes are added to this
+    Only member roles for those teams, and the teams they give membership to, are updated.
+    """
+    if stats is None:
+        stats = RecomputeStats(kind='team_members', trigger='other')
+    changed_team_ids = get_teams_for_roles(object_roles)
+    changed_team_ids.update(team_ids)
+    if not changed_team_ids:
+        return
+
+    affected_team_ids = get_descendent_teams(changed_team_ids)
+    direct_member_roles, team_team_parents = get_team_member_graph(affected_team_ids)
+    stats.teams = len(affected_team_ids)
+    stats.team_edges = sum(len(parent_ids) for parent_ids in team_team_parents.values())
+
+    # ancestors of teams outside of the affected set are not changed, so the TeamAncestor entries are still valid
+    outside_parent_ids = set()
+    for parent_ids in team_team_parents.values():
+        outside_parent_ids.update(parent_ids - affected_team_ids)
+    known_ancestors = defaultdict(dict)
+    for team_id, ancestor_id, depth in TeamAncestor.objects.filter(team_id__in=outside_parent_ids).values_list('team_id', 'ancestor_team_id', 'depth'):
+        known_ancestors[team_id][ancestor_id] = depth
+    for team_id in outside_parent_ids:
+        known_ancestors.setdefault(team_id, {})
+
+    all_ancestors = {}
+    for team_id in affected_team_ids:
+        all_ancestors[team_id] = get_team_ancestors(team_id, team_team_parents, known_ancestors=known_ancestors)
+    save_team_ancestors(all_ancestors, team_ids=affected_team_ids)
+
+    # Get the direct member roles for ancestors outside of the affected set
+    outside_ancestor_ids = set()
+    for ancestors in all_ancestors.values():
+        outside_ancestor_ids.update(set(ancestors.keys()) - affected_team_ids)
+    outside_member_roles, _ = get_team_member_graph(outside_ancestor_ids)
+    direct_member_roles.update(outside_member_roles)
+
+    through_model = ObjectRole.provides_teams.through
+    role_fd = ObjectRole._meta.get_field('provides_teams').m2m_field_name()
+    team_fd = ObjectRole._meta.get_field('provides_teams').m2m_reverse_field_name()
+    existing_member_roles = defaultdict(set)
+    for team_id, role_id in through_model.objects.filter(**{f'{team_fd}_id__in': affected_team_ids}).values_list(f'{team_fd}_id', f'{role_fd}_id'):
+        existing_member_roles[team_id].add(role_id)
+
+    for team_id in affected_team_ids:
+        expected_ids = set(direct_member_roles.get(team_id, []))
+        for ancestor_id in all_ancestors[team_id]:
+            expected_ids.update(direct_member_roles.get(ancestor_id, []))
+        existing_ids = existing_member_roles.get(team_id, set())
+        to_add = expected_ids - existing_ids
+        to_remove = existing_ids - expected_ids
+        stats.added += len(to_add)
+        stats.deleted += len(to_remove)
+        if to_add or to_remove:
+            team = permission_registry.team_model(pk=team_id)
+            if to_add:
+                team.member_roles.add(*to_add)
+            if to_remove:
+                team.member_roles.remove(*to_remove)
+
+
+def compute_team_member_roles(object_roles=None, team_ids=None):
+    """
+    Fills in the ObjectRole.provides_teams relationship and the TeamAncestor table for all teams.
     This relationship is a list of teams that the role grants membership for
-    This method is always ran globally.
+    If object_roles or team_ids are given, only teams affected by those are updated,
+    otherwise this is ran globally.
     """
+    invalidate_evaluation_caches()
+    # team membership changes which teams users are in, and so their global permissions
+    rbac_data_changed()
+    with instrument_recompute('team_members') as stats:
+        if object_roles is not None or team_ids is not None:
+            object_roles = list(object_roles or ())
+            stats.roles = len(object_roles)
+            compute_team_member_roles_incremental(object_roles=object_roles, team_ids=team_ids or (), stats=stats)
+        else:
+            compute_all_team_member_roles(stats)
+
+
+def compute_all_team_member_roles(stats: RecomputeStats) -> None:
+    "Does compute_team_member_roles for all teams, adding the number of teams and member role changes to stats"
+
     # Manually prefetch the team to org memberships
     org_team_mapping = get_org_team_mapping()
 
@@ -136,13 +358,23 @@ def compute_team_member_roles():
     # Build a team-to-team child-to-parents mapping for teams that have permission to other teams
     team_team_parents = get_parent_teams_of_teams(org_team_mapping)
 
-    # Now we need to crawl the team-team graph to get the full list of roles that grants access to each team
+    # Now we need to crawl the team-team graph to get all the ancestors of every team, and save that
+    # roles for a team that is being deleted may still exist, so only existing teams are considered
+    existing_team_ids = set(permission_registry.team_model.objects.values_list('id', flat=True))
+    stats.teams = len(existing_team_ids)
+    stats.team_edges = sum(len(parent_ids) for parent_ids in team_team_parents.values())
+    all_ancestors = {}
+    for team_id in team_team_parents:
+        if team_id in existing_team_ids:
+            all_ancestors[team_id] = get_team_ancestors(team_id, team_team_parents)
+    save_team_ancestors(all_ancestors)
+
     # for each parent team that grants membership to a team, we need to add the roles that grant
-    # membership to that parent team
+    # membership to that parent team to get the full list of roles that grants access to each team
     all_member_roles = {}
     for team_id, member_roles in direct_member_roles.items():
         all_member_roles[team_id] = set(member_roles)  # will also avoid mutating original data structure later
-        for parent_team_id in all_team_parents(team_id, team_team_parents):
+        for parent_team_id in all_ancestors.get(team_id, {}):
             all_member_roles[team_id].update(set(direct_member_roles.get(parent_team_id, [])))
 
     # Great! we should be done building all_member_roles which tells what roles gives team membership for all teams
@@ -153,36 +385,23 @@ def compute_team_member_roles():
         expected_ids = set(all_member_roles.get(team.id, []))
         to_add = expected_ids - existing_ids
         to_remove = existing_ids - expected_ids
+        stats.added += len(to_add)
+        stats.deleted += len(to_remove)
         if to_add:
             team.member_roles.add(*to_add)
         if to_remove:
             team.member_roles.remove(*to_remove)
 
 
-def compute_object_role_permissions(object_roles=None, types_prefetch=None):
-    """
-    Assumes the ObjectRole.provides_teams relationship is correct.
-    Makes the RoleEvaluation table correct for all specified object_roles
-    """
-    to_delete = set()
-    to_add = []
-
-    if types_prefetch is None:
-        types_prefetch = TypesPrefetch.from_database(RoleDefinition)
-    if object_roles is None:
-        object_roles = ObjectRole.objects.iterator()
-
-    for object_role in object_roles:
-        role_to_delete, role_to_add = object_role.needed_cache_updates(types_prefetch=types_prefetch)
-
-        if role_to_delete:
-            logger.debug(f'Removing {len(role_to_delete)} object-permissions from {object_role}')
-            to_delete.update(role_to_delete)
+def batched_object_roles(object_roles, batch_size=EVALUATION_BATCH_SIZE):
+    "Yields lists of object roles from any iterable, so that related data can be prefetched per list"
+    iterator = iter(object_roles)
+    while role_batch := list(islice(iterator, batch_size)):
+        yield role_batch
 
-        if role_to_add:
-            logger.debug(f'Adding {len(role_to_add)} object-permissions to {object_role}')
-            to_add.extend(role_to_add)
 
+def save_evaluation_changes(to_add: list, to_delete: set) -> None:
+    "Saves evaluations to add, and deletes evaluations given as (id, type of object_id)"
     if to_add:
         logger.info(f'Adding {len(to_add)} object-permission records')
         to_add_int = []
@@ -214,3 +433,131 @@ def compute_object_role_permissions(object_roles=None, types_prefetch=None):
             RoleEvaluation.objects.filter(id__in=to_delete_int).delete()
         if to_delete_uuid:
             RoleEvaluationUUID.objects.filter(id__in=to_delete_uuid).delete()
+
+
+def get_evaluation_changes(role_batch: list, types_prefetch, by_role: Optional[dict] = None) -> tuple[list, set]:
+    """
+    Returns evaluations to add, and to delete as (id, type of object_id), for a list of object roles
+    If by_role is given, the number of evaluations to add and delete is saved to it for every role that needs changes
+    """
+    # Do queries for all roles in batch, so that cost scales with number of models, not number of roles
+    # roles are re-fetched so that the prefetched data is not left on objects the caller passed in
+    role_batch = list(ObjectRole.objects.filter(pk__in=[object_role.pk for object_role in role_batch]).prefetch_related(*EVALUATION_PREFETCH))
+    types_prefetch.prefetch_child_ids(role_batch)
+
+    to_delete = set()
+    to_add = []
+    for object_role in role_batch:
+        role_to_delete, role_to_add = object_role.needed_cache_updates(types_prefetch=types_prefetch)
+
+        if role_to_delete:
+            logger.debug(f'Removing {len(role_to_delete)} object-permissions from {object_role}')
+            to_delete.update(role_to_delete)
+
+        if role_to_add:
+            logger.debug(f'Adding {len(role_to_add)} object-permissions to {object_role}')
+            to_add.extend(role_to_add)
+
+        if by_role is not None and (role_to_add or role_to_delete):
+            by_role[object_role] = (len(role_to_add), len(role_to_delete))
+
+    types_prefetch.clear_child_ids()
+    return (to_add, to_delete)
+
+
+def compute_object_role_permissions(object_roles=None, types_prefetch=None) -> RecomputeStats:
+    """
+    Assumes the ObjectRole.provides_teams relationship is correct.
+    Makes the RoleEvaluation table correct for all specified object_roles,
+    and the per-user tables correct for users given those roles, if enabled
+    Returns the stats with the number of roles processed, and evaluations added and deleted
+    """
+    invalidate_evaluation_caches()
+    if types_prefetch is None:
+        types_prefetch = TypesPrefetch.from_database(RoleDefinition)
+    user_ids = None  # meaning all users
+    if object_roles is None:
+        object_roles = ObjectRole.objects.iterator()
+    elif user_evaluations_enabled():
+        object_roles = list(object_roles)
+        user_ids = get_role_user_ids(object_roles)
+
+    with instrument_recompute('object_roles') as stats:
+        if settings.ANSIBLE_BASE_EVALUATIONS_ENGINE == 'sql':
+            stats.roles, stats.added, stats.deleted = compute_object_role_permissions_sql(object_roles, types_prefetch=types_prefetch)
+        else:
+            for role_batch in batched_object_roles(object_roles):
+                to_add, to_delete = get_evaluation_changes(role_batch, types_prefetch)
+                # changes are saved for each batch, so memory use does not grow with the number of roles
+                save_evaluation_changes(to_add, to_delete)
+                stats.roles += len(role_batch)
+                stats.added += len(to_add)
+                stats.deleted += len(to_delete)
+
+        compute_user_object_permissions(user_ids=user_ids)
+    return stats
+
+
+def get_role_user_ids(object_roles) -> set[int]:
+    "Returns ids of users directly given any of the object roles"
+    user_ids = set()
+    for role_batch in batched_object_roles(object_roles):
+        user_ids.update(RoleUserAssignment.objects.filter(object_role__in=role_batch).values_list('user_id', flat=True))
+    return user_ids
+
+
+def compute_user_evaluations_for_model(evaluation_model, user_evaluation_model, user_ids: list[int]) -> tuple[int, int]:
+    """
+    Makes the user_evaluation_model entries for the users match the evaluation_model entries for their roles
+    returns the number of entries added and deleted
+    """
+    expected = {}
+    evaluation_qs = evaluation_model.objects.filter(role__users__in=user_ids)
+    for user_id, codename, ct_id, object_id, permission_id in evaluation_qs.values_list(
+        'role__users', 'codename', 'content_type_id', 'object_id', 'permission_id'
+    ).iterator():
+        expected.setdefault((user_id, codename, ct_id, object_id), permission_id)
+
+    existing = {}
+    user_evaluation_qs = user_evaluation_model.objects.filter(user_id__in=user_ids)
+    for pk, user_id, codename, ct_id, object_id in user_evaluation_qs.values_list('pk', 'user_id', 'codename', 'content_type_id', 'object_id').iterator():
+        existing[(user_id, codename, ct_id, object_id)] = pk
+
+    to_delete = [pk for key, pk in existing.items() if key not in expected]
+    to_add = [
+        user_evaluation_model(user_id=user_id, codename=codename, content_type_id=ct_id, object_id=object_id, permission_id=permission_id)
+        for (user_id, codename, ct_id, object_id), permission_id in expected.items()
+        if (user_id, codename, ct_id, object_id) not in existing
+    ]
+    if to_delete:
+        user_evaluation_model.objects.filter(pk__in=to_delete).delete()
+    if to_add:
+        user_evaluation_model.objects.bulk_create(to_add, ignore_conflicts=settings.ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS)
+    return (len(to_add), len(to_delete))
+
+
+def compute_user_object_permissions(user_ids=None):
+    """
+    Makes the per-user UserObjectPermission tables correct for the given user ids, or all users if None,
+    assumes the RoleEvaluation table is already correct. Does nothing unless ANSIBLE_BASE_EVALUATIONS_PER_USER is set.
+    """
+    if not user_evaluations_enabled():
+        return
+    invalidate_evaluation_caches()
+    if user_ids is None:
+        user_ids = set(RoleUserAssignment.objects.filter(object_role__isnull=False).values_list('user_id', flat=True))
+        # users who lost all their roles still have entries to delete
+        for user_evaluation_model in (UserObjectPermission, UserObjectPermissionUUID):
+            user_ids.update(user_evaluation_model.objects.values_list('user_id', flat=True).distinct())
+
+    added_ct = 0
+    deleted_ct = 0
+    user_iterator = iter(sorted(user_ids))
+    while user_batch := list(islice(user_iterator, USER_EVALUATION_BATCH_SIZE)):
+        for evaluation_model, user_evaluation_model in ((RoleEvaluation, UserObjectPermission), (RoleEvaluationUUID, UserObjectPermissionUUID)):
+            model_added, model_deleted = compute_user_evaluations_for_model(evaluation_model, user_evaluation_model, user_batch)
+            added_ct += model_added
+            deleted_ct += model_deleted
+
+    if added_ct or deleted_ct:
+        logger.info(f'Added {added_ct} and deleted {deleted_ct} per-user object-permission records for {len(user_ids)} users')
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from typing import Optional
 
 from django.conf import settings
@@ -5,9 +6,12 @@ from django.contrib.auth.models import AnonymousUser
 from django.db.models.functions import Cast
 from django.db.models.query import QuerySet
 
+from ansible_base.lib.utils.models import is_add_perm
 from ansible_base.rbac import permission_registry
 from ansible_base.rbac.models import DABPermission, RoleDefinition, get_evaluation_model
-from ansible_base.rbac.validators import validate_codename_for_model
+from ansible_base.rbac.outbox import apply_pending_updates_for_user
+from ansible_base.rbac.role_cache import get_user_role_data, role_cache_enabled
+from ansible_base.rbac.validators import codenames_for_cls, validate_codename_for_model
 
 """
 RoleEvaluation or RoleEvaluationUUID models are the authority for permission evaluations,
@@ -47,6 +51,8 @@ def has_super_permission(user, full_codename=None) -> bool:
 
 def bound_singleton_permissions(self):
     "Method attached to User model as singleton_permissions"
+    if role_cache_enabled():
+        return get_role_data(self)['global_codenames']
     if not hasattr(self, '_singleton_permissions') or bound_singleton_permissions._team_clear_signal:
         # values_list will make the return type set[str]
         permission_qs = DABPermission.objects.values_list('codename', flat=True)
@@ -58,6 +64,50 @@ def bound_singleton_permissions(self):
 bound_singleton_permissions._team_clear_signal = False
 
 
+# Incremented whenever RBAC triggers change permission data, so that cached evaluation results are discarded
+evaluation_cache_generation = 0
+
+
+def invalidate_evaluation_caches() -> None:
+    global evaluation_cache_generation
+    evaluation_cache_generation += 1
+
+
+class EvaluationCache:
+    """
+    Results of has_obj_perm for a user object, which normally only lives as long as a request
+    hits and misses count lookups since the cache was created, for debugging
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.clear()
+
+    def clear(self) -> None:
+        self.results = {}
+        self.role_data = None
+        self.generation = evaluation_cache_generation
+
+
+def get_evaluation_cache(user) -> EvaluationCache:
+    "Gives the has_obj_perm cache for the user object, with results from before any RBAC changes removed"
+    cache = getattr(user, '_rbac_evaluation_cache', None)
+    if cache is None:
+        cache = user._rbac_evaluation_cache = EvaluationCache()
+    elif cache.generation != evaluation_cache_generation:
+        cache.clear()
+    return cache
+
+
+def get_role_data(user) -> dict:
+    "Gives data from the shared role cache for the user, which is only fetched once for the user object"
+    cache = get_evaluation_cache(user)
+    if cache.role_data is None:
+        cache.role_data = get_user_role_data(user)
+    return cache.role_data
+
+
 class BaseEvaluationDescriptor:
     """
     Descriptors have to be used to attach what are effectively a @classmethod
@@ -81,6 +131,7 @@ class AccessibleObjectsDescriptor(BaseEvaluationDescriptor):
         full_codename = validate_codename_for_model(codename, self.cls)
         if actor._meta.model_name == 'user' and has_super_permission(actor, full_codename):
             return queryset
+        apply_pending_updates_for_user(actor)
         return get_evaluation_model(self.cls).accessible_objects(self.cls, actor, full_codename, queryset=queryset)
 
 
@@ -94,16 +145,100 @@ class AccessibleIdsDescriptor(BaseEvaluationDescriptor):
                 return self.cls.objects.values_list('id', flat=True)
             else:
                 return self.cls.objects.values_list(Cast('id', output_field=cast_field), flat=True)
+        apply_pending_updates_for_user(actor)
         return get_evaluation_model(self.cls).accessible_ids(self.cls, actor, full_codename, content_types=content_types, cast_field=cast_field)
 
 
 def bound_has_obj_perm(self, obj, codename) -> bool:
     if not permission_registry.is_registered(obj):
         raise RuntimeError(f'Object of {obj._meta.model_name} type is not registered with DAB RBAC')
+    # serializers may check the same permissions many times in a request, so results are cached on the user
+    cache = get_evaluation_cache(self)
+    cache_key = (obj._meta.label_lower, obj.pk, codename)
+    if cache_key in cache.results:
+        cache.hits += 1
+        return cache.results[cache_key]
+    cache.misses += 1
+
     full_codename = validate_codename_for_model(codename, obj)
     if has_super_permission(self, full_codename):
-        return True
-    return get_evaluation_model(obj).has_obj_perm(self, obj, full_codename)
+        result = True
+    else:
+        apply_pending_updates_for_user(self)
+        result = get_evaluation_model(obj).has_obj_perm(self, obj, full_codename)
+    cache.results[cache_key] = result
+    return result
+
+
+def group_by_model(objs) -> dict[type, list]:
+    "Groups objs by model, only one model is allowed because results of the bulk methods are keyed by pk"
+    model_objs = defaultdict(list)
+    for obj in objs:
+        if not permission_registry.is_registered(obj):
+            raise RuntimeError(f'Object of {obj._meta.model_name} type is not registered with DAB RBAC')
+        model_objs[type(obj)].append(obj)
+    if len(model_objs) > 1:
+        model_names = ', '.join(sorted(model_cls._meta.model_name for model_cls in model_objs))
+        raise RuntimeError(f'Objects must all be of the same model, because results are keyed by pk, obtained {model_names}')
+    return model_objs
+
+
+def bound_has_obj_perms(self, objs, codename) -> dict:
+    """
+    Method attached to User model as has_obj_perms, like has_obj_perm for many objects
+    Returns {pk: bool, ...} with a single query, since this is keyed by pk, objects must be of the same model
+    The results are also saved to the has_obj_perm cache, so checking these objects later will not do queries.
+    """
+    results = {}
+    for model_cls, model_objs in group_by_model(objs).items():
+        full_codename = validate_codename_for_model(codename, model_cls)
+        if has_super_permission(self, full_codename):
+            permitted = set(obj.pk for obj in model_objs)
+        else:
+            apply_pending_updates_for_user(self)
+            permitted = get_evaluation_model(model_cls).permitted_pks(self, model_cls, [obj.pk for obj in model_objs], full_codename)
+
+        cache = get_evaluation_cache(self)
+        for obj in model_objs:
+            results[obj.pk] = bool(obj.pk in permitted)
+            cache.results[(obj._meta.label_lower, obj.pk, codename)] = results[obj.pk]
+    return results
+
+
+def object_codenames(model_cls) -> set[str]:
+    "Permission codenames that can apply to an object of model_cls, including permissions to its child objects"
+    codenames = set(codename for codename in codenames_for_cls(model_cls) if not is_add_perm(codename))
+    for path, child_cls in permission_registry.get_child_models(model_cls):
+        codenames.update(codenames_for_cls(child_cls))
+    return codenames
+
+
+def bound_get_permissions_bulk(self, objs) -> dict:
+    """
+    Method attached to User model as get_permissions_bulk
+    Returns {pk: {codename, ...}, ...} of all permissions the user has to each of objs,
+    including permissions from user flags and system-wide roles, with a single query
+    Like has_obj_perms, objects must be of the same model.
+    """
+    results = {}
+    is_superuser = has_super_permission(self)
+    global_codenames = set(self.singleton_permissions())
+    for codename, super_flag in settings.ANSIBLE_BASE_BYPASS_ACTION_FLAGS.items():
+        if getattr(self, super_flag):
+            global_codenames.add(codename)
+
+    for model_cls, model_objs in group_by_model(objs).items():
+        model_codenames = object_codenames(model_cls)
+        if is_superuser:
+            for obj in model_objs:
+                results[obj.pk] = set(model_codenames)
+            continue
+
+        apply_pending_updates_for_user(self)
+        permissions = get_evaluation_model(model_cls).get_permissions_bulk(self, model_cls, [obj.pk for obj in model_objs])
+        for obj in model_objs:
+            results[obj.pk] = set(permissions.get(obj.pk, set())) | (global_codenames & model_codenames)
+    return results
 
 
 def connect_rbac_methods(cls):
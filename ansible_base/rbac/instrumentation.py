@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from crum import get_current_request
+from django.conf import settings
+from django.dispatch import Signal, receiver
+
+logger = logging.getLogger('ansible_base.rbac.instrumentation')
+
+
+"""
+The RoleEvaluation and team membership data is recomputed by compute_object_role_permissions
+and compute_team_member_roles, which can be slow for large installs.
+After each of those finishes, rbac_recompute_finished is sent with the statistics of that recompute,
+including the entry point that caused it, so apps can connect their own receivers.
+
+With ANSIBLE_BASE_RBAC_METRICS, totals are also kept in memory for each process,
+and given in the Prometheus text format by the rbac_metrics endpoint.
+"""
+
+
+# Sent after every recompute, with the keyword argument stats, a RecomputeStats instance
+rbac_recompute_finished = Signal()
+
+# Upper bounds of the buckets of the recompute duration histogram, in seconds
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+@dataclass
+class RecomputeStats:
+    """Statistics of one recompute
+
+    kind - "object_roles" for compute_object_role_permissions, "team_members" for compute_team_member_roles
+    trigger - the entry point that caused the recompute, like "assignment" or "post_migrate", see recompute_trigger
+    roles - number of object roles processed
+    added, deleted - number of evaluations, or team member role links, added and deleted
+    teams, team_edges - for team members, number of teams processed and team-to-team membership links among them
+    """
+
+    kind: str
+    trigger: str
+    request: Optional[str] = None
+    duration: float = 0.0
+    roles: int = 0
+    added: int = 0
+    deleted: int = 0
+    teams: int = 0
+    team_edges: int = 0
+
+
+class TriggerState(threading.local):
+    def __init__(self):
+        self.names = []
+
+
+trigger_state = TriggerState()
+
+
+@contextmanager
+def recompute_trigger(name: str):
+    """Names the entry point for recomputes done inside of this, also usable as a decorator
+
+    When these are nested, the outermost name is reported, as that is what caused the recompute.
+    """
+    trigger_state.names.append(name)
+    try:
+        yield
+    finally:
+        trigger_state.names.pop()
+
+
+def current_trigger() -> str:
+    if trigger_state.names:
+        return trigger_state.names[0]
+    return 'other'
+
+
+def describe_current_request() -> Optional[str]:
+    request = get_current_request()
+    if request is None:
+        return None
+    return f'{request.method} {request.path}'
+
+
+@contextmanager
+def instrument_recompute(kind: str):
+    "Gives a RecomputeStats for the caller to fill in, and sends rbac_recompute_finished with it when done"
+    stats = RecomputeStats(kind=kind, trigger=current_trigger(), request=describe_current_request())
+    start = time.perf_counter()
+    yield stats
+    stats.duration = time.perf_counter() - start
+
+    slow_seconds = settings.ANSIBLE_BASE_RBAC_SLOW_RECOMPUTE_SECONDS
+    if slow_seconds is not None and stats.duration >= slow_seconds:
+        logger.warning(
+            f'Slow RBAC recompute of {kind} took {stats.duration:.2f} seconds for {stats.roles} roles and {stats.teams} teams, '
+            f'trigger: {stats.trigger}, request: {stats.request}'
+        )
+    rbac_recompute_finished.send(sender=RecomputeStats, stats=stats)
+
+
+def escape_label_value(value) -> str:
+    "Escapes a label value as the Prometheus text format requires, backslash first so the others are not escaped twice"
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label_value(value)}"' for key, value in labels.items()) + '}'
+
+
+class RecomputeMetrics:
+    "Totals of recomputes in this process, by kind and trigger"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.totals = {}
+            self.team_graph = {'teams': 0, 'team_edges': 0}
+
+    def record(self, stats: RecomputeStats) -> None:
+        with self.lock:
+            totals = self.totals.setdefault(
+                (stats.kind, stats.trigger), {'count': 0, 'seconds': 0.0, 'roles': 0, 'added': 0, 'deleted': 0, 'buckets': [0] * len(DURATION_BUCKETS)}
+            )
+            totals['count'] += 1
+            totals['seconds'] += stats.duration
+            for field_name in ('roles', 'added', 'deleted'):
+                totals[field_name] += getattr(stats, field_name)
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if stats.duration <= bound:
+                    totals['buckets'][i] += 1
+            if stats.kind == 'team_members':
+                self.team_graph = {'teams': stats.teams, 'team_edges': stats.team_edges}
+
+    def prometheus_text(self) -> str:
+        "Gives the metrics in the Prometheus text exposition format"
+        with self.lock:
+            totals = sorted(self.totals.items())
+            team_graph = dict(self.team_graph)
+
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for suffix, labels, value in samples:
+                lines.append(f'{name}{suffix}{format_labels(labels)} {value}')
+
+        for field_name, help_text in (
+            ('roles', 'Object roles processed by RBAC recomputes'),
+            ('added', 'Entries added by RBAC recomputes'),
+            ('deleted', 'Entries deleted by RBAC recomputes'),
+        ):
+            add_metric(
+                f'dab_rbac_recompute_{field_name}_total',
+                'counter',
+                help_text,
+                [('', {'kind': kind, 'trigger': trigger}, values[field_name]) for (kind, trigger), values in totals],
+            )
+
+        histogram_samples = []
+        for (kind, trigger), values in totals:
+            labels = {'kind': kind, 'trigger': trigger}
+            for bound, bucket_ct in zip(DURATION_BUCKETS, values['buckets']):
+                histogram_samples.append(('_bucket', {**labels, 'le': str(bound)}, bucket_ct))
+            histogram_samples.append(('_bucket', {**labels, 'le': '+Inf'}, values['count']))
+            histogram_samples.append(('_sum', labels, f'{values["seconds"]:.6f}'))
+            histogram_samples.append(('_count', labels, values['count']))
+        add_metric('dab_rbac_recompute_duration_seconds', 'histogram', 'Duration of RBAC recomputes', histogram_samples)
+
+        add_metric('dab_rbac_team_graph_teams', 'gauge', 'Teams processed by the last team membership recompute', [('', {}, team_graph['teams'])])
+        add_metric(
+            'dab_rbac_team_graph_edges', 'gauge', 'Team-to-team membership links of the last team membership recompute', [('', {}, team_graph['team_edges'])]
+        )
+        return '\n'.join(lines) + '\n'
+
+
+recompute_metrics = RecomputeMetrics()
+
+
+@receiver(rbac_recompute_finished, dispatch_uid='dab_rbac_record_recompute_metrics')
+def record_recompute_metrics(sender, stats: RecomputeStats, **kwargs) -> None:
+    if settings.ANSIBLE_BASE_RBAC_METRICS:
+        recompute_metrics.record(stats)
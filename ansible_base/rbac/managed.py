@@ -63,9 +63,9 @@ class ManagedRoleConstructor:
         return rd, created
 
     def allowed_permissions(self, model: Optional[Type[Model]]) -> set[str]:
-        from ansible_base.rbac.validators import combine_values, permissions_allowed_for_role
+        from ansible_base.rbac.validators import codenames_allowed_for_role
 
-        return combine_values(permissions_allowed_for_role(model))
+        return set(codenames_allowed_for_role(model))
 
 
 class ManagedAdminBase(ManagedRoleConstructor):
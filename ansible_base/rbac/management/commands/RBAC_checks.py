@@ -1,21 +1,120 @@
-from collections import defaultdict
+"""
+Runs sanity checks of the RBAC data, and reports scale metrics
+
+Usage::
+
+    django-admin RBAC_checks  # check using a single process
+    django-admin RBAC_checks --workers 4  # split the object role checks by id range over 4 processes
+    django-admin RBAC_checks --repair  # fix out-of-date role evaluations and delete orphaned object roles
+
+Optional parameters::
+
+    `--batch-size number` object roles to check at once, each repaired batch is saved in its own transaction
+    `--partitions number` number of id ranges to split object roles into, defaults to 4 times the workers
+"""
+
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from multiprocessing import get_context
 
 from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.db.models.functions import Cast
 
 from ansible_base.rbac import permission_registry
-from ansible_base.rbac.models import ObjectRole, RoleDefinition
+from ansible_base.rbac.caching import (
+    batched_object_roles,
+    compute_object_role_permissions,
+    compute_team_member_roles,
+    compute_user_object_permissions,
+    get_evaluation_changes,
+    get_role_user_ids,
+    save_evaluation_changes,
+)
+from ansible_base.rbac.evaluations import invalidate_evaluation_caches
+from ansible_base.rbac.instrumentation import recompute_trigger
+from ansible_base.rbac.management.commands.rebuild_rbac_evaluations import get_partitions
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID, RoleTeamAssignment, RoleUserAssignment
+from ansible_base.rbac.prefetch import TypesPrefetch
+
+
+def repair_trigger(repair: bool):
+    "Recomputes are only reported as caused by a repair when --repair is given"
+    return recompute_trigger('repair') if repair else nullcontext()
+
+
+def check_partition(min_id: int, max_id: int, batch_size: int, repair: bool) -> dict:
+    """
+    Finds object roles with ids in the given inclusive range whose RoleEvaluation entries are not up-to-date
+    With repair, the changes for every batch of roles are saved in their own transaction.
+    Returns a dictionary with the number of roles checked, evaluations to add and delete,
+    and the out-of-date roles as (description, id, evaluations to add, evaluations to delete).
+    """
+    types_prefetch = TypesPrefetch.from_database(RoleDefinition)
+    result = {'roles': 0, 'added': 0, 'deleted': 0, 'out_of_date': []}
+    role_qs = ObjectRole.objects.filter(id__gte=min_id, id__lte=max_id).order_by('id')
+    for role_batch in batched_object_roles(role_qs.iterator(chunk_size=batch_size), batch_size=batch_size):
+        by_role = {}
+        if repair:
+            with repair_trigger(repair), transaction.atomic():
+                to_add, to_delete = get_evaluation_changes(role_batch, types_prefetch, by_role=by_role)
+                save_evaluation_changes(to_add, to_delete)
+        else:
+            to_add, to_delete = get_evaluation_changes(role_batch, types_prefetch, by_role=by_role)
+        result['roles'] += len(role_batch)
+        result['added'] += len(to_add)
+        result['deleted'] += len(to_delete)
+        result['out_of_date'].extend((str(role), role.id, add_ct, delete_ct) for role, (add_ct, delete_ct) in by_role.items())
+    return result
+
+
+def orphaned_role_ids(content_type_id: int) -> list[int]:
+    "Ids of object roles for the content type whose object does not exist, found with a single anti-join query"
+    model = permission_registry.content_type_model.objects.get_for_id(content_type_id).model_class()
+    role_qs = ObjectRole.objects.filter(content_type_id=content_type_id)
+    if model is not None:
+        # object_id is text, so it is cast to the type of the primary key to use its index
+        object_qs = model.objects.filter(pk=Cast(OuterRef('object_id'), output_field=model._meta.pk))
+        role_qs = role_qs.filter(~Exists(object_qs))
+    return list(role_qs.order_by('id').values_list('id', flat=True))
+
+
+def bucket_label(value: int) -> str:
+    "Label of the power-of-ten histogram bucket that value falls in"
+    if value == 0:
+        return '0'
+    low = 10 ** (len(str(value)) - 1)
+    return f'{low}-{low * 10 - 1}'
+
+
+def histogram(counts_by_role: dict, role_ct: int) -> list[tuple[str, int]]:
+    "Number of roles in each bucket, roles not in counts_by_role are counted as 0"
+    buckets = Counter(bucket_label(value) for value in counts_by_role.values())
+    if role_ct > len(counts_by_role):
+        buckets['0'] += role_ct - len(counts_by_role)
+    return sorted(buckets.items(), key=lambda item: int(item[0].split('-')[0]))
 
 
 class Command(BaseCommand):
     help = "Runs bug checking sanity checks, gets scale metrics, and recommendations for Role Based Access Control"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Number of processes to check object roles with")
+        parser.add_argument("--partitions", type=int, default=None, help="Number of object role id ranges to split the work into")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of object roles to check, and repair, at once")
+        parser.add_argument("--repair", action="store_true", help="Save the missing role evaluations, delete the extra ones, and delete orphaned object roles")
+
     def check_role_definitions(self):
         rd_ct = RoleDefinition.objects.count()
         self.stdout.write(f'Inspecting {rd_ct} role definitions')
         self.stdout.write('  checking for minimum of view permission')
         indexed_rds = defaultdict(list)
-        for rd in RoleDefinition.objects.prefetch_related('permissions'):
-            perm_list = list(rd.permissions.values_list('codename', flat=True))
+        rd_permissions = {}
+        for rd in RoleDefinition.objects.prefetch_related('permissions__content_type'):
+            rd_permissions[rd.id] = list(rd.permissions.all())
+            perm_list = [permission.codename for permission in rd_permissions[rd.id]]
             if not any(p.startswith('view_') for p in perm_list):
                 self.stdout.write(self.style.WARNING(f'Role definition {rd.name} does not list any view permissions and this is considered invalid'))
                 self.has_issues = True
@@ -32,34 +131,118 @@ class Command(BaseCommand):
         object_role_ct = ObjectRole.objects.count()
         self.stdout.write(f'Inspecting {object_role_ct} object roles')
         self.stdout.write('  checking for invalid permissions for model type')
-        for role in ObjectRole.objects.prefetch_related('role_definition__permissions', 'content_type'):
-            for permission in role.role_definition.permissions.all():
-                if permission.content_type_id != role.content_type_id:
-                    if permission.content_type.model_class() not in set(
-                        cls for filter_path, cls in permission_registry.get_child_models(role.content_type.model_class())
-                    ):
+        # object roles with the same role definition and content type have the same permissions, so those are checked once
+        role_types = ObjectRole.objects.order_by().values_list('role_definition_id', 'content_type_id').distinct()
+        for rd_id, ct_id in role_types:
+            role_model = permission_registry.content_type_model.objects.get_for_id(ct_id).model_class()
+            child_models = set(cls for filter_path, cls in permission_registry.get_child_models(role_model)) if role_model else set()
+            for permission in rd_permissions.get(rd_id, []):
+                if permission.content_type_id != ct_id and permission.content_type.model_class() not in child_models:
+                    for role in ObjectRole.objects.filter(role_definition_id=rd_id, content_type_id=ct_id):
                         self.stdout.write(
                             self.style.WARNING(f'Object role {role} has permission {permission.codename} for an unlike content type {permission.content_type}')
                         )
 
-    def check_object_roles(self):
+    def check_evaluations(self, options):
         self.stdout.write('  checking for up-to-date role evaluations')
-        for role in ObjectRole.objects.all():
-            to_delete, to_add = role.needed_cache_updates()
-            if to_delete or to_add:
-                self.stdout.write(
-                    self.style.WARNING(f'Object role {role} does not have up-to-date role evaluations cached, this can happen if someone bypasses signals')
+        repair = options.get('repair', False)
+        workers = options.get('workers', 1)
+        batch_size = options.get('batch_size', 1000)
+        partitions = get_partitions(options.get('partitions') or workers * 4)
+
+        results = []
+        if workers == 1:
+            for partition in partitions:
+                results.append(check_partition(partition[0], partition[1], batch_size, repair))
+        elif partitions:
+            # child processes can not share the database connections of this process, so they each make their own
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork')) as executor:
+                futures = [executor.submit(check_partition, partition[0], partition[1], batch_size, repair) for partition in partitions]
+                for future in as_completed(futures):
+                    results.append(future.result())
+
+        out_of_date = sorted((entry for result in results for entry in result['out_of_date']), key=lambda entry: entry[1])
+        for role_repr, role_id, add_ct, delete_ct in out_of_date:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'Object role {role_repr} does not have up-to-date role evaluations cached, this can happen if someone bypasses signals '
+                    f'({add_ct} missing, {delete_ct} extra)'
                 )
+            )
+        if not out_of_date:
+            return
 
+        added = sum(result['added'] for result in results)
+        deleted = sum(result['deleted'] for result in results)
+        if repair:
+            invalidate_evaluation_caches()
+            compute_user_object_permissions(user_ids=get_role_user_ids(ObjectRole.objects.filter(id__in=[entry[1] for entry in out_of_date])))
+            self.stdout.write(self.style.SUCCESS(f'Repaired {len(out_of_date)} object roles, added {added} and deleted {deleted} role evaluations'))
+        else:
+            self.stdout.write(f'  {len(out_of_date)} object roles need {added} role evaluations added and {deleted} deleted, use --repair to fix')
+            self.has_issues = True
+
+    def check_orphans(self, options):
         self.stdout.write('  checking for missing content object')
-        for role in ObjectRole.objects.all():
-            if not role.content_object:
-                self.stdout.write(self.style.WARNING(f'Object role {role} has been orphaned, indicating that post_delete signals are broken'))
+        repair = options.get('repair', False)
+        batch_size = options.get('batch_size', 1000)
+        orphan_ids = []
+        for ct_id in ObjectRole.objects.order_by().values_list('content_type_id', flat=True).distinct():
+            orphan_ids.extend(orphaned_role_ids(ct_id))
+        if not orphan_ids:
+            return
+
+        for role in ObjectRole.objects.filter(id__in=orphan_ids).order_by('id').iterator():
+            self.stdout.write(self.style.WARNING(f'Object role {role} has been orphaned, indicating that post_delete signals are broken'))
+
+        if repair:
+            # users and team members given the deleted roles lose the permissions from them
+            user_ids = get_role_user_ids(orphan_ids)
+            team_role_ids = set(ObjectRole.objects.filter(provides_teams__has_roles__in=orphan_ids).values_list('id', flat=True)) - set(orphan_ids)
+            for role_batch in batched_object_roles(orphan_ids, batch_size=batch_size):
+                with transaction.atomic():
+                    ObjectRole.objects.filter(id__in=role_batch).delete()
+            # deleted roles may have given team membership
+            compute_team_member_roles()
+            if team_role_ids:
+                compute_object_role_permissions(object_roles=ObjectRole.objects.filter(id__in=team_role_ids))
+            compute_user_object_permissions(user_ids=user_ids)
+            self.stdout.write(self.style.SUCCESS(f'Deleted {len(orphan_ids)} orphaned object roles'))
+        else:
+            self.has_issues = True
+
+    def report_metrics(self):
+        self.stdout.write('Scale metrics')
+        role_ct = ObjectRole.objects.count()
+        rows_by_role = Counter()
+        for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+            for role_id, row_ct in eval_cls.objects.order_by().values('role_id').annotate(row_ct=Count('id')).values_list('role_id', 'row_ct').iterator():
+                rows_by_role[role_id] += row_ct
+        actors_by_role = Counter()
+        for assignment_cls in (RoleUserAssignment, RoleTeamAssignment):
+            assignment_qs = assignment_cls.objects.filter(object_role__isnull=False).order_by().values('object_role_id')
+            for role_id, actor_ct in assignment_qs.annotate(actor_ct=Count('id')).values_list('object_role_id', 'actor_ct').iterator():
+                actors_by_role[role_id] += actor_ct
+
+        total_rows = sum(rows_by_role.values())
+        max_rows = max(rows_by_role.values(), default=0)
+        average = total_rows / role_ct if role_ct else 0.0
+        self.stdout.write(f'  {role_ct} object roles, {total_rows} role evaluations, {average:.1f} rows per role on average, {max_rows} at most')
+        for title, counts_by_role in (('role evaluations per object role', rows_by_role), ('users and teams assigned per object role', actors_by_role)):
+            self.stdout.write(f'  {title}:')
+            for label, bucket_ct in histogram(counts_by_role, role_ct):
+                self.stdout.write(f'    {label}: {bucket_ct} roles')
 
     def handle(self, *args, **options):
+        if options.get('workers', 1) < 1 or options.get('batch_size', 1000) < 1:
+            raise CommandError('--workers and --batch-size must be positive')
         self.has_issues = False
         self.check_role_definitions()
-        self.check_object_roles()
+        with repair_trigger(options.get('repair', False)):
+            self.check_evaluations(options)
+            self.check_orphans(options)
+        self.report_metrics()
         if not self.has_issues:
             self.stdout.write(self.style.SUCCESS('No issues were found'))
         else:
@@ -0,0 +1,52 @@
+"""
+Worker to do the RBAC updates saved to the outbox when ANSIBLE_BASE_RBAC_UPDATE_MODE is 'async'
+
+Usage::
+
+    django-admin process_rbac_outbox  # run forever, checking for new updates
+    django-admin process_rbac_outbox --once  # do all pending updates and exit
+    django-admin process_rbac_outbox --lag  # print number and age of pending updates and exit
+
+Multiple workers can run at the same time, entries are locked by the worker processing them.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from ansible_base.rbac.outbox import get_outbox_lag, process_pending_updates
+
+
+class Command(BaseCommand):
+    help = "Process pending RBAC updates from the outbox, used when ANSIBLE_BASE_RBAC_UPDATE_MODE is async"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of outbox entries to process in a single transaction")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait before checking again when the outbox is empty")
+        parser.add_argument("--once", action="store_true", help="Exit once the outbox is empty instead of waiting for new entries")
+        parser.add_argument("--lag", action="store_true", help="Only print the number of pending updates and age of the oldest one")
+
+    def write_lag(self):
+        lag = get_outbox_lag()
+        self.stdout.write(f"pending={lag['pending']} lag_seconds={lag['lag_seconds']:.3f}")
+
+    def handle(self, *args, **options):
+        if options['lag']:
+            self.write_lag()
+            return
+
+        total = 0
+        while True:
+            processed = process_pending_updates(batch_size=options['batch_size'])
+            total += processed
+            if processed:
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Processed {processed} RBAC outbox entries')
+                    self.write_lag()
+                continue
+
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(f'Processed {total} RBAC outbox entries in total')
@@ -0,0 +1,147 @@
+"""
+Rebuilds the computed RBAC data, the team member roles and the RoleEvaluation entries for every object role
+This is intended for after migrations, restores, or bulk imports which bypass signals.
+
+Usage::
+
+    django-admin rebuild_rbac_evaluations  # rebuild using a single process
+    django-admin rebuild_rbac_evaluations --workers 4  # split object roles by id range over 4 processes
+    django-admin rebuild_rbac_evaluations --checkpoint /tmp/rbac.json  # record finished id ranges to the file
+    django-admin rebuild_rbac_evaluations --checkpoint /tmp/rbac.json --resume  # skip ranges finished in a prior run
+
+Optional parameters::
+
+    `--batch-size number` object roles to compute and save at once, bounds memory use of each process
+    `--partitions number` number of id ranges to split object roles into, defaults to 4 times the workers
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from ansible_base.rbac.caching import batched_object_roles, compute_object_role_permissions, compute_team_member_roles
+from ansible_base.rbac.instrumentation import recompute_trigger
+from ansible_base.rbac.models import ObjectRole, RoleDefinition
+from ansible_base.rbac.prefetch import TypesPrefetch
+
+
+def get_partitions(partition_ct: int) -> list[list[int]]:
+    "Splits the range of ObjectRole ids into partition_ct inclusive [min_id, max_id] ranges"
+    id_range = ObjectRole.objects.aggregate(min_id=Min('id'), max_id=Max('id'))
+    if id_range['min_id'] is None:
+        return []
+    min_id, max_id = id_range['min_id'], id_range['max_id']
+    step = max((max_id - min_id + 1) // partition_ct, 1)
+    partitions = []
+    start = min_id
+    while start <= max_id:
+        end = start + step - 1
+        if len(partitions) == partition_ct - 1:
+            end = max_id
+        partitions.append([start, min(end, max_id)])
+        start = end + 1
+    return partitions
+
+
+@recompute_trigger('rebuild')
+def rebuild_partition(min_id: int, max_id: int, batch_size: int) -> tuple[int, int, int]:
+    """
+    Computes RoleEvaluation entries for object roles with ids in the given inclusive range
+    Evaluations are saved after every batch, so memory use does not grow with the size of the range.
+    Returns the number of object roles processed, and the number of evaluations added and deleted.
+    """
+    types_prefetch = TypesPrefetch.from_database(RoleDefinition)
+    role_ct = 0
+    added_ct = 0
+    deleted_ct = 0
+    role_qs = ObjectRole.objects.filter(id__gte=min_id, id__lte=max_id).order_by('id')
+    for role_batch in batched_object_roles(role_qs.iterator(chunk_size=batch_size), batch_size=batch_size):
+        stats = compute_object_role_permissions(object_roles=role_batch, types_prefetch=types_prefetch)
+        role_ct += stats.roles
+        added_ct += stats.added
+        deleted_ct += stats.deleted
+    return (role_ct, added_ct, deleted_ct)
+
+
+class Command(BaseCommand):
+    help = "Rebuilds team member roles and RoleEvaluation entries for all object roles, optionally with multiple processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Number of processes to compute evaluations with")
+        parser.add_argument("--partitions", type=int, default=None, help="Number of object role id ranges to split the work into")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Number of object roles to compute and save at once")
+        parser.add_argument("--checkpoint", type=str, default=None, help="File to record finished id ranges to")
+        parser.add_argument("--resume", action="store_true", help="Skip id ranges recorded as finished in the checkpoint file")
+
+    def load_checkpoint(self, options):
+        if not (options['resume'] and options['checkpoint'] and os.path.exists(options['checkpoint'])):
+            return None
+        with open(options['checkpoint']) as f:
+            return json.load(f)
+
+    def save_checkpoint(self, path, checkpoint):
+        if not path:
+            return
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+
+    @recompute_trigger('rebuild')
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError('--resume requires --checkpoint')
+
+        start_time = time.monotonic()
+        checkpoint = self.load_checkpoint(options)
+        if checkpoint is None:
+            # team membership is needed for evaluations of all roles, so this is done first in this process
+            compute_team_member_roles()
+            checkpoint = {'partitions': get_partitions(options['partitions'] or options['workers'] * 4), 'completed': []}
+            self.save_checkpoint(options['checkpoint'], checkpoint)
+        else:
+            self.stdout.write(f"Resuming with {len(checkpoint['completed'])} of {len(checkpoint['partitions'])} id ranges already finished")
+
+        todo = [partition for partition in checkpoint['partitions'] if partition not in checkpoint['completed']]
+        total_roles = 0
+        total_added = 0
+        total_deleted = 0
+
+        def record(partition, result):
+            nonlocal total_roles, total_added, total_deleted
+            total_roles += result[0]
+            total_added += result[1]
+            total_deleted += result[2]
+            checkpoint['completed'].append(partition)
+            self.save_checkpoint(options['checkpoint'], checkpoint)
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'Finished object roles with ids {partition[0]} to {partition[1]}, {result[0]} roles, '
+                    f'added {result[1]} and deleted {result[2]} evaluations'
+                )
+
+        if options['workers'] == 1:
+            for partition in todo:
+                record(partition, rebuild_partition(partition[0], partition[1], options['batch_size']))
+        elif todo:
+            # child processes can not share the database connections of this process, so they each make their own
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], mp_context=get_context('fork')) as executor:
+                futures = {executor.submit(rebuild_partition, partition[0], partition[1], options['batch_size']): partition for partition in todo}
+                for future in as_completed(futures):
+                    record(futures[future], future.result())
+
+        elapsed = max(time.monotonic() - start_time, 1e-6)
+        total_rows = total_added + total_deleted
+        self.stdout.write(
+            f'Rebuilt evaluations for {total_roles} object roles, added {total_added} and deleted {total_deleted} evaluations in {elapsed:.2f} seconds, '
+            f'{total_roles / elapsed:.1f} roles/second, {total_rows / elapsed:.1f} rows/second'
+        )
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.11 on 2026-10-17 06:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.ANSIBLE_BASE_TEAM_MODEL),
+        ('dab_rbac', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeamAncestor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(help_text='Number of team membership links between the team and the ancestor team')),
+                ('ancestor_team', models.ForeignKey(
+                    help_text='Members of this team are also members of the team',
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+',
+                    to=settings.ANSIBLE_BASE_TEAM_MODEL
+                )),
+                ('team', models.ForeignKey(
+                    help_text='The team which obtains membership from the ancestor team',
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name='+',
+                    to=settings.ANSIBLE_BASE_TEAM_MODEL
+                )),
+            ],
+            options={
+                'verbose_name_plural': 'team_ancestors',
+                'indexes': [models.Index(fields=['ancestor_team', 'team'], name='dab_rbac_te_ancesto_0bdfc3_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='teamancestor',
+            constraint=models.UniqueConstraint(fields=('team', 'ancestor_team'), name='one_entry_per_team_ancestor'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-17 07:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('dab_rbac', '0002_teamancestor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRoleUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_role_id', models.PositiveIntegerField(help_text='The object role whose permission evaluations need to be updated', null=True)),
+                ('object_id', models.TextField(null=True)),
+                ('update_teams', models.BooleanField(default=False, help_text='Team membership needs to be updated for teams given membership to by the content_type and object_id')),
+                ('update_all_teams', models.BooleanField(default=False, help_text='Team membership needs to be updated for all teams')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, help_text='When the update was requested, used to measure how far behind updates are')),
+                ('created_by_id', models.PositiveIntegerField(help_text='The user whose request made this update needed', null=True)),
+                ('content_type', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'verbose_name_plural': 'pending_role_updates',
+                'indexes': [models.Index(fields=['object_role_id'], name='dab_rbac_pe_object__d36c09_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.11 on 2026-10-17 07:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from ansible_base.rbac.migrations._utils import backfill_evaluation_permissions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dab_rbac', '0003_pendingroleupdate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='roleevaluation',
+            name='permission',
+            field=models.ForeignKey(
+                db_index=False,
+                help_text='The permission, same as codename but stored as an integer',
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='+',
+                to='dab_rbac.dabpermission'
+            ),
+        ),
+        migrations.AddField(
+            model_name='roleevaluationuuid',
+            name='permission',
+            field=models.ForeignKey(
+                db_index=False,
+                help_text='The permission, same as codename but stored as an integer',
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='+',
+                to='dab_rbac.dabpermission'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='roleevaluation',
+            index=models.Index(fields=['role', 'content_type_id', 'permission'], name='dab_rbac_ro_role_id_10ce4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roleevaluationuuid',
+            index=models.Index(fields=['role', 'content_type_id', 'permission'], name='dab_rbac_ro_role_id_147386_idx'),
+        ),
+        migrations.RunPython(backfill_evaluation_permissions, migrations.RunPython.noop),
+    ]
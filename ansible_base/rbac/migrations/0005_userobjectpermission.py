@@ -0,0 +1,61 @@
+# Generated by Django 4.2.11 on 2026-10-17 08:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dab_rbac', '0004_roleevaluation_permission'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserObjectPermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codename', models.TextField(help_text='The name of the permission, giving the action and the model, from the Django Permission model')),
+                ('content_type_id', models.PositiveIntegerField()),
+                ('object_id', models.PositiveIntegerField()),
+                ('permission', models.ForeignKey(db_index=False, help_text='The permission, same as codename but stored as an integer', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dab_rbac.dabpermission')),
+                ('user', models.ForeignKey(help_text='The user who has this permission from any of their roles', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'user_object_permissions',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserObjectPermissionUUID',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codename', models.TextField(help_text='The name of the permission, giving the action and the model, from the Django Permission model')),
+                ('content_type_id', models.PositiveIntegerField()),
+                ('object_id', models.UUIDField()),
+                ('permission', models.ForeignKey(db_index=False, help_text='The permission, same as codename but stored as an integer', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='dab_rbac.dabpermission')),
+                ('user', models.ForeignKey(help_text='The user who has this permission from any of their roles', on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'user_object_permissions',
+                'indexes': [models.Index(fields=['user', 'content_type_id', 'permission', 'object_id'], name='dab_rbac_us_user_id_d85371_idx'), models.Index(fields=['content_type_id', 'object_id'], name='dab_rbac_us_content_7f502f_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='userobjectpermissionuuid',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type_id', 'codename', 'object_id'), name='one_entry_per_user_object_permission_uuid'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(fields=['user', 'content_type_id', 'permission', 'object_id'], name='dab_rbac_us_user_id_d46ca8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userobjectpermission',
+            index=models.Index(fields=['content_type_id', 'object_id'], name='dab_rbac_us_content_2ccd91_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='userobjectpermission',
+            constraint=models.UniqueConstraint(fields=('user', 'content_type_id', 'codename', 'object_id'), name='one_entry_per_user_object_permission'),
+        ),
+    ]
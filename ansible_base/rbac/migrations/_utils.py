@@ -45,3 +45,19 @@ def give_permissions(apps, rd, users=(), teams=(), object_id=None, content_type_
                 for team_id in teams
             ]
         RoleTeamAssignment.objects.bulk_create(team_assignments)
+
+
+def backfill_evaluation_permissions(apps, schema_editor):
+    """
+    Fill in the permission for role evaluation entries saved before the permission field existed
+    Entries only have a codename, which is shared by permissions of different models in rare cases,
+    so this uses the first permission with the codename, which is the same as new entries use.
+    """
+    DABPermission = apps.get_model('dab_rbac', 'DABPermission')
+    permission_ids = {}
+    for permission_id, codename in DABPermission.objects.order_by('id').values_list('id', 'codename'):
+        permission_ids.setdefault(codename, permission_id)
+    for model_name in ('RoleEvaluation', 'RoleEvaluationUUID'):
+        eval_cls = apps.get_model('dab_rbac', model_name)
+        for codename, permission_id in permission_ids.items():
+            eval_cls.objects.filter(codename=codename, permission__isnull=True).update(permission_id=permission_id)
@@ -1,5 +1,8 @@
 import logging
+import operator
+from collections import defaultdict
 from collections.abc import Iterable
+from functools import reduce
 from typing import Optional, Type
 
 # Django
@@ -10,6 +13,7 @@ from django.db import connection, models, transaction
 from django.db.models.functions import Cast
 from django.db.models.query import QuerySet
 from django.db.utils import IntegrityError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 # Django-rest-framework
@@ -22,7 +26,8 @@ from ansible_base.lib.abstract_models.common import CommonModel, ImmutableCommon
 from ansible_base.lib.utils.models import is_add_perm
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.prefetch import TypesPrefetch
-from ansible_base.rbac.validators import validate_assignment, validate_permissions_for_model
+from ansible_base.rbac.role_cache import role_cache_enabled, team_global_roles_changed, user_roles_changed
+from ansible_base.rbac.validators import codenames_for_cls, validate_assignment, validate_permissions_for_model
 
 logger = logging.getLogger('ansible_base.rbac.models')
 
@@ -45,6 +50,45 @@ class DABPermission(models.Model):
         return f"<{self.__class__.__name__}: {self.codename}>"
 
 
+# Mapping of codename to DABPermission ids, loaded once per process, used to look up evaluations by permission id
+# this is replaced as a whole when loaded, so other threads never see it partially filled
+_permission_ids: dict[str, list[int]] = {}
+# codenames not found when the mapping was loaded, so that looking them up again does not reload it
+_missing_codenames: set[str] = set()
+
+
+def load_permission_ids() -> None:
+    global _permission_ids, _missing_codenames
+    permission_ids = {}
+    for permission_id, codename in DABPermission.objects.order_by('id').values_list('id', 'codename'):
+        permission_ids.setdefault(codename, []).append(permission_id)
+    _permission_ids, _missing_codenames = permission_ids, set()
+
+
+def clear_permission_ids() -> None:
+    "Called after migrations, which may create permissions or, when tests flush the database, change their ids"
+    global _permission_ids, _missing_codenames
+    _permission_ids, _missing_codenames = {}, set()
+
+
+def get_permission_ids(codename: str) -> list[int]:
+    "Returns the ids of DABPermission entries with the codename, custom permissions for different models can share a codename"
+    permission_ids = _permission_ids.get(codename)
+    if permission_ids is None and codename not in _missing_codenames:
+        # the permission may have been created after the mapping was loaded
+        load_permission_ids()
+        permission_ids = _permission_ids.get(codename)
+        if permission_ids is None:
+            _missing_codenames.add(codename)
+    return permission_ids or []
+
+
+def get_permission_id(codename: str) -> Optional[int]:
+    "Gives the permission id to save with evaluation entries for codename"
+    permission_ids = get_permission_ids(codename)
+    return permission_ids[0] if permission_ids else None
+
+
 class ManagedRoleFromSetting:
     def __init__(self, role_name):
         super().__init__()
@@ -208,14 +252,17 @@ class RoleDefinition(CommonModel):
                 assignment.delete()
 
         # Clear any cached permissions
+        from ansible_base.rbac.evaluations import bound_singleton_permissions, invalidate_evaluation_caches
+
+        invalidate_evaluation_caches()
         if actor._meta.model_name == 'user':
+            user_roles_changed(actor.pk)
             if hasattr(actor, '_singleton_permissions'):
                 delattr(actor, '_singleton_permissions')
         else:
+            team_global_roles_changed(actor.pk)
             # when team permissions change, users in memory may be affected by this
             # but there is no way to know what users, so we use a global flag
-            from ansible_base.rbac.evaluations import bound_singleton_permissions
-
             bound_singleton_permissions._team_clear_signal = True
 
         return assignment
@@ -282,7 +329,14 @@ class RoleDefinition(CommonModel):
                 to_update.remove(object_role)
             object_role.delete()
 
-        update_after_assignment(update_teams, to_update)
+        user_ids = ()
+        if actor._meta.model_name == 'user':
+            user_roles_changed(actor.pk)
+            if user_evaluations_enabled():
+                # the evaluations of an existing role may not change, but the permissions of the user do
+                user_ids = (actor.pk,)
+
+        update_after_assignment(update_teams, to_update, user_ids=user_ids)
 
         if not sync_action and self.name in permission_registry._trackers:
             tracker = permission_registry._trackers[self.name]
@@ -335,31 +389,38 @@ class ObjectRoleFields(models.Model):
     content_object = GenericForeignKey('content_type', 'object_id')
 
     @classmethod
-    def _visible_items(cls, eval_cls, user, qs=None):
-        permission_qs = eval_cls.objects.filter(
-            role__in=user.has_roles.all(),
-            content_type_id=models.OuterRef('content_type_id'),
-        )
-        # NOTE: type casting is necessary in postgres but not sqlite3
-        object_id_field = cls._meta.get_field('object_id')
-        obj_filter = models.Q(object_id__in=permission_qs.values_list(Cast('object_id', output_field=object_id_field)))
-
-        if not hasattr(user, '_singleton_permission_objs'):
-            user._singleton_permission_objs = RoleDefinition.user_global_permissions(user)
+    def visible_items(cls, user, qs=None):
+        """Items for objects the user has any permission to, or for types of objects the user has a system-wide permission to
 
+        The evaluation table, integer or UUID, is picked for each registered model, and its subquery
+        is only filtered by the user and a constant content type, so it is not correlated to the items.
+        System-wide permissions come from user.singleton_permissions, which uses the shared role cache if enabled.
+        """
         if qs is None:
             qs = cls.objects.all()
 
-        if user._singleton_permission_objs:
-            super_ct_ids = set(perm.content_type_id for perm in user._singleton_permission_objs)
+        global_codenames = set(user.singleton_permissions())
+        # NOTE: type casting is necessary in postgres but not sqlite3
+        object_id_field = cls._meta.get_field('object_id')
+        visible_filter = models.Q()
+        for model_cls in permission_registry.all_registered_models:
+            ct_id = permission_registry.content_type_id(model_cls)
+            if global_codenames.intersection(permission_registry.get_codenames(model_cls)):
+                visible_filter |= models.Q(content_type_id=ct_id)
+                continue
+            eval_cls = get_evaluation_model(model_cls)
+            object_ids = eval_cls.actor_evaluations(user).filter(content_type_id=ct_id).values_list(Cast('object_id', output_field=object_id_field))
+            visible_filter |= models.Q(content_type_id=ct_id, object_id__in=object_ids)
+            if parent_evaluations_enabled() and permission_registry.get_parent_paths(model_cls) and 'view' in model_cls._meta.default_permissions:
+                # in parent storage mode, objects with view permission from a parent object have no evaluation entries
+                visible_filter |= models.Q(content_type_id=ct_id, object_id__in=model_cls.access_ids_qs(user, 'view', cast_field=object_id_field))
+
+        if global_codenames:
             # content_type=None condition: A good-enough rule - you can see other global assignments if you have any yourself
-            return qs.filter(obj_filter | models.Q(content_type__in=super_ct_ids) | models.Q(content_type=None))
-        return qs.filter(obj_filter)
-
-    @classmethod
-    def visible_items(cls, user, qs=None):
-        "This ORs querysets to show assignments to both UUID and integer pk models"
-        return cls._visible_items(RoleEvaluation, user, qs) | cls._visible_items(RoleEvaluationUUID, user, qs)
+            visible_filter |= models.Q(content_type=None)
+        if not visible_filter:
+            return qs.none()
+        return qs.filter(visible_filter)
 
     @property
     def cache_id(self):
@@ -494,7 +555,9 @@ class ObjectRole(ObjectRoleFields):
     )
 
     def __str__(self):
-        return f'ObjectRole(pk={self.id}, {self.content_type.model}={self.object_id})'
+        # uses the content type cache, because this is logged for every role in a recompute
+        model_name = ContentType.objects.get_for_id(self.content_type_id).model
+        return f'ObjectRole(pk={self.id}, {model_name}={self.object_id})'
 
     def save(self, *args, **kwargs):
         if self.id:
@@ -512,9 +575,16 @@ class ObjectRole(ObjectRoleFields):
             descendents.update(set(target_team.has_roles.all()))
         return descendents
 
-    def expected_direct_permissions(self, types_prefetch=None):
+    def expected_direct_permission_sources(self, types_prefetch=None):
+        """
+        Gives the information needed for expected_direct_permissions without querying child objects
+        returns tuple of
+            set of (codename, content_type_id, object_id) evaluations that do not depend on child objects
+            set of (codename, content_type_id, child_model, filter_path, object_id) for evaluations
+              that apply to every child_model object matching filter_path=object_id
+        """
         expected_evaluations = set()
-        cached_id_lists = {}
+        child_evaluations = set()
         if not types_prefetch:
             types_prefetch = TypesPrefetch()
         role_content_type = types_prefetch.get_content_type(self.content_type_id)
@@ -529,6 +599,12 @@ class ObjectRole(ObjectRoleFields):
                 expected_evaluations.add((permission.codename, self.content_type_id, object_id))
                 continue
 
+            # in parent storage mode, child permissions are only saved for the role object
+            # and evaluations join child objects to it through their parent fields
+            if parent_evaluations_enabled():
+                expected_evaluations.add((permission.codename, self.content_type_id, object_id))
+                continue
+
             # add child permission on the parent object, usually only for add permission
             if is_add_perm(permission.codename) or settings.ANSIBLE_BASE_CACHE_PARENT_PERMISSIONS:
                 expected_evaluations.add((permission.codename, self.content_type_id, object_id))
@@ -542,7 +618,7 @@ class ObjectRole(ObjectRoleFields):
                     if '__' in path and model._meta.model_name == permission_content_type.model:
                         path_to_parent, filter_path = path.split('__', 1)
                         child_model = permission_content_type.model_class()._meta.get_field(path_to_parent).related_model
-                        eval_ct = ContentType.objects.get_for_model(child_model).id
+                        eval_ct = permission_registry.content_type_id(child_model)
                 if not child_model:
                     continue
             else:
@@ -556,17 +632,20 @@ class ObjectRole(ObjectRoleFields):
                     logger.warning(f'{self.role_definition} listed {permission.codename} but model is not a child, ignoring')
                     continue
 
-            # fetching child objects of an organization is very performance sensitive
-            # for multiple permissions of same type, make sure to only do query once
-            id_list = []
-            if eval_ct in cached_id_lists:
-                id_list = cached_id_lists[eval_ct]
-            else:
-                id_list = child_model.objects.filter(**{filter_path: object_id}).values_list('pk', flat=True)
-                cached_id_lists[eval_ct] = list(id_list)
+            child_evaluations.add((permission.codename, eval_ct, child_model, filter_path, object_id))
+        return (expected_evaluations, child_evaluations)
 
-            for id in id_list:
-                expected_evaluations.add((permission.codename, eval_ct, id))
+    def expected_direct_permissions(self, types_prefetch=None):
+        # fetching child objects of an organization is very performance sensitive
+        # the types_prefetch keeps lists of child ids so that the query is only done once
+        # compute_object_role_permissions further fetches these for many roles at once
+        if not types_prefetch:
+            types_prefetch = TypesPrefetch()
+        expected_evaluations, child_evaluations = self.expected_direct_permission_sources(types_prefetch)
+
+        for codename, eval_ct, child_model, filter_path, object_id in child_evaluations:
+            for id in types_prefetch.get_child_ids(child_model, filter_path, object_id):
+                expected_evaluations.add((codename, eval_ct, id))
         return expected_evaluations
 
     def needed_cache_updates(self, types_prefetch=None):
@@ -590,17 +669,50 @@ class ObjectRole(ObjectRoleFields):
 
         to_add = []
         for codename, ct_id, obj_pk in expected_evaluations - existing_set:
-            to_add.append(RoleEvaluation(codename=codename, content_type_id=ct_id, object_id=obj_pk, role=self))
+            to_add.append(RoleEvaluation(codename=codename, content_type_id=ct_id, object_id=obj_pk, role=self, permission_id=get_permission_id(codename)))
 
         return (to_delete, to_add)
 
 
+# COMPUTED DATA
+class TeamAncestor(models.Model):
+    """
+    Closure table of the team-of-teams graph
+    example:
+        Team 5 has ancestor team 3 at depth 2
+    means that members of team 3 are members of another team (depth 1) which gives membership to team 5
+
+    A team can give membership to another team by having a role that lists the team member permission
+    for that team, or for the organization of that team.
+    This is filled in along with ObjectRole.provides_teams by compute_team_member_roles()
+    so that questions about the team graph can be answered with a single indexed query.
+    """
+
+    class Meta:
+        app_label = 'dab_rbac'
+        verbose_name_plural = _('team_ancestors')
+        indexes = [models.Index(fields=["ancestor_team", "team"])]
+        constraints = [models.UniqueConstraint(name='one_entry_per_team_ancestor', fields=['team', 'ancestor_team'])]
+
+    team = models.ForeignKey(
+        settings.ANSIBLE_BASE_TEAM_MODEL, on_delete=models.CASCADE, related_name='+', help_text=_("The team which obtains membership from the ancestor team")
+    )
+    ancestor_team = models.ForeignKey(
+        settings.ANSIBLE_BASE_TEAM_MODEL, on_delete=models.CASCADE, related_name='+', help_text=_("Members of this team are also members of the team")
+    )
+    depth = models.PositiveIntegerField(help_text=_("Number of team membership links between the team and the ancestor team"))
+
+    def __str__(self):
+        return f'TeamAncestor(team={self.team_id}, ancestor_team={self.ancestor_team_id}, depth={self.depth})'
+
+
 class RoleEvaluationMeta:
     app_label = 'dab_rbac'
     verbose_name_plural = _('role_object_permissions')
     indexes = [
         models.Index(fields=["role", "content_type_id", "object_id"]),  # used by get_roles_on_resource
         models.Index(fields=["role", "content_type_id", "codename"]),  # used by accessible_objects
+        models.Index(fields=["role", "content_type_id", "permission"]),  # used by accessible_objects with ANSIBLE_BASE_EVALUATIONS_USE_PERMISSION_ID
     ]
     constraints = [models.UniqueConstraint(name='one_entry_per_object_permission_and_role', fields=['object_id', 'content_type_id', 'codename', 'role'])]
 
@@ -642,11 +754,38 @@ class RoleEvaluationFields(models.Model):
     # NOTE: we do not form object_id and content_type into a content_object, following from AWX practice
     # this can be relaxed as we have comparative performance testing to confirm doing so does not affect permissions
     content_type_id = models.PositiveIntegerField(null=False)
+    # Compact alternative to codename for lookups, saved for all new entries and filled in for old entries by migration
+    permission = models.ForeignKey(
+        DABPermission,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,  # covered by the role, content_type_id, permission index
+        help_text=_("The permission, same as codename but stored as an integer"),
+    )
+
+    @staticmethod
+    def permission_filter(codename: str) -> dict:
+        "Filter arguments for evaluations of codename, using the permission id if ANSIBLE_BASE_EVALUATIONS_USE_PERMISSION_ID is set"
+        if settings.ANSIBLE_BASE_EVALUATIONS_USE_PERMISSION_ID:
+            return {'permission_id__in': get_permission_ids(codename)}
+        return {'codename': codename}
 
     def obj_perm_id(self):
         "Used for in-memory hashing of the type of object permission this represents"
         return (self.codename, self.content_type_id, self.object_id)
 
+    @classmethod
+    def actor_evaluations(cls, actor) -> QuerySet:
+        """Evaluation entries of this type for the roles of a user or team, to be filtered further
+
+        If ANSIBLE_BASE_EVALUATIONS_PER_USER is set, entries for users come from the per-user table,
+        which has the same fields, except for the role, and no duplicate entries.
+        """
+        if user_evaluations_enabled() and actor._meta.model_name == permission_registry.user_model._meta.model_name:
+            return get_user_evaluation_model(cls).objects.filter(user=actor)
+        return cls.objects.filter(role__in=held_roles(actor))
+
     @classmethod
     def accessible_ids(cls, model_cls, actor, codename: str, content_types: Optional[Iterable[int]] = None, cast_field=None) -> QuerySet:
         """
@@ -660,21 +799,73 @@ class RoleEvaluationFields(models.Model):
         """
         # We only have a content_types exception for multiple content types for polymorphic models
         # for normal models you should not need it, but AWX unified_ models need it to get by
-        filter_kwargs = dict(role__in=actor.has_roles.all(), codename=codename)
+        filter_kwargs = cls.permission_filter(codename)
         if content_types:
             filter_kwargs['content_type_id__in'] = content_types
         else:
-            filter_kwargs['content_type_id'] = ContentType.objects.get_for_model(model_cls).id
-        qs = cls.objects.filter(**filter_kwargs)
+            filter_kwargs['content_type_id'] = permission_registry.content_type_id(model_cls)
+        qs = cls.actor_evaluations(actor).filter(**filter_kwargs)
+        if not direct_evaluation_applies(model_cls, codename):
+            qs = qs.none()
+
+        if parent_paths := parent_evaluation_paths(model_cls, codename):
+            # in parent storage mode, also give objects whose parent objects have the permission
+            id_filter = models.Q(pk__in=qs.values('object_id'))
+            for path, parent_model in parent_paths:
+                parent_qs = (
+                    get_evaluation_model(parent_model)
+                    .actor_evaluations(actor)
+                    .filter(content_type_id=permission_registry.content_type_id(parent_model), **cls.permission_filter(codename))
+                )
+                id_filter |= models.Q(**{f'{path}__in': parent_qs.values('object_id')})
+            ids_qs = model_cls.objects.filter(id_filter)
+            if cast_field is None:
+                return ids_qs.values_list('pk')
+            else:
+                return ids_qs.values_list(Cast('pk', output_field=cast_field))
+
         if cast_field is None:
-            return qs.values_list('object_id').distinct()
+            ids_qs = qs.values_list('object_id')
         else:
-            return qs.values_list(Cast('object_id', output_field=cast_field)).distinct()
+            ids_qs = qs.values_list(Cast('object_id', output_field=cast_field))
+        if qs.model in (RoleEvaluation, RoleEvaluationUUID):
+            # different roles can give the same permission, per-user entries are already unique
+            ids_qs = ids_qs.distinct()
+        return ids_qs
+
+    @classmethod
+    def accessible_exists_filter(cls, model_cls, actor, codename: str) -> Optional[models.Q]:
+        """
+        Filter for objects of model_cls that actor has codename permission to, made of correlated EXISTS subqueries
+        Unlike filtering by accessible_ids, this needs no DISTINCT, and the database can stop at the first entry for each object.
+        Returns None if no entries can give the permission.
+        """
+        conditions = []
+        if direct_evaluation_applies(model_cls, codename):
+            evaluation_qs = cls.actor_evaluations(actor).filter(
+                content_type_id=permission_registry.content_type_id(model_cls), object_id=models.OuterRef('pk'), **cls.permission_filter(codename)
+            )
+            conditions.append(models.Exists(evaluation_qs))
+        for path, parent_model in parent_evaluation_paths(model_cls, codename):
+            parent_qs = (
+                get_evaluation_model(parent_model)
+                .actor_evaluations(actor)
+                .filter(content_type_id=permission_registry.content_type_id(parent_model), object_id=models.OuterRef(path), **cls.permission_filter(codename))
+            )
+            conditions.append(models.Exists(parent_qs))
+        if not conditions:
+            return None
+        return reduce(operator.or_, [models.Q(condition) for condition in conditions])
 
     @classmethod
     def accessible_objects(cls, model_cls, user, codename, queryset: Optional[QuerySet] = None) -> QuerySet:
         if queryset is None:
             queryset = model_cls.objects.all()
+        if access_qs_strategy(model_cls) == 'exists':
+            exists_filter = cls.accessible_exists_filter(model_cls, user, codename)
+            if exists_filter is None:
+                return queryset.none()
+            return queryset.filter(exists_filter)
         return queryset.filter(pk__in=cls.accessible_ids(model_cls, user, codename))
 
     @classmethod
@@ -683,9 +874,73 @@ class RoleEvaluationFields(models.Model):
         Returns permissions that a user has to obj from object-roles,
         does not consider permissions from user flags or system-wide roles
         """
-        return cls.objects.filter(role__in=user.has_roles.all(), content_type_id=ContentType.objects.get_for_model(obj).id, object_id=obj.id).values_list(
-            'codename', flat=True
+        codename_qs = (
+            cls.actor_evaluations(user).filter(content_type_id=permission_registry.content_type_id(obj), object_id=obj.id).values_list('codename', flat=True)
+        )
+        if not parent_evaluations_enabled():
+            return codename_qs
+
+        model_cls = type(obj)
+        codenames = set(codename for codename in codename_qs if direct_evaluation_applies(model_cls, codename))
+        for path, parent_model in permission_registry.get_parent_paths(model_cls):
+            parent_codename_qs = (
+                get_evaluation_model(parent_model)
+                .actor_evaluations(user)
+                .filter(
+                    content_type_id=permission_registry.content_type_id(parent_model),
+                    object_id__in=model_cls.objects.filter(pk=obj.pk).values(path),
+                )
+                .values_list('codename', flat=True)
+            )
+            for codename in parent_codename_qs:
+                if (path, parent_model) in parent_evaluation_paths(model_cls, codename):
+                    codenames.add(codename)
+        return codenames
+
+    @classmethod
+    def get_permissions_bulk(cls, user, model_cls, pks) -> dict:
+        """
+        Same as get_permissions, but for many objects of model_cls at once
+        Returns {pk: {codename, ...}, ...} with a query for each level of parent objects in parent storage mode
+        """
+        permissions = {pk: set() for pk in pks}
+        ct_id = permission_registry.content_type_id(model_cls)
+        for object_id, codename in cls.actor_evaluations(user).filter(content_type_id=ct_id, object_id__in=pks).values_list('object_id', 'codename'):
+            if direct_evaluation_applies(model_cls, codename):
+                permissions.setdefault(object_id, set()).add(codename)
+
+        if parent_evaluations_enabled():
+            for path, parent_model in permission_registry.get_parent_paths(model_cls):
+                children_of_parent = defaultdict(list)
+                for pk, parent_id in model_cls.objects.filter(pk__in=pks).values_list('pk', path):
+                    if parent_id is not None:
+                        children_of_parent[parent_id].append(pk)
+                parent_qs = (
+                    get_evaluation_model(parent_model)
+                    .actor_evaluations(user)
+                    .filter(
+                        content_type_id=permission_registry.content_type_id(parent_model),
+                        object_id__in=list(children_of_parent.keys()),
+                    )
+                )
+                for parent_id, codename in parent_qs.values_list('object_id', 'codename'):
+                    if (path, parent_model) in parent_evaluation_paths(model_cls, codename):
+                        for pk in children_of_parent[parent_id]:
+                            permissions[pk].add(codename)
+        return permissions
+
+    @classmethod
+    def permitted_pks(cls, user, model_cls, pks, codename) -> set:
+        "Gives the pks, out of the given pks of model_cls objects, which the user has codename permission to"
+        if parent_evaluation_paths(model_cls, codename):
+            ids_qs = model_cls.objects.filter(pk__in=pks).filter(pk__in=cls.accessible_ids(model_cls, user, codename))
+            return set(ids_qs.values_list('pk', flat=True))
+        if not direct_evaluation_applies(model_cls, codename):
+            return set()
+        evaluation_qs = cls.actor_evaluations(user).filter(
+            content_type_id=permission_registry.content_type_id(model_cls), object_id__in=pks, **cls.permission_filter(codename)
         )
+        return set(evaluation_qs.values_list('object_id', flat=True))
 
     @classmethod
     def has_obj_perm(cls, user, obj, codename) -> bool:
@@ -693,9 +948,21 @@ class RoleEvaluationFields(models.Model):
         Note this behaves similar in function to the REST Framework has_object_permission
         method on permission classes, but it is named differently to avoid unintentionally conflicting
         """
-        return cls.objects.filter(
-            role__in=user.has_roles.all(), content_type_id=ContentType.objects.get_for_model(obj).id, object_id=obj.pk, codename=codename
-        ).exists()
+        model_cls = type(obj)
+        # entries in parent storage mode may be in a different table than obj, so filters are grouped by evaluation model
+        obj_filters = defaultdict(list)
+        if direct_evaluation_applies(model_cls, codename):
+            obj_filters[cls].append(models.Q(content_type_id=permission_registry.content_type_id(obj), object_id=obj.pk))
+        for path, parent_model in parent_evaluation_paths(model_cls, codename):
+            parent_ids = model_cls.objects.filter(pk=obj.pk).values(path)
+            obj_filters[get_evaluation_model(parent_model)].append(
+                models.Q(content_type_id=permission_registry.content_type_id(parent_model), object_id__in=parent_ids)
+            )
+
+        for eval_cls, q_list in obj_filters.items():
+            if eval_cls.actor_evaluations(user).filter(reduce(operator.or_, q_list), **cls.permission_filter(codename)).exists():
+                return True
+        return False
 
 
 class RoleEvaluation(RoleEvaluationFields):
@@ -726,6 +993,163 @@ class RoleEvaluationUUID(RoleEvaluationFields):
     object_id = models.UUIDField(null=False)
 
 
+class UserObjectPermissionMeta:
+    app_label = 'dab_rbac'
+    verbose_name_plural = _('user_object_permissions')
+    indexes = [
+        models.Index(fields=["user", "content_type_id", "permission", "object_id"]),  # used with ANSIBLE_BASE_EVALUATIONS_USE_PERMISSION_ID
+        models.Index(fields=["content_type_id", "object_id"]),  # used to delete entries for deleted objects
+    ]
+    # also the index used by accessible_objects and has_obj_perm, which only needs to read the index
+    constraints = [models.UniqueConstraint(name='one_entry_per_user_object_permission', fields=['user', 'content_type_id', 'codename', 'object_id'])]
+
+
+# COMPUTED DATA
+class UserObjectPermissionFields(models.Model):
+    """
+    Optional copy of the RoleEvaluation data with an entry for each user and permission, instead of each role.
+    This is only saved if ANSIBLE_BASE_EVALUATIONS_PER_USER is set, in which case user evaluations use it,
+    so they do not need to join to the roles the user has, or remove duplicate entries from different roles.
+
+    The only method that should ever write to this table is compute_user_object_permissions()
+    """
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return (
+            f'{self._meta.verbose_name.title()}(pk={self.id}, codename={self.codename}, object_id={self.object_id}, '
+            f'content_type_id={self.content_type_id}, user_id={self.user_id})'
+        )
+
+    def save(self, *args, **kwargs):
+        if self.id:
+            raise RuntimeError(f'{self._meta.model_name} model is immutable and only used internally')
+        return super().save(*args, **kwargs)
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', help_text=_("The user who has this permission from any of their roles")
+    )
+    codename = models.TextField(null=False, help_text=_("The name of the permission, giving the action and the model, from the Django Permission model"))
+    content_type_id = models.PositiveIntegerField(null=False)
+    permission = models.ForeignKey(
+        DABPermission,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='+',
+        db_index=False,  # covered by the user, content_type_id, permission index
+        help_text=_("The permission, same as codename but stored as an integer"),
+    )
+
+
+class UserObjectPermission(UserObjectPermissionFields):
+    class Meta(UserObjectPermissionMeta):
+        pass
+
+    object_id = models.PositiveIntegerField(null=False)
+
+
+class UserObjectPermissionUUID(UserObjectPermissionFields):
+    "Per-user entries for UUID type models"
+
+    class Meta(UserObjectPermissionMeta):
+        constraints = [models.UniqueConstraint(name='one_entry_per_user_object_permission_uuid', fields=['user', 'content_type_id', 'codename', 'object_id'])]
+
+    object_id = models.UUIDField(null=False)
+
+
+class PendingRoleUpdate(models.Model):
+    """
+    Outbox of updates to computed data which have not been done yet
+    This is only used if ANSIBLE_BASE_RBAC_UPDATE_MODE is "async", in which case triggers save
+    what needs to be updated here, and the process_rbac_outbox management command does the updates.
+
+    The object role is referenced by its id, content_type, and object_id without a foreign key,
+    because the team membership of a deleted object role may still need to be updated.
+    Entries with the user content_type, and update_teams not set, mean the per-user evaluations
+    of that user need to be updated, like after the user lost a role.
+    """
+
+    class Meta:
+        app_label = 'dab_rbac'
+        verbose_name_plural = _('pending_role_updates')
+        indexes = [models.Index(fields=["object_role_id"])]
+
+    object_role_id = models.PositiveIntegerField(null=True, help_text=_("The object role whose permission evaluations need to be updated"))
+    content_type = models.ForeignKey(ContentType, null=True, on_delete=models.CASCADE)
+    object_id = models.TextField(null=True)
+    update_teams = models.BooleanField(
+        default=False, help_text=_("Team membership needs to be updated for teams given membership to by the content_type and object_id")
+    )
+    update_all_teams = models.BooleanField(default=False, help_text=_("Team membership needs to be updated for all teams"))
+    created = models.DateTimeField(default=timezone.now, help_text=_("When the update was requested, used to measure how far behind updates are"))
+    created_by_id = models.PositiveIntegerField(null=True, help_text=_("The user whose request made this update needed"))
+
+    def __str__(self):
+        return f'PendingRoleUpdate(pk={self.id}, object_role_id={self.object_role_id}, content_type_id={self.content_type_id}, object_id={self.object_id})'
+
+
+def parent_evaluations_enabled() -> bool:
+    return settings.ANSIBLE_BASE_EVALUATIONS_STORAGE == 'parent'
+
+
+def direct_evaluation_applies(model_cls, codename: str) -> bool:
+    """
+    Tells if an evaluation entry for codename on an object of model_cls gives that permission to the object
+    In parent storage mode, entries for permissions to child objects are also saved on the parent object,
+    but those do not give the permission to the parent object, unless the other settings would save it anyway.
+    """
+    if not parent_evaluations_enabled():
+        return True
+    return is_add_perm(codename) or settings.ANSIBLE_BASE_CACHE_PARENT_PERMISSIONS or codename in codenames_for_cls(model_cls)
+
+
+def parent_evaluation_paths(model_cls, codename: str) -> list[tuple[str, Type[models.Model]]]:
+    """
+    In parent storage mode, gives the (path, parent_model) of parent objects whose evaluation entries
+    for codename give that permission to objects of model_cls, otherwise gives an empty list
+    """
+    if not parent_evaluations_enabled():
+        return []
+    if is_add_perm(codename):
+        # add permission is evaluated on the parent of the new object, like add_inventory for an organization
+        direct_child_models = [child_cls for path, child_cls in permission_registry.get_child_models(model_cls) if '__' not in path]
+        if not any(codename in codenames_for_cls(child_cls) for child_cls in direct_child_models):
+            return []
+    elif codename not in codenames_for_cls(model_cls):
+        return []
+    return permission_registry.get_parent_paths(model_cls)
+
+
+def held_roles(actor):
+    """Object roles directly given to the user or team, for filtering evaluations by role
+
+    With the shared role cache enabled, this gives a list of role ids for users, otherwise a subquery
+    """
+    if actor._meta.model_name == permission_registry.user_model._meta.model_name and role_cache_enabled():
+        from ansible_base.rbac.evaluations import get_role_data
+
+        return get_role_data(actor)['role_ids']
+    return actor.has_roles.all()
+
+
+def access_qs_strategy(model_cls) -> str:
+    "Gives how access_qs filters objects of model_cls, which can be set for each model, by model label like test_app.inventory"
+    return settings.ANSIBLE_BASE_ACCESS_QS_STRATEGY_BY_MODEL.get(model_cls._meta.label_lower, settings.ANSIBLE_BASE_ACCESS_QS_STRATEGY)
+
+
+def user_evaluations_enabled() -> bool:
+    return settings.ANSIBLE_BASE_EVALUATIONS_PER_USER
+
+
+def get_user_evaluation_model(evaluation_model):
+    "Gives the per-user table with the same type of object_id as the RoleEvaluation model"
+    if evaluation_model is RoleEvaluationUUID:
+        return UserObjectPermissionUUID
+    return UserObjectPermission
+
+
 def get_evaluation_model(cls):
     pk_field = cls._meta.pk
     # For proxy models, including django-polymorphic, use the id field from parent table
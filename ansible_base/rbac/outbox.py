@@ -0,0 +1,130 @@
+import logging
+
+from crum import get_current_user
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ansible_base.rbac.batch import apply_updates, async_updates_enabled
+from ansible_base.rbac.instrumentation import recompute_trigger
+from ansible_base.rbac.models import ObjectRole, PendingRoleUpdate
+from ansible_base.rbac.permission_registry import permission_registry
+
+logger = logging.getLogger('ansible_base.rbac.outbox')
+
+
+"""
+With ANSIBLE_BASE_RBAC_UPDATE_MODE = 'async', triggers do not update the computed RBAC data
+in the request that made the change, and instead save what needs to be updated
+as PendingRoleUpdate entries (the outbox).
+The process_rbac_outbox management command runs a worker which does those updates.
+
+Until the worker catches up, permission checks would not reflect recent changes.
+To avoid surprises for the user making changes, or the user receiving new permissions,
+permission checks for a user first do the pending updates related to that user.
+"""
+
+
+# Incremented every time entries are added, so that users can tell if new updates may apply to them
+outbox_generation = 0
+
+
+def enqueue_updates(update_teams=(), to_update=(), team_ids=(), user_ids=()) -> None:
+    "Accepts the same arguments as ansible_base.rbac.batch.apply_updates, and saves them for the worker"
+    global outbox_generation
+
+    user = get_current_user()
+    created_by_id = None if (user is None or user.is_anonymous) else user.pk
+    kwargs = dict(created=timezone.now(), created_by_id=created_by_id)
+
+    entries = []
+    if update_teams is True:
+        entries.append(PendingRoleUpdate(update_all_teams=True, **kwargs))
+    else:
+        for object_role in update_teams:
+            entries.append(PendingRoleUpdate(content_type_id=object_role.content_type_id, object_id=object_role.object_id, update_teams=True, **kwargs))
+    for team_id in team_ids:
+        entries.append(PendingRoleUpdate(content_type_id=permission_registry.team_ct_id, object_id=str(team_id), update_teams=True, **kwargs))
+    for object_role in to_update:
+        entries.append(PendingRoleUpdate(object_role_id=object_role.id, **kwargs))
+    if user_ids:
+        user_ct_id = permission_registry.content_type_id(permission_registry.user_model)
+        for user_id in user_ids:
+            entries.append(PendingRoleUpdate(content_type_id=user_ct_id, object_id=str(user_id), **kwargs))
+
+    if entries:
+        PendingRoleUpdate.objects.bulk_create(entries)
+        outbox_generation += 1
+        # the next permission check for a user needs to consider if these updates apply to them
+        from ansible_base.rbac.evaluations import invalidate_evaluation_caches
+
+        invalidate_evaluation_caches()
+        logger.debug(f'Saved {len(entries)} RBAC updates to the outbox')
+
+
+@recompute_trigger('outbox')
+def process_pending_updates(queryset=None, batch_size: int = 1000, skip_locked: bool = True) -> int:
+    """
+    Does the updates for up to batch_size outbox entries from queryset, and removes those entries
+    Entries are locked while this runs, so multiple workers will process different entries.
+    With skip_locked=False, this waits for entries locked by another process instead of skipping them.
+    Returns the number of entries processed, 0 means there is nothing left to do.
+    """
+    if queryset is None:
+        queryset = PendingRoleUpdate.objects.all()
+
+    with transaction.atomic():
+        entries = list(queryset.select_for_update(skip_locked=skip_locked).order_by('id')[:batch_size])
+        if not entries:
+            return 0
+
+        if any(entry.update_all_teams for entry in entries):
+            update_teams = True
+        else:
+            update_teams = [entry for entry in entries if entry.update_teams]
+        role_ids = set(entry.object_role_id for entry in entries if entry.object_role_id)
+        user_model = permission_registry.user_model
+        user_ct_id = permission_registry.content_type_id(user_model)
+        user_ids = set(user_model._meta.pk.to_python(entry.object_id) for entry in entries if entry.content_type_id == user_ct_id and not entry.update_teams)
+
+        # object roles deleted since the entry was saved no longer have evaluations to update
+        apply_updates(update_teams=update_teams, to_update=ObjectRole.objects.filter(pk__in=role_ids), user_ids=user_ids)
+        PendingRoleUpdate.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+
+    return len(entries)
+
+
+def apply_pending_updates_for_user(user) -> None:
+    """
+    Read-your-writes fallback for async updates, called before evaluating permissions for a user
+    This does pending updates that the user made, or that apply to roles the user has.
+    This is only checked once per user object unless more updates are saved by this process.
+    """
+    if not async_updates_enabled() or user._meta.model_name != permission_registry.user_model._meta.model_name:
+        return
+    if getattr(user, '_rbac_outbox_generation', None) == outbox_generation:
+        return
+    user._rbac_outbox_generation = outbox_generation
+
+    user_filter = Q(object_role_id__in=user.has_roles.values('id'))
+    if user.pk:
+        user_filter |= Q(created_by_id=user.pk)
+        user_filter |= Q(content_type_id=permission_registry.content_type_id(user), object_id=str(user.pk))
+    user_qs = PendingRoleUpdate.objects.filter(user_filter)
+    # entries being processed by a worker are waited for, because the permission check needs them done
+    while process_pending_updates(queryset=user_qs, skip_locked=False):
+        pass
+
+
+def get_outbox_lag() -> dict:
+    """
+    Gives metrics for how far behind the worker is with outbox updates
+        pending - number of updates that have not been done yet
+        lag_seconds - age of the oldest pending update, 0 if there are none
+    """
+    pending = PendingRoleUpdate.objects.count()
+    oldest = PendingRoleUpdate.objects.order_by('created').values_list('created', flat=True).first()
+    lag_seconds = 0.0
+    if oldest:
+        lag_seconds = (timezone.now() - oldest).total_seconds()
+    return {'pending': pending, 'lag_seconds': lag_seconds}
@@ -1,4 +1,5 @@
 import logging
+from types import MappingProxyType
 from typing import Optional, Type, Union
 
 from django.conf import settings
@@ -22,6 +23,63 @@ permission_registry.register(MyModel, AnotherModel)
 logger = logging.getLogger('ansible_base.rbac.permission_registry')
 
 
+def model_codenames(cls) -> list[str]:
+    "Gives the Django permission codenames for a given class"
+    return [t[0] for t in cls._meta.permissions] + [f'{act}_{cls._meta.model_name}' for act in cls._meta.default_permissions]
+
+
+class RegistryIndex:
+    """Read-only lookups about the registered models, keyed by model name
+
+    Models can not be registered after apps are ready, so this is built once at that time
+    and helpers used in every permission check read from this instead of walking model metadata.
+    A role_type of None is used for system-wide roles.
+    """
+
+    def __init__(self, registry: 'PermissionRegistry'):
+        models_by_name = {cls._meta.model_name: cls for cls in registry._registry}
+        self.model_names = frozenset(models_by_name)
+        self.codenames = MappingProxyType({name: tuple(model_codenames(cls)) for name, cls in models_by_name.items()})
+        self.child_models = MappingProxyType({name: tuple(registry.walk_child_models(cls)) for name, cls in models_by_name.items()})
+        self.parent_paths = MappingProxyType({name: tuple(registry.walk_parent_paths(cls)) for name, cls in models_by_name.items()})
+
+        role_permissions = {None: self.system_role_permissions(models_by_name)}
+        for name, cls in models_by_name.items():
+            role_permissions[name] = self.object_role_permissions(cls)
+        self.role_permissions = MappingProxyType(role_permissions)
+        self.role_codenames = MappingProxyType(
+            {role_type: frozenset(codename for codenames in by_model.values() for codename in codenames) for role_type, by_model in role_permissions.items()}
+        )
+        # codenames that may be checked for objects of a model, the model own permissions and those of its child models
+        self.object_codenames = MappingProxyType(
+            {
+                name: frozenset(self.codenames[name]).union(*(self.codenames[child_cls._meta.model_name] for path, child_cls in self.child_models[name]))
+                for name in models_by_name
+            }
+        )
+
+    def system_role_permissions(self, models_by_name: dict) -> MappingProxyType:
+        permissions_by_model = {}
+        for name in sorted(models_by_name):
+            cls = models_by_name[name]
+            codenames = self.codenames[name]
+            if name == 'team':
+                # special exclusion of team object permissions from system-wide roles
+                codenames = tuple(codename for codename in codenames if codename.startswith('view'))
+            permissions_by_model[cls] = codenames
+        return MappingProxyType(permissions_by_model)
+
+    def object_role_permissions(self, cls) -> MappingProxyType:
+        from ansible_base.lib.utils.models import is_add_perm
+
+        # Include direct model permissions (except for add permission)
+        permissions_by_model = {cls: tuple(codename for codename in self.codenames[cls._meta.model_name] if not is_add_perm(codename))}
+        # Include model permissions for all child models, including the add permission
+        for rel, child_cls in self.child_models[cls._meta.model_name]:
+            permissions_by_model[child_cls] = permissions_by_model.get(child_cls, ()) + self.codenames[child_cls._meta.model_name]
+        return MappingProxyType(permissions_by_model)
+
+
 class PermissionRegistry:
     def __init__(self):
         self._registry = set()  # model registry
@@ -31,6 +89,8 @@ class PermissionRegistry:
         self.apps_ready = False
         self._tracked_relationships = set()
         self._trackers = dict()
+        self._index = None
+        self._ct_ids = dict()  # model name to content type id, filled as used because it needs the database
 
     def register(self, *args, parent_field_name='organization'):
         if self.apps_ready:
@@ -68,6 +128,12 @@ class PermissionRegistry:
          - path like "parent__organization" in Model.objects.filter(parent__organization=organization)
          - the model class which is a child resource of the parent model
         """
+        if seen is None and self._index and parent_model._meta.model_name in self._index.model_names:
+            return list(self._index.child_models[parent_model._meta.model_name])
+        return self.walk_child_models(parent_model, seen=seen)
+
+    def walk_child_models(self, parent_model, seen=None) -> list[tuple[str, Type[Model]]]:
+        "Does the search through model metadata for get_child_models"
         if not seen:
             seen = set()
         child_filters = []
@@ -83,10 +149,63 @@ class PermissionRegistry:
                 seen.add(model_name)
 
                 child_filters.append((parent_field_name, child_model))
-                for next_parent_filter, grandchild_model in self.get_child_models(child_model, seen=seen):
+                for next_parent_filter, grandchild_model in self.walk_child_models(child_model, seen=seen):
                     child_filters.append((f'{next_parent_filter}__{parent_field_name}', grandchild_model))
         return child_filters
 
+    def get_parent_paths(self, model) -> list[tuple[str, Type[Model]]]:
+        """Returns parent models and the filter relationship to get to them, the reverse of get_child_models
+
+        For a model like inventory, this returns a list of tuples that contains
+         - path like "organization" in Inventory.objects.filter(organization__in=organization_ids)
+         - the model class which is a parent resource of the model, or a parent of that, and so on
+        """
+        if self._index and model._meta.model_name in self._index.model_names:
+            return list(self._index.parent_paths[model._meta.model_name])
+        return self.walk_parent_paths(model)
+
+    def walk_parent_paths(self, model) -> list[tuple[str, Type[Model]]]:
+        "Follows the parent fields from model for get_parent_paths"
+        parent_paths = []
+        path = ''
+        seen = {model._meta.model_name}
+        while parent_field_name := self.get_parent_fd_name(model):
+            path = f'{path}__{parent_field_name}' if path else parent_field_name
+            model = model._meta.get_field(parent_field_name).related_model
+            if model._meta.model_name in seen:
+                break
+            seen.add(model._meta.model_name)
+            parent_paths.append((path, model))
+        return parent_paths
+
+    @property
+    def index(self) -> RegistryIndex:
+        if self._index is None:
+            if not self.apps_ready:
+                raise RuntimeError('Registry index is not available before apps are ready')
+            self._index = RegistryIndex(self)
+        return self._index
+
+    def get_codenames(self, cls) -> tuple[str, ...]:
+        "Django permission codenames for a given class"
+        if self._index and cls._meta.model_name in self._index.model_names:
+            return self._index.codenames[cls._meta.model_name]
+        return tuple(model_codenames(cls))
+
+    def content_type_id(self, model: Union[ModelBase, Model]) -> int:
+        "Gives the content type id of a model class or object, saved for registered models after the first query"
+        model_name = model._meta.model_name
+        if model_name in self._ct_ids:
+            return self._ct_ids[model_name]
+        ct_id = self.content_type_model.objects.get_for_model(model).id
+        if self._index and model_name in self._index.model_names:
+            self._ct_ids[model_name] = ct_id
+        return ct_id
+
+    def clear_database_ids(self) -> None:
+        "Called after migrations, which may create content types or, when tests flush the database, change their ids"
+        self._ct_ids.clear()
+
     def get_resource_prefix(self, cls: Type[Model]) -> str:
         """For a given model class, give the prefix like shared, of API naming like shared.team"""
         if registry := self.get_resource_registry():
@@ -144,7 +263,13 @@ class PermissionRegistry:
 
     def call_when_apps_ready(self, apps, app_config):
         from ansible_base.rbac import triggers
-        from ansible_base.rbac.evaluations import bound_has_obj_perm, bound_singleton_permissions, connect_rbac_methods
+        from ansible_base.rbac.evaluations import (
+            bound_get_permissions_bulk,
+            bound_has_obj_perm,
+            bound_has_obj_perms,
+            bound_singleton_permissions,
+            connect_rbac_methods,
+        )
         from ansible_base.rbac.management import create_dab_permissions
 
         self.apps = apps
@@ -152,6 +277,7 @@ class PermissionRegistry:
 
         if self.team_model not in self._registry:
             self._registry.add(self.team_model)
+        self._index = RegistryIndex(self)
 
         # Do no specify sender for create_dab_permissions, because that is passed as app_config
         # and we want to create permissions for external apps, not the dab_rbac app
@@ -166,6 +292,8 @@ class PermissionRegistry:
         )
 
         self.user_model.add_to_class('has_obj_perm', bound_has_obj_perm)
+        self.user_model.add_to_class('has_obj_perms', bound_has_obj_perms)
+        self.user_model.add_to_class('get_permissions_bulk', bound_get_permissions_bulk)
         self.user_model.add_to_class('singleton_permissions', bound_singleton_permissions)
         post_delete.connect(triggers.rbac_post_user_delete, sender=self.user_model, dispatch_uid='permission-registry-user-delete')
 
@@ -213,8 +341,8 @@ class PermissionRegistry:
         However, removing permission entries after a model definition changes is still unsolved
         and this is already problematic for auth.Permission.
         """
-        all_cts = self.content_type_model.objects.get_for_models(*self.all_registered_models)
-        return self.apps.get_model('dab_rbac.DABPermission').objects.filter(content_type__in=all_cts.values())
+        ct_ids = [self.content_type_id(cls) for cls in self.all_registered_models]
+        return self.apps.get_model('dab_rbac.DABPermission').objects.filter(content_type_id__in=ct_ids)
 
     @property
     def team_permission(self):
@@ -226,6 +354,8 @@ class PermissionRegistry:
 
     def is_registered(self, obj: Union[ModelBase, Model]) -> bool:
         """Tells if the given object or class is a type tracked by DAB RBAC"""
+        if self._index:
+            return obj._meta.model_name in self._index.model_names
         return any(obj._meta.model_name == cls._meta.model_name for cls in self._registry)
 
 
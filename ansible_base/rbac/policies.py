@@ -1,13 +1,15 @@
+from typing import Optional
+
 from django.apps import apps
 from django.conf import settings
-from django.db.models import Model
+from django.db.models import Model, Q
 from django.db.models.query import QuerySet
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import PermissionDenied
 
 from ansible_base.lib.utils.settings import get_setting
 from ansible_base.rbac.evaluations import has_super_permission
-from ansible_base.rbac.models import ObjectRole
+from ansible_base.rbac.models import ObjectRole, RoleUserAssignment
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.validators import permissions_allowed_for_role
 
@@ -24,18 +26,21 @@ def visible_users(request_user, queryset=None, always_show_superusers=True, alwa
             return user_cls.objects.all()
 
     object_id_fd = ObjectRole._meta.get_field('object_id')
-    members_of_visible_orgs = ObjectRole.objects.filter(
+    member_roles_of_visible_orgs = ObjectRole.objects.filter(
         role_definition__permissions__codename='member_organization', object_id__in=org_cls.access_ids_qs(request_user, 'view', cast_field=object_id_fd)
-    ).values('users')
-    if queryset is None:
-        queryset = user_cls.objects
-
-    queryset = queryset.filter(pk__in=members_of_visible_orgs)
+    ).values('id')
+    # One semi-join against the user ids of member assignments, with the other conditions in the same WHERE clause,
+    # so that no queryset union and no DISTINCT is needed, the subquery is not correlated so it is evaluated once
+    member_ids = RoleUserAssignment.objects.filter(object_role_id__in=member_roles_of_visible_orgs).values('user_id')
+    visible_filter = Q(pk__in=member_ids)
     if always_show_superusers:
-        queryset = queryset | user_cls.objects.filter(is_superuser=True)
+        visible_filter |= Q(is_superuser=True)
     if always_show_self:
-        queryset = queryset | user_cls.objects.filter(pk=request_user.id)
-    return queryset.distinct()
+        visible_filter |= Q(pk=request_user.id)
+
+    if queryset is None:
+        queryset = user_cls.objects.all()
+    return queryset.filter(visible_filter)
 
 
 def can_view_all_users(request_user):
@@ -71,13 +76,28 @@ def can_change_user(request_user, target_user) -> bool:
     return not target_user_orgs.exclude(pk__in=org_cls.access_ids_qs(request_user, 'change_organization')).exists()
 
 
-def check_content_obj_permission(request_user, obj) -> None:
+def check_content_obj_permission(request_user, obj, obj_permission_cache: Optional[dict] = None) -> None:
     """Permission policy rules for giving or removing obj permission
 
     Right now we are not supporting a separate permission to manage permission
     on objects, so we firstly look to a simple matter of having change permission
     If that is not available, then we check all object-level permissions.
+
+    obj_permission_cache is an optional dict to keep the outcome for each object,
+    so that requests handling many assignments only check each object once.
     """
+    if obj_permission_cache is not None:
+        key = (obj._meta.model_name, obj.pk)
+        if key not in obj_permission_cache:
+            try:
+                check_content_obj_permission(request_user, obj)
+                obj_permission_cache[key] = None
+            except PermissionDenied as exc:
+                obj_permission_cache[key] = exc
+        if obj_permission_cache[key] is not None:
+            raise obj_permission_cache[key]
+        return
+
     if 'change' in obj._meta.default_permissions:
         # Model has no change permission, so user must have all permissions for the applicable model
         if not request_user.has_obj_perm(obj, 'change'):
@@ -89,11 +109,12 @@ def check_content_obj_permission(request_user, obj) -> None:
                 raise PermissionDenied({'detail': _('You do not have {codename} permission the object').format(codename=codename)})
 
 
-def check_can_remove_assignment(request_user: Model, assignment: Model):
+def check_can_remove_assignment(request_user: Model, assignment: Model, obj_permission_cache: Optional[dict] = None):
     """Removing a role assignment will OR checks for the actor and the object
 
     You can remove a permission if you can manage the user or team given the role
     OR, if you have change permission to the content object targeted by the assignment.
+    obj_permission_cache is passed to check_content_obj_permission
     """
     if request_user.is_superuser:
         return
@@ -111,7 +132,7 @@ def check_can_remove_assignment(request_user: Model, assignment: Model):
     # request user is not a manager of the actor of the assignment
     # but can still remove the assignment if they manage the content object it applies to
     if assignment.content_type_id:
-        check_content_obj_permission(request_user, assignment.content_object)
+        check_content_obj_permission(request_user, assignment.content_object, obj_permission_cache=obj_permission_cache)
     else:
         # Case of a system role with a non-superuser user
         raise PermissionDenied
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 from django.contrib.contenttypes.models import ContentType
 
 
@@ -9,6 +11,7 @@ class TypesPrefetch:
         self._role_definitions = {}
         self._permissions = {}
         self._rd_permissions = {}
+        self._child_ids = {}
 
     @classmethod
     def from_database(cls, RoleDefinition):
@@ -39,3 +42,35 @@ class TypesPrefetch:
             self._rd_permissions[role.role_definition_id] = perm_id_list
         for permission_id in self._rd_permissions[role.role_definition_id]:
             yield self._permissions[permission_id]
+
+    def prefetch_child_ids(self, object_roles):
+        """
+        Fetches the ids of child objects needed to compute the evaluations of all of object_roles
+        and the roles of teams they give membership to, this does one query per (child_model, filter_path)
+        instead of one query per role, these are later given by get_child_ids
+        """
+        parents_by_path = defaultdict(set)
+        for object_role in object_roles:
+            roles = [object_role]
+            for team in object_role.provides_teams.all():
+                roles.extend(team.has_roles.all())
+            for role in roles:
+                _, child_evaluations = role.expected_direct_permission_sources(self)
+                for _, _, child_model, filter_path, object_id in child_evaluations:
+                    if (child_model, filter_path, object_id) not in self._child_ids:
+                        parents_by_path[(child_model, filter_path)].add(object_id)
+
+        for (child_model, filter_path), parent_ids in parents_by_path.items():
+            for parent_id in parent_ids:
+                self._child_ids[(child_model, filter_path, parent_id)] = []
+            for parent_id, pk in child_model.objects.filter(**{f'{filter_path}__in': parent_ids}).order_by().values_list(filter_path, 'pk'):
+                self._child_ids[(child_model, filter_path, parent_id)].append(pk)
+
+    def get_child_ids(self, child_model, filter_path, object_id):
+        key = (child_model, filter_path, object_id)
+        if key not in self._child_ids:
+            self._child_ids[key] = list(child_model.objects.filter(**{filter_path: object_id}).values_list('pk', flat=True))
+        return self._child_ids[key]
+
+    def clear_child_ids(self):
+        self._child_ids = {}
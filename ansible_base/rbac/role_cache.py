@@ -0,0 +1,137 @@
+import logging
+import time
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from ansible_base.rbac.permission_registry import permission_registry
+
+logger = logging.getLogger('ansible_base.rbac.role_cache')
+
+
+"""
+Optional cache, shared by all processes, of the object roles and global permissions of users.
+This is enabled by setting ANSIBLE_BASE_RBAC_CACHE_NAME to the name of a Django cache.
+
+Cached entries for a user are checked against version counters, which are also saved in the cache
+ - a version for the user, changed when the user is given or loses a role
+ - a version for each team the user is a member of, changed when the team is given or loses a global role
+ - a version for all RBAC data, changed when team membership is recomputed or global role definitions change
+An entry is used only if all of these versions are the same as when the entry was saved.
+"""
+
+RBAC_VERSION_KEY = 'dab_rbac_version'
+
+
+def role_cache_enabled() -> bool:
+    return bool(settings.ANSIBLE_BASE_RBAC_CACHE_NAME)
+
+
+def get_role_cache():
+    return caches[settings.ANSIBLE_BASE_RBAC_CACHE_NAME]
+
+
+def user_version_key(user_id) -> str:
+    return f'dab_rbac_user_version:{user_id}'
+
+
+def team_version_key(team_id) -> str:
+    return f'dab_rbac_team_version:{team_id}'
+
+
+def user_entry_key(user_id) -> str:
+    return f'dab_rbac_user_roles:{user_id}'
+
+
+def new_version() -> int:
+    # If a counter is evicted, the new one starts from the current time, so it will not match versions in old entries
+    return time.time_ns()
+
+
+def get_versions(cache, keys: list[str]) -> dict[str, int]:
+    "Returns the current value of the version counters, starting any that do not exist yet"
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, new_version(), timeout=None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def _bump_versions(keys: list[str]) -> None:
+    cache = get_role_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # counter did not exist, meaning no entry can depend on it
+            cache.add(key, new_version(), timeout=None)
+
+
+def bump_versions(keys: Iterable[str]) -> None:
+    """Changes the version counters so that entries which depend on them are not used
+
+    This is done now for this process, and again after the transaction commits,
+    because other processes could save an entry with old data before then
+    """
+    keys = list(keys)
+    _bump_versions(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_versions(keys))
+
+
+def user_roles_changed(*user_ids) -> None:
+    "Call when users are given or lose object roles or global roles"
+    if role_cache_enabled():
+        bump_versions(user_version_key(user_id) for user_id in user_ids)
+
+
+def team_global_roles_changed(*team_ids) -> None:
+    "Call when teams are given or lose global roles"
+    if role_cache_enabled():
+        bump_versions(team_version_key(team_id) for team_id in team_ids)
+
+
+def rbac_data_changed() -> None:
+    "Call when a change could affect the roles or global permissions of any user"
+    if role_cache_enabled():
+        bump_versions([RBAC_VERSION_KEY])
+
+
+def compute_user_role_data(user, cache, versions: dict) -> dict:
+    """Does the queries for the data saved in the cache for user
+
+    Version counters are read before the data they cover,
+    so that if the data changes concurrently, the saved entry will not match the new versions
+    """
+    from ansible_base.rbac.models import DABPermission, RoleDefinition
+
+    role_ids = list(user.has_roles.values_list('id', flat=True))
+    team_ids = []
+    if settings.ANSIBLE_BASE_ALLOW_SINGLETON_TEAM_ROLES and role_ids:
+        team_ids = list(permission_registry.team_model.objects.filter(member_roles__in=role_ids).values_list('id', flat=True).distinct())
+        versions.update(get_versions(cache, [team_version_key(team_id) for team_id in team_ids]))
+    global_codenames = RoleDefinition.user_global_permissions(user, permission_qs=DABPermission.objects.values_list('codename', flat=True))
+    return {'versions': versions, 'role_ids': role_ids, 'team_ids': team_ids, 'global_codenames': set(global_codenames)}
+
+
+def get_user_role_data(user) -> dict:
+    """
+    Returns the roles and global permissions of user from the shared cache, as a dictionary with keys
+     - role_ids: ids of object roles the user was directly given
+     - team_ids: ids of teams the user is a member of
+     - global_codenames: set of permission codenames from global roles of the user and those teams
+    """
+    cache = get_role_cache()
+    entry = cache.get(user_entry_key(user.pk))
+    if entry is not None and get_versions(cache, list(entry['versions'])) == entry['versions']:
+        return entry
+
+    versions = get_versions(cache, [RBAC_VERSION_KEY, user_version_key(user.pk)])
+    entry = compute_user_role_data(user, cache, versions)
+    cache.set(user_entry_key(user.pk), entry, timeout=settings.ANSIBLE_BASE_RBAC_CACHE_TIMEOUT_SECONDS)
+    logger.debug(f'Saved roles for user {user.pk} to shared cache')
+    return entry
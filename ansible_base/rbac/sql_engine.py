@@ -0,0 +1,153 @@
+import logging
+from uuid import UUID
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, IntegerField, OuterRef, Q, TextField, Value
+from django.db.models.constants import OnConflict
+
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID, get_evaluation_model, get_permission_id
+from ansible_base.rbac.prefetch import TypesPrefetch
+
+logger = logging.getLogger('ansible_base.rbac.sql_engine')
+
+
+"""
+This is an alternative to the logic in compute_object_role_permissions which keeps
+the RoleEvaluation data inside of the database.
+The python logic loads existing evaluations and all child object ids into memory
+to compare them, here the same comparison is done by INSERT ... SELECT and DELETE
+statements built from the paths from the permission registry.
+
+The number of statements scales with the number of object roles and permissions,
+while the number of child objects only affects the database.
+Select this by setting ANSIBLE_BASE_EVALUATIONS_ENGINE = 'sql'
+"""
+
+
+def get_role_sources(object_role, types_prefetch):
+    """
+    Combines ObjectRole.expected_direct_permission_sources for the role and the
+    roles of all teams that the role gives membership to.
+    This is the same data that ObjectRole.needed_cache_updates considers.
+    """
+    expected_evaluations, child_evaluations = object_role.expected_direct_permission_sources(types_prefetch)
+    for team in object_role.provides_teams.all():
+        for team_role in team.has_roles.all():
+            team_expected, team_children = team_role.expected_direct_permission_sources(types_prefetch)
+            expected_evaluations.update(team_expected)
+            child_evaluations.update(team_children)
+    return (expected_evaluations, child_evaluations)
+
+
+def child_objects_qs(child_model, filter_path, object_id):
+    return child_model.objects.filter(**{filter_path: object_id}).order_by()
+
+
+def keep_filter(eval_cls, expected_evaluations, child_evaluations) -> Q:
+    "Filter for evaluations of eval_cls for a role that match what is expected to exist"
+    keep_q = Q(pk__in=[])  # matches nothing
+    for codename, ct_id, object_id in expected_evaluations:
+        if get_evaluation_model_for_id(object_id) is eval_cls:
+            keep_q |= Q(codename=codename, content_type_id=ct_id, object_id=object_id)
+    for codename, ct_id, child_model, filter_path, object_id in child_evaluations:
+        if get_evaluation_model(child_model) is eval_cls:
+            child_exists = Exists(child_objects_qs(child_model, filter_path, object_id).filter(pk=OuterRef('object_id')))
+            keep_q |= Q(child_exists, codename=codename, content_type_id=ct_id)
+    return keep_q
+
+
+def get_evaluation_model_for_id(object_id):
+    if isinstance(object_id, int):
+        return RoleEvaluation
+    elif isinstance(object_id, UUID):
+        return RoleEvaluationUUID
+    raise RuntimeError(f'Could not find a place in cache for object id {object_id}')
+
+
+def insert_child_evaluations(object_role, codename, ct_id, child_model, filter_path, object_id) -> int:
+    """
+    Runs INSERT INTO evaluation_table SELECT for all child objects,
+    skipping child objects that already have the evaluation, returns the number of rows added
+    """
+    eval_cls = get_evaluation_model(child_model)
+    existing_qs = eval_cls.objects.filter(role_id=object_role.id, codename=codename, content_type_id=ct_id, object_id=OuterRef('pk'))
+    select_qs = (
+        child_objects_qs(child_model, filter_path, object_id)
+        .filter(~Exists(existing_qs))
+        .values_list(
+            'pk',
+            Value(codename, output_field=TextField()),
+            Value(ct_id, output_field=IntegerField()),
+            Value(object_role.id, output_field=IntegerField()),
+            Value(get_permission_id(codename), output_field=IntegerField()),
+        )
+    )
+    # model fields are always selected before annotations, so pk needs to be the first column
+    select_sql, params = select_qs.query.sql_with_params()
+
+    on_conflict = OnConflict.IGNORE if settings.ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS else None
+    fields = [eval_cls._meta.get_field(field_name) for field_name in ('object_id', 'codename', 'content_type_id', 'role', 'permission')]
+    qn = connection.ops.quote_name
+    column_sql = ', '.join(qn(field.column) for field in fields)
+    sql = f'{connection.ops.insert_statement(on_conflict=on_conflict)} {qn(eval_cls._meta.db_table)} ({column_sql}) {select_sql}'
+    suffix = connection.ops.on_conflict_suffix_sql(fields, on_conflict, None, None)
+    if suffix:
+        sql += f' {suffix}'
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def compute_object_role_permissions_sql(object_roles, types_prefetch=None) -> tuple[int, int, int]:
+    """
+    Makes the RoleEvaluation table correct for all specified object_roles
+    with the same outcome as compute_object_role_permissions, but without loading evaluations or child objects
+    Returns the number of object roles processed, and evaluations added and deleted
+    """
+    from ansible_base.rbac.caching import batched_object_roles
+
+    if types_prefetch is None:
+        types_prefetch = TypesPrefetch.from_database(RoleDefinition)
+
+    role_ct = 0
+    added_ct = 0
+    deleted_ct = 0
+    for role_batch in batched_object_roles(object_roles):
+        # like get_evaluation_changes, roles are re-fetched so that roles deleted since they were loaded are skipped
+        for object_role in ObjectRole.objects.filter(pk__in=[object_role.pk for object_role in role_batch]):
+            role_ct += 1
+            expected_evaluations, child_evaluations = get_role_sources(object_role, types_prefetch)
+
+            for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+                keep_q = keep_filter(eval_cls, expected_evaluations, child_evaluations)
+                role_deleted, _ = eval_cls.objects.filter(role_id=object_role.id).exclude(keep_q).delete()
+                deleted_ct += role_deleted
+
+            # evaluations that do not depend on child objects are few enough to check in python
+            for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+                expected_for_cls = set(evaluation for evaluation in expected_evaluations if get_evaluation_model_for_id(evaluation[2]) is eval_cls)
+                if not expected_for_cls:
+                    continue
+                existing = set(
+                    eval_cls.objects.filter(keep_filter(eval_cls, expected_for_cls, ()), role_id=object_role.id).values_list(
+                        'codename', 'content_type_id', 'object_id'
+                    )
+                )
+                to_add = [
+                    eval_cls(codename=codename, content_type_id=ct_id, object_id=object_id, role=object_role, permission_id=get_permission_id(codename))
+                    for codename, ct_id, object_id in expected_for_cls - existing
+                ]
+                if to_add:
+                    eval_cls.objects.bulk_create(to_add, ignore_conflicts=settings.ANSIBLE_BASE_EVALUATIONS_IGNORE_CONFLICTS)
+                    added_ct += len(to_add)
+
+            for codename, ct_id, child_model, filter_path, object_id in child_evaluations:
+                added_ct += insert_child_evaluations(object_role, codename, ct_id, child_model, filter_path, object_id)
+
+    if added_ct:
+        logger.info(f'Added {added_ct} object-permission records')
+    if deleted_ct:
+        logger.info(f'Deleted {deleted_ct} object-permission records')
+    return (role_ct, added_ct, deleted_ct)
@@ -1,16 +1,41 @@
 import logging
+from collections import defaultdict
 from contextlib import contextmanager
+from functools import reduce
+from operator import or_
 from typing import Optional, Union
 from uuid import UUID
 
+from django.db import connection
 from django.db.models import Model, Q
 from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
 from django.db.utils import ProgrammingError
 from django.dispatch import Signal
-
-from ansible_base.rbac.caching import compute_object_role_permissions, compute_team_member_roles
-from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, get_evaluation_model
+from rest_framework.exceptions import ValidationError
+
+from ansible_base.lib.utils.models import current_user_or_system_user
+from ansible_base.rbac.batch import defer_updates
+from ansible_base.rbac.caching import (
+    compute_object_role_permissions,
+    compute_team_member_roles,
+    compute_user_object_permissions,
+    get_role_user_ids,
+)
+from ansible_base.rbac.evaluations import invalidate_evaluation_caches
+from ansible_base.rbac.instrumentation import recompute_trigger
+from ansible_base.rbac.models import (
+    ObjectRole,
+    RoleDefinition,
+    RoleTeamAssignment,
+    RoleUserAssignment,
+    clear_permission_ids,
+    get_evaluation_model,
+    get_user_evaluation_model,
+    parent_evaluations_enabled,
+    user_evaluations_enabled,
+)
 from ansible_base.rbac.permission_registry import permission_registry
+from ansible_base.rbac.role_cache import rbac_data_changed, role_cache_enabled, user_roles_changed
 from ansible_base.rbac.validators import validate_team_assignment_enabled
 
 logger = logging.getLogger('ansible_base.rbac.triggers')
@@ -25,15 +50,18 @@ Sounds simple, but is actually more complicated that the caching logic itself.
 
 dab_post_migrate = Signal()
 
+# Number of object roles to update at once when the permissions of their role definition change
+ROLE_CHANGE_BATCH_SIZE = 500
+
 
 def team_ancestor_roles(team):
     """
-    Return a queryset of all roles that directly or indirectly grant any form of permission to a team.
+    Return a set of all roles that directly or indirectly grant any form of permission to a team.
     This is generally used when invalidating a team membership for one reason or another.
-    This assumes that teams and all team parent models have integer primary keys.
+    The ObjectRole.provides_teams relationship is maintained along with the TeamAncestor table,
+    and already includes the roles that give membership to any ancestor team.
     """
-    permission_kwargs = dict(codename=permission_registry.team_permission, object_id=team.id, content_type_id=permission_registry.team_ct_id)
-    return set(ObjectRole.objects.filter(permission_partials__in=RoleEvaluation.objects.filter(**permission_kwargs)))
+    return set(ObjectRole.objects.filter(provides_teams=team))
 
 
 def needed_updates_on_assignment(role_definition, actor, object_role, created=False, giving=True):
@@ -41,7 +69,8 @@ def needed_updates_on_assignment(role_definition, actor, object_role, created=Fa
     If a user or a team is granted a role or has a role revoked,
     then this returns instructions for what needs to be updated
     returns tuple
-        (bool: should update team owners, set: object roles to update)
+        (set: object roles that changed team membership, set: object roles to update)
+    the first set is empty if team member roles do not need to be recomputed
     """
     # we maintain a list of object roles that we need to update evaluations for
     to_update = set()
@@ -78,49 +107,134 @@ def needed_updates_on_assignment(role_definition, actor, object_role, created=Fa
         to_update.update(object_role.descendent_roles())
 
     # actions which can change the team parentage structure
-    recompute_teams = bool(has_team_perm and (created or deleted or changes_team_owners))
+    recompute_teams = set()
+    if has_team_perm and (created or deleted or changes_team_owners):
+        recompute_teams.add(object_role)
 
     return (recompute_teams, to_update)
 
 
-def update_after_assignment(update_teams, to_update):
-    "Call this with the output of needed_updates_on_assignment"
-    if update_teams:
+@recompute_trigger('assignment')
+def update_after_assignment(update_teams, to_update, user_ids=()):
+    """Call this with the output of needed_updates_on_assignment
+
+    update_teams may be a set of object roles that changed team membership,
+    in which case only the affected teams are updated, or True to update all teams
+    user_ids are users whose per-user evaluations need to be updated, even if no role evaluations change
+    inside of rbac_batch, the updates are saved and done when the batch exits,
+    with async updates enabled, the updates are saved to the outbox to be done by a worker
+    """
+    if defer_updates(update_teams=update_teams, to_update=to_update, user_ids=user_ids):
+        return
+
+    if update_teams is True:
         compute_team_member_roles()
+    elif update_teams:
+        compute_team_member_roles(object_roles=update_teams)
 
     compute_object_role_permissions(object_roles=to_update)
+    if user_ids:
+        compute_user_object_permissions(user_ids=user_ids)
 
 
+def iterate_role_batches(role_qs, batch_size: int):
+    "Yields lists of object roles from role_qs in order of id, loading one batch at a time"
+    last_id = 0
+    while role_batch := list(role_qs.filter(id__gt=last_id).order_by('id')[:batch_size]):
+        yield role_batch
+        last_id = role_batch[-1].id
+
+
+@recompute_trigger('permission_change')
 def permissions_changed(instance, action, model, pk_set, reverse, **kwargs):
     if action.startswith('pre_'):
         return
-    to_recompute = set(ObjectRole.objects.filter(role_definition=instance).prefetch_related('teams__member_roles'))
-    if not to_recompute:
+    if instance.content_type_id is None and not reverse:
+        # global role definitions have no object roles, but users with them cached their permissions
+        rbac_data_changed()
+    role_qs = ObjectRole.objects.filter(role_definition=instance)
+    if not role_qs.exists():
         return
     if reverse:
         raise RuntimeError('Removal of permssions through reverse relationship not supported')
 
     if action in ('post_add', 'post_remove'):
-        if permission_registry.permission_qs.filter(codename=permission_registry.team_permission, pk__in=pk_set).exists():
-            for object_role in to_recompute.copy():
-                to_recompute.update(object_role.descendent_roles())
-            compute_team_member_roles()
-        # All team member roles that give this permission through this role need to be updated
-        for role in to_recompute.copy():
-            for team in role.teams.all():
-                for team_role in team.member_roles.all():
-                    to_recompute.add(team_role)
+        changes_membership = permission_registry.permission_qs.filter(codename=permission_registry.team_permission, pk__in=pk_set).exists()
+        # A role definition can be used for many objects, so object roles are updated in batches to limit memory use
+        total = role_qs.count()
+        done = 0
+        for role_batch in iterate_role_batches(role_qs.prefetch_related('teams__member_roles'), ROLE_CHANGE_BATCH_SIZE):
+            to_recompute = set(role_batch)
+            changed_roles = set()
+            if changes_membership:
+                changed_roles = to_recompute.copy()
+                for object_role in changed_roles:
+                    to_recompute.update(object_role.descendent_roles())
+            # All team member roles that give this permission through this role need to be updated
+            for role in role_batch:
+                for team in role.teams.all():
+                    for team_role in team.member_roles.all():
+                        to_recompute.add(team_role)
+            done += len(role_batch)
+            if defer_updates(update_teams=changed_roles, to_update=to_recompute):
+                continue
+            if changed_roles:
+                compute_team_member_roles(object_roles=changed_roles)
+            compute_object_role_permissions(object_roles=to_recompute)
+            logger.info(f'Updated permissions for {done} of {total} object roles of role definition {instance.name}')
     elif action == 'post_clear':
         # unfortunately this does not give us a list of permissions to work with
         # this is slow, not ideal, but will at least be correct
         compute_team_member_roles()
-        to_recompute = None  # all
-    compute_object_role_permissions(object_roles=to_recompute)
+        compute_object_role_permissions()
 
 
 m2m_changed.connect(permissions_changed, sender=RoleDefinition.permissions.through)
 
 
+def clear_tracker_role_definitions() -> None:
+    for tracker in permission_registry._trackers.values():
+        tracker.clear_role_definition()
+
+
+def role_definition_post_save(instance, created, *args, **kwargs):
+    if not created:
+        # a tracked role definition could have been renamed
+        clear_tracker_role_definitions()
+
+
+def role_definition_pre_delete(instance, *args, **kwargs):
+    "Object roles of the role definition are cascade deleted, so stash what is needed to update for that"
+    object_roles = list(ObjectRole.objects.filter(role_definition=instance))
+    instance.__rbac_stashed_object_roles = object_roles
+    instance.__rbac_stashed_has_team_perm = instance.permissions.filter(codename=permission_registry.team_permission).exists()
+    # team members got permissions from roles given to the team, so their member roles need to be updated
+    instance.__rbac_stashed_team_roles = set(ObjectRole.objects.filter(provides_teams__has_roles__in=object_roles).exclude(role_definition=instance))
+    instance.__rbac_stashed_user_ids = set()
+    if role_cache_enabled() or user_evaluations_enabled():
+        instance.__rbac_stashed_user_ids = get_role_user_ids(object_roles)
+
+
+@recompute_trigger('permission_change')
+def role_definition_post_delete(instance, *args, **kwargs):
+    if instance.content_type_id is None:
+        rbac_data_changed()
+    clear_tracker_role_definitions()
+
+    object_roles = instance.__rbac_stashed_object_roles
+    user_ids = instance.__rbac_stashed_user_ids
+    user_roles_changed(*user_ids)
+    update_teams = set(object_roles) if (object_roles and instance.__rbac_stashed_has_team_perm) else set()
+    to_update = set(instance.__rbac_stashed_team_roles)
+    if update_teams or to_update or (user_ids and user_evaluations_enabled()):
+        update_after_assignment(update_teams, to_update, user_ids=user_ids if user_evaluations_enabled() else ())
+
+
+post_save.connect(role_definition_post_save, sender=RoleDefinition)
+pre_delete.connect(role_definition_pre_delete, sender=RoleDefinition)
+post_delete.connect(role_definition_post_delete, sender=RoleDefinition)
+
+
 def rbac_post_init_set_original_parent(sender, instance, **kwargs):
     """
     connect to post_init signal
@@ -157,8 +271,8 @@ def get_parent_ids(instance) -> list[tuple[Model, Union[int, UUID]]]:
     return []
 
 
-def post_save_update_obj_permissions(instance):
-    "Utility method shared by multiple signals"
+def get_parent_object_roles(instance) -> set[ObjectRole]:
+    "Returns object roles whose evaluations include instance, because they are for its parent objects, new and old"
     # Account for organization roles (and other parent objects), new and old
     parent_gfks = get_parent_ids(instance)
 
@@ -182,11 +296,35 @@ def post_save_update_obj_permissions(instance):
     # Account for parent team roles of those organization roles
     ancestors = set(ObjectRole.objects.filter(provides_teams__has_roles__in=to_update))
     to_update.update(ancestors)
+    return to_update
+
+
+@recompute_trigger('parent_change')
+def post_save_update_obj_permissions(instance):
+    "Utility method shared by multiple signals"
+    # in parent storage mode, moving an object changes permissions without changing evaluations
+    invalidate_evaluation_caches()
+    is_team = bool(instance._meta.model_name == permission_registry.team_model._meta.model_name)
+    if parent_evaluations_enabled() and not is_team:
+        # Evaluations are only saved for parent objects, and child objects are joined to them when evaluating
+        # but a team changing organization changes which organization roles give membership to it
+        to_update = set()
+        if hasattr(instance, '__rbac_original_parent_id'):
+            delattr(instance, '__rbac_original_parent_id')
+    else:
+        to_update = get_parent_object_roles(instance)
 
     # If the actual object changed (created or modified) was a team, any org role
     # that has member_team needs to be updated, and any parent teams that have that role
-    if instance._meta.model_name == permission_registry.team_model._meta.model_name:
-        compute_team_member_roles()
+    team_ids = []
+    if is_team:
+        team_ids.append(instance.pk)
+
+    if defer_updates(to_update=to_update, team_ids=team_ids):
+        return
+
+    if team_ids:
+        compute_team_member_roles(team_ids=team_ids)
 
     if to_update:
         compute_object_role_permissions(object_roles=to_update)
@@ -240,14 +378,16 @@ def team_pre_delete(instance, *args, **kwargs):
     instance.__rbac_stashed_member_roles = list(instance.member_roles.all())
 
 
+@recompute_trigger('object_delete')
 def rbac_post_delete_remove_object_roles(instance, *args, **kwargs):
     """
     Call this when deleting an object to cascade delete its object roles
     Deleting a team can have consequences for the rest of the graph
     """
+    invalidate_evaluation_caches()
     if instance._meta.model_name == permission_registry.team_model._meta.model_name:
-        indirectly_affected_roles = set()
-        indirectly_affected_roles.update(team_ancestor_roles(instance))
+        # team membership entries were deleted by cascade, so the member roles were stashed before deletion
+        indirectly_affected_roles = set(instance.__rbac_stashed_member_roles)
         for team_role in instance.__rbac_stashed_member_roles:
             indirectly_affected_roles.update(team_role.descendent_roles())
         compute_team_member_roles()
@@ -257,6 +397,10 @@ def rbac_post_delete_remove_object_roles(instance, *args, **kwargs):
         ObjectRole.objects.filter(users__isnull=True, teams__isnull=True).delete()
 
     ct = permission_registry.content_type_model.objects.get_for_model(instance)
+    user_ids = set()
+    if role_cache_enabled() or user_evaluations_enabled():
+        user_ids = set(ObjectRole.objects.filter(content_type=ct, object_id=instance.pk, users__isnull=False).values_list('users', flat=True))
+        user_roles_changed(*user_ids)
     ObjectRole.objects.filter(content_type=ct, object_id=instance.pk).delete()
 
     parent_field_name = permission_registry.get_parent_fd_name(instance)
@@ -264,6 +408,11 @@ def rbac_post_delete_remove_object_roles(instance, *args, **kwargs):
         # Delete all evaluations from inherited permissions
         get_evaluation_model(instance).objects.filter(content_type_id=ct.id, object_id=instance.pk).delete()
 
+    if user_evaluations_enabled():
+        get_user_evaluation_model(get_evaluation_model(instance)).objects.filter(content_type_id=ct.id, object_id=instance.pk).delete()
+        # users given roles to this object may also lose permissions to its child objects
+        compute_user_object_permissions(user_ids=user_ids)
+
 
 def rbac_post_user_delete(instance, *args, **kwargs):
     """
@@ -274,7 +423,11 @@ def rbac_post_user_delete(instance, *args, **kwargs):
     ObjectRole.objects.filter(users__isnull=True, teams__isnull=True).delete()
 
 
+@recompute_trigger('post_migrate')
 def post_migration_rbac_setup(sender, *args, **kwargs):
+    clear_permission_ids()
+    permission_registry.clear_database_ids()
+    clear_tracker_role_definitions()
     try:
         RoleDefinition.objects.first()
     except ProgrammingError:
@@ -294,6 +447,7 @@ class TrackedRelationship:
         self.user_relationship = None
         self.team_relationship = None
         self._active_sync_flag = False
+        self._role_definition_id = None
 
     def initialize(self, relationship):
         manager = getattr(self.cls, relationship)
@@ -307,6 +461,23 @@ class TrackedRelationship:
         else:
             raise RuntimeError(f'Can only register user or team relationships, obtained {related_model_name}')
 
+    def get_role_definition(self) -> RoleDefinition:
+        """Returns the role definition named role_name
+
+        Only its id is saved after the first lookup, because other processes may change or replace
+        the role definition, so it is loaded by id and checked against role_name every time
+        """
+        if self._role_definition_id is not None:
+            rd = RoleDefinition.objects.filter(pk=self._role_definition_id, name=self.role_name).first()
+            if rd is not None:
+                return rd
+        rd = RoleDefinition.objects.get(name=self.role_name)
+        self._role_definition_id = rd.pk
+        return rd
+
+    def clear_role_definition(self) -> None:
+        self._role_definition_id = None
+
     @contextmanager
     def sync_active(self):
         try:
@@ -335,40 +506,126 @@ class TrackedRelationship:
         else:
             manager.remove(actor)
 
-    def _sync_actor_to_role(self, actor_model: type, instance: Model, action: str, pk_set: Optional[set[int]]):
+    def apply_assignments(self, rd: RoleDefinition, actor_model: type, pairs: list[tuple], giving: bool) -> None:
+        """Gives or removes the role definition for (actor pk, object pk) pairs
+
+        Assignments are created or deleted with bulk queries, and then the computed data is updated once for all of them,
+        this does the same thing as calling give_or_remove_permission for every pair
+        """
+        is_team = bool(actor_model._meta.model_name == permission_registry.team_model._meta.model_name)
+        ct_id = permission_registry.content_type_id(self.cls)
+        if rd.content_type_id != ct_id:
+            raise ValidationError(f'Role type {getattr(rd.content_type, "model", "global")} does not match object {self.cls._meta.model_name}')
+        has_team_perm = rd.permissions.filter(codename=permission_registry.team_permission).exists()
+        if is_team:
+            has_org_member = rd.permissions.filter(codename='member_organization').exists()
+            validate_team_assignment_enabled(rd.content_type, has_team_perm=has_team_perm, has_org_member=has_org_member)
+
+        # object roles save object_id as text of its database value, practically, remove "-" chars from uuids
+        pk_field = self.cls._meta.pk
+        actors_by_object_id = defaultdict(set)
+        for actor_pk, obj_pk in pairs:
+            actors_by_object_id[str(pk_field.get_db_prep_value(obj_pk, connection))].add(actor_pk)
+        role_kwargs = dict(role_definition=rd, content_type_id=ct_id)
+        roles = {role.object_id: role for role in ObjectRole.objects.filter(object_id__in=list(actors_by_object_id), **role_kwargs)}
+
+        created_roles = set()
+        if giving:
+            missing = [object_id for object_id in actors_by_object_id if object_id not in roles]
+            if missing:
+                # conflicts are from other transactions creating the same object roles, which are loaded next like the rest
+                ObjectRole.objects.bulk_create([ObjectRole(object_id=object_id, **role_kwargs) for object_id in missing], ignore_conflicts=True)
+                for object_role in ObjectRole.objects.filter(object_id__in=missing, **role_kwargs):
+                    roles[object_role.object_id] = object_role
+                    created_roles.add(object_role)
+        if not roles:
+            return  # nothing to remove
+
+        assignment_model, actor_field = (RoleTeamAssignment, 'team_id') if is_team else (RoleUserAssignment, 'user_id')
+        pair_filter = reduce(
+            or_,
+            [
+                Q(object_role=roles[object_id], **{f'{actor_field}__in': actor_pks})
+                for object_id, actor_pks in actors_by_object_id.items()
+                if object_id in roles
+            ],
+        )
+        affected_roles = set(roles.values())
+        actor_pks = set().union(*actors_by_object_id.values())
+
+        # same updates as needed_updates_on_assignment, for all of the roles
+        to_update = set(created_roles)
+        update_teams = set(created_roles) if has_team_perm else set()
+        if is_team:
+            to_update.update(ObjectRole.objects.filter(provides_teams__in=actor_pks))
+            for object_role in affected_roles:
+                to_update.update(object_role.descendent_roles())
+            if has_team_perm:
+                update_teams.update(affected_roles)
+
+        if giving:
+            existing = set(assignment_model.objects.filter(pair_filter).values_list('object_role_id', actor_field))
+            created_by = current_user_or_system_user()
+            new_assignments = [
+                assignment_model(object_role=object_role, object_id=object_role.object_id, created_by=created_by, **role_kwargs, **{actor_field: actor_pk})
+                for object_id, object_role in roles.items()
+                for actor_pk in actors_by_object_id[object_id]
+                if (object_role.id, actor_pk) not in existing
+            ]
+            assignment_model.objects.bulk_create(new_assignments, ignore_conflicts=True)
+            logger.debug(f'Created {len(new_assignments)} assignments to {rd.name} from relationship of {self.cls._meta.model_name}')
+        else:
+            assignment_model.objects.filter(pair_filter).delete()
+            # delete object roles that are now unused
+            deleted_roles = set(ObjectRole.objects.filter(id__in=[object_role.id for object_role in affected_roles], users__isnull=True, teams__isnull=True))
+            if deleted_roles:
+                to_update -= deleted_roles
+                if has_team_perm:
+                    update_teams.update(deleted_roles)
+                ObjectRole.objects.filter(id__in=[object_role.id for object_role in deleted_roles]).delete()
+
+        user_ids = ()
+        if not is_team:
+            user_roles_changed(*actor_pks)
+            if user_evaluations_enabled():
+                user_ids = actor_pks
+
+        update_after_assignment(update_teams, to_update, user_ids=user_ids)
+
+    def _sync_actors_to_roles(self, actor_model: type, instance: Model, action: str, pk_set: Optional[set], reverse: bool):
         if self._active_sync_flag:
             return
         if action.startswith('pre_'):
             return
-        rd = RoleDefinition.objects.get(name=self.role_name)
+        rd = self.get_role_definition()
 
         if action in ('post_add', 'post_remove'):
-            actor_set = pk_set
+            if reverse:
+                # instance is the actor, and pk_set are the objects of the tracked model
+                pairs = [(instance.pk, pk) for pk in pk_set]
+            else:
+                pairs = [(pk, instance.pk) for pk in pk_set]
         elif action == 'post_clear':
-            ct = permission_registry.content_type_model.objects.get_for_model(instance)
-            role = ObjectRole.objects.get(object_id=instance.pk, content_type=ct, role_definition=rd)
-            if actor_model._meta.model_name == 'team':
-                actor_set = set(role.teams.values_list('id', flat=True))
+            actor_field = 'teams' if actor_model._meta.model_name == permission_registry.team_model._meta.model_name else 'users'
+            role_qs = ObjectRole.objects.filter(role_definition=rd, content_type_id=permission_registry.content_type_id(self.cls))
+            if reverse:
+                object_ids = role_qs.filter(**{actor_field: instance.pk}).values_list('object_id', flat=True)
+                pairs = [(instance.pk, self.cls._meta.pk.to_python(object_id)) for object_id in object_ids]
             else:
-                actor_set = set(role.users.values_list('id', flat=True))
+                object_id = self.cls._meta.pk.get_db_prep_value(instance.pk, connection)
+                actor_pks = role_qs.filter(object_id=object_id).values_list(actor_field, flat=True)
+                pairs = [(actor_pk, instance.pk) for actor_pk in actor_pks]
+        else:
+            return
 
-        giving = bool(action == 'post_add')
-        for actor in actor_model.objects.filter(pk__in=actor_set):
-            rd.give_or_remove_permission(actor, instance, giving=giving, sync_action=True)
+        if pairs:
+            self.apply_assignments(rd, actor_model, pairs, giving=bool(action == 'post_add'))
 
     def sync_team_to_role(self, instance: Model, action: str, model: type, pk_set: Optional[set[int]], reverse: bool, **kwargs):
-        if not reverse:
-            self._sync_actor_to_role(permission_registry.team_model, instance, action, pk_set)
-        else:
-            for pk in pk_set:
-                self._sync_actor_to_role(permission_registry.team_model, model(pk=pk), action, {instance.pk})
+        self._sync_actors_to_roles(permission_registry.team_model, instance, action, pk_set, reverse)
 
     def sync_user_to_role(self, instance: Model, action: str, model: type, pk_set: Optional[set[int]], reverse: bool, **kwargs):
-        if not reverse:
-            self._sync_actor_to_role(permission_registry.user_model, instance, action, pk_set)
-        else:
-            for pk in pk_set:
-                self._sync_actor_to_role(permission_registry.user_model, model(pk=pk), action, {instance.pk})
+        self._sync_actors_to_roles(permission_registry.user_model, instance, action, pk_set, reverse)
 
 
 def connect_rbac_signals(cls):
@@ -1,7 +1,7 @@
 from django.urls import include, path
 
 from ansible_base.rbac.api.router import router
-from ansible_base.rbac.api.views import RoleMetadataView
+from ansible_base.rbac.api.views import RBACMetricsView, RoleMetadataView
 from ansible_base.rbac.apps import AnsibleRBACConfig
 
 app_name = AnsibleRBACConfig.label
@@ -9,6 +9,7 @@ app_name = AnsibleRBACConfig.label
 api_version_urls = [
     path('', include(router.urls)),
     path(r'role_metadata/', RoleMetadataView.as_view(), name="role-metadata"),
+    path(r'rbac_metrics/', RBACMetricsView.as_view(), name="rbac-metrics"),
 ]
 
 root_urls = []
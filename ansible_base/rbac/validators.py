@@ -24,19 +24,12 @@ def printable_model_name(model: Optional[Type[Model]]) -> str:
 
 def codenames_for_cls(cls) -> list[str]:
     "Helper method that gives the Django permission codenames for a given class"
-    return [t[0] for t in cls._meta.permissions] + [f'{act}_{cls._meta.model_name}' for act in cls._meta.default_permissions]
+    return list(permission_registry.get_codenames(cls))
 
 
 def permissions_allowed_for_system_role() -> dict[type, list[str]]:
     "Permission codenames useable in system-wide roles, which have content_type set to None"
-    permissions_by_model = defaultdict(list)
-    for cls in sorted(permission_registry.all_registered_models, key=lambda cls: cls._meta.model_name):
-        is_team = bool(cls._meta.model_name == 'team')
-        for codename in codenames_for_cls(cls):
-            if is_team and (not codename.startswith('view')):
-                continue  # special exclusion of team object permissions from system-wide roles
-            permissions_by_model[cls].append(codename)
-    return permissions_by_model
+    return defaultdict(list, {cls: list(codenames) for cls, codenames in permission_registry.index.role_permissions[None].items()})
 
 
 def permissions_allowed_for_role(cls) -> dict[type, list[str]]:
@@ -47,15 +40,18 @@ def permissions_allowed_for_role(cls) -> dict[type, list[str]]:
     if not permission_registry.is_registered(cls):
         raise ValidationError(f'Django-ansible-base RBAC does not track permissions for model {cls._meta.model_name}')
 
-    # Include direct model permissions (except for add permission)
-    permissions_by_model = defaultdict(list)
-    permissions_by_model[cls] = [codename for codename in codenames_for_cls(cls) if not is_add_perm(codename)]
+    return defaultdict(list, {model: list(codenames) for model, codenames in permission_registry.index.role_permissions[cls._meta.model_name].items()})
 
-    # Include model permissions for all child models, including the add permission
-    for rel, child_cls in permission_registry.get_child_models(cls):
-        permissions_by_model[child_cls] += codenames_for_cls(child_cls)
 
-    return permissions_by_model
+def codenames_allowed_for_role(cls) -> frozenset[str]:
+    "All permission codenames valid for a RoleDefinition of given class, same as combine_values(permissions_allowed_for_role(cls))"
+    if cls is None:
+        return permission_registry.index.role_codenames[None]
+
+    if not permission_registry.is_registered(cls):
+        raise ValidationError(f'Django-ansible-base RBAC does not track permissions for model {cls._meta.model_name}')
+
+    return permission_registry.index.role_codenames[cls._meta.model_name]
 
 
 def combine_values(data: dict[type, list[str]]) -> set[str]:
@@ -105,7 +101,7 @@ def validate_permissions_for_model(permissions, content_type: Optional[Model], m
         role_model = content_type.model_class()
     permissions_by_model = permissions_allowed_for_role(role_model)
 
-    invalid_codenames = codename_list - combine_values(permissions_by_model)
+    invalid_codenames = codename_list - codenames_allowed_for_role(role_model)
     if invalid_codenames:
         print_codenames = ', '.join(f'"{codename}"' for codename in invalid_codenames)
         raise ValidationError({'permissions': f'Permissions {print_codenames} are not valid for {printable_model_name(role_model)} roles'})
@@ -142,7 +138,7 @@ def validate_codename_for_model(codename: str, model: Union[Model, Type[Model]])
     assuming obj is an inventory.
     It also tries to protect the user by throwing an error if the permission does not work.
     """
-    valid_codenames = codenames_for_cls(model)
+    valid_codenames = permission_registry.get_codenames(model)
     if (not codename.startswith('add')) and codename in valid_codenames:
         return codename
     if re.match(r'^[a-z]+$', codename):
@@ -159,9 +155,13 @@ def validate_codename_for_model(codename: str, model: Union[Model, Type[Model]])
             raise RuntimeError(f'Add permissions only valid for parent models, received for {model._meta.model_name}')
         return name
 
-    for rel, child_cls in permission_registry.get_child_models(model):
-        if name in codenames_for_cls(child_cls):
+    if permission_registry.is_registered(model):
+        if name in permission_registry.index.object_codenames[model._meta.model_name]:
             return name
+    else:
+        for rel, child_cls in permission_registry.get_child_models(model):
+            if name in codenames_for_cls(child_cls):
+                return name
     raise RuntimeError(f'The permission {name} is not valid for model {model._meta.model_name}')
 
 
@@ -0,0 +1,49 @@
+"""
+Helpers shared by the benchmark_* management commands of test_app
+
+The commands create their data inside of rolled_back_transaction, so nothing is kept in the database,
+and time operations with measure, which also counts the queries each run makes.
+"""
+
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def rolled_back_transaction():
+    "Everything done inside of this is rolled back at the end, so the data created for a benchmark is not kept"
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def timed(func, *args, **kwargs) -> tuple:
+    "Runs func once, giving its return value and how long it took in seconds"
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (result, time.perf_counter() - start)
+
+
+def measure(funcs) -> dict:
+    "Runs each function, giving times in milliseconds and the most queries any run made"
+    times = []
+    query_cts = []
+    for func in funcs:
+        with CaptureQueriesContext(connection) as context:
+            times.append(timed(func)[1])
+        query_cts.append(len(context.captured_queries))
+    return {
+        'runs': len(times),
+        'median_ms': round(statistics.median(times) * 1000.0, 3),
+        'min_ms': round(min(times) * 1000.0, 3),
+        'queries': max(query_cts),
+    }
+
+
+def time_query(func, repeat: int) -> float:
+    "Runs func repeat times, giving the median time in milliseconds"
+    return measure([func] * repeat)['median_ms']
@@ -0,0 +1,67 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from ansible_base.rbac.models import RoleDefinition
+from test_app.benchmark import rolled_back_transaction, time_query, timed
+from test_app.models import Inventory, Organization, Team, User
+
+STRATEGIES = ('in', 'exists')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the "in" and "exists" values of ANSIBLE_BASE_ACCESS_QS_STRATEGY for a list endpoint query, '
+        'with pagination COUNT, using the configured database. Data is created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=10, help='Number of organizations to create')
+        parser.add_argument('--inventories', type=int, default=200, help='Number of inventories to create in each organization')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of times to time each query, the median time is shown')
+        parser.add_argument('--explain', action='store_true', help='Show the query plan for each strategy')
+
+    def create_data(self, org_ct: int, inv_ct: int) -> User:
+        "Creates objects, and gives a user the same permissions from several roles, like real data would"
+        orgs = Organization.objects.bulk_create([Organization(name=f'benchmark-org-{i}') for i in range(org_ct)])
+        Inventory.objects.bulk_create([Inventory(name=f'benchmark-inv-{j}', organization=org) for org in orgs for j in range(inv_ct)])
+        user = User.objects.create(username='benchmark-user')
+        team = Team.objects.create(name='benchmark-team', organization=orgs[0])
+
+        org_rd, _ = RoleDefinition.objects.get_or_create(
+            name='benchmark-org-inventory-viewer',
+            permissions=['view_organization', 'view_inventory'],
+            defaults={'content_type': ContentType.objects.get_for_model(Organization)},
+        )
+        inv_rd, _ = RoleDefinition.objects.get_or_create(
+            name='benchmark-inventory-viewer', permissions=['view_inventory'], defaults={'content_type': ContentType.objects.get_for_model(Inventory)}
+        )
+        RoleDefinition.objects.managed.team_member.give_permission(user, team)
+        for i, org in enumerate(orgs):
+            if i % 2 == 0:
+                org_rd.give_permission(user, org)
+            if i % 3 == 0:
+                org_rd.give_permission(team, org)
+        for inventory in Inventory.objects.filter(organization__in=orgs[::2])[: inv_ct * 2]:
+            inv_rd.give_permission(user, inventory)
+        return user
+
+    def handle(self, *args, **options):
+        with rolled_back_transaction():
+            user, setup_seconds = timed(self.create_data, options['organizations'], options['inventories'])
+            self.stdout.write(f'Created data in {setup_seconds:.2f} seconds, database: {connection.vendor}')
+
+            results = {}
+            for strategy in STRATEGIES:
+                with override_settings(ANSIBLE_BASE_ACCESS_QS_STRATEGY=strategy):
+                    queryset = Inventory.access_qs(user).filter(name__startswith='benchmark').order_by('name')
+                    count_ms = time_query(queryset.count, options['repeat'])
+                    page_ms = time_query(lambda: list(queryset[100:125]), options['repeat'])
+                    results[strategy] = set(queryset.values_list('pk', flat=True))
+                    self.stdout.write(f'{strategy}: {len(results[strategy])} objects, count {count_ms:.2f} ms, page {page_ms:.2f} ms')
+                    if options['explain']:
+                        self.stdout.write(queryset.explain())
+
+        if len(set(frozenset(pks) for pks in results.values())) != 1:
+            raise CommandError('Strategies gave different results')
@@ -0,0 +1,142 @@
+"""
+Times RBAC operations, and counts their queries, for data of a configurable scale made with test_app models
+Data is created in a transaction that is rolled back, and results are written as JSON so runs can be compared.
+
+Usage::
+
+    python manage.py benchmark_rbac --settings=test_app.sqlite3settings --output sqlite.json
+    python manage.py benchmark_rbac --output postgres.json  # test_app.settings uses the local PostgreSQL
+
+Optional parameters::
+
+    `--organizations number` organizations to create
+    `--objects number` inventories and UUID models to create in each organization
+    `--team-depth number` teams in each organization, each one a member of the one before it
+    `--users-per-team number` users given membership to each team
+    `--repeat number` times to run each operation, the median and minimum times are given
+"""
+
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ansible_base.rbac import rbac_batch
+from ansible_base.rbac.caching import compute_team_member_roles
+from ansible_base.rbac.evaluations import invalidate_evaluation_caches
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.benchmark import measure, rolled_back_transaction, timed
+from test_app.models import Inventory, Organization, Team, User, UUIDModel
+
+
+class Command(BaseCommand):
+    help = (
+        'Times give_permission, compute_team_member_roles, rebuilding evaluations, access_qs list queries, and has_obj_perm '
+        'with the configured database, and writes the results as JSON. Data is created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=10, help='Number of organizations to create')
+        parser.add_argument('--objects', type=int, default=100, help='Number of inventories and UUID models to create in each organization')
+        parser.add_argument('--team-depth', type=int, default=3, help='Number of nested teams in each organization')
+        parser.add_argument('--users-per-team', type=int, default=5, help='Number of users that are members of each team')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of times to run each operation')
+        parser.add_argument('--output', default=None, help='File to write the JSON results to, if not given they are written to stdout')
+
+    def create_data(self, org_ct: int, obj_ct: int, team_depth: int, users_per_team: int) -> User:
+        """Creates organizations with objects, and a chain of nested teams with members in each organization
+
+        The top team of each organization has an organization role, which the members of teams under it get by nesting,
+        the returned user is a member of the bottom team of every other organization.
+        """
+        orgs = Organization.objects.bulk_create([Organization(name=f'benchmark-org-{i}') for i in range(org_ct)])
+        Inventory.objects.bulk_create([Inventory(name=f'benchmark-inv-{j}', organization=org) for org in orgs for j in range(obj_ct)])
+        UUIDModel.objects.bulk_create([UUIDModel(organization=org) for org in orgs for j in range(obj_ct)])
+        teams = Team.objects.bulk_create([Team(name=f'benchmark-team-{i}-{k}', organization=org) for i, org in enumerate(orgs) for k in range(team_depth)])
+        users = User.objects.bulk_create([User(username=f'benchmark-user-{i}-{j}') for i in range(len(teams)) for j in range(users_per_team)])
+        user = User.objects.create(username='benchmark-user')
+
+        member_rd = RoleDefinition.objects.managed.team_member
+        org_rd = self.org_role_definition()
+        with rbac_batch():
+            for i, org in enumerate(orgs):
+                org_teams = teams[i * team_depth : (i + 1) * team_depth]  # noqa: E203
+                org_rd.give_permission(org_teams[0], org)
+                for parent_team, child_team in zip(org_teams, org_teams[1:]):
+                    member_rd.give_permission(child_team, parent_team)
+                if i % 2 == 0:
+                    member_rd.give_permission(user, org_teams[-1])
+            for i, team in enumerate(teams):
+                for member in users[i * users_per_team : (i + 1) * users_per_team]:  # noqa: E203
+                    member_rd.give_permission(member, team)
+        return user
+
+    def org_role_definition(self) -> RoleDefinition:
+        rd, _ = RoleDefinition.objects.get_or_create(
+            name='benchmark-org-object-admin',
+            permissions=['view_organization', 'view_inventory', 'change_inventory', 'view_uuidmodel', 'change_uuidmodel'],
+            defaults={'content_type': permission_registry.content_type_model.objects.get_for_model(Organization)},
+        )
+        return rd
+
+    def get_scale(self) -> dict:
+        return {
+            'object_roles': ObjectRole.objects.count(),
+            'role_evaluations': RoleEvaluation.objects.count() + RoleEvaluationUUID.objects.count(),
+            'users': User.objects.count(),
+            'teams': Team.objects.count(),
+        }
+
+    def run_benchmarks(self, user: User, repeat: int) -> dict:
+        results = {}
+        orgs = list(Organization.objects.filter(name__startswith='benchmark').order_by('id'))
+        new_users = User.objects.bulk_create([User(username=f'benchmark-new-user-{k}') for k in range(repeat)])
+        org_rd = self.org_role_definition()
+        results['give_permission'] = measure([lambda k=k: org_rd.give_permission(new_users[k], orgs[k % len(orgs)]) for k in range(repeat)])
+
+        results['compute_team_member_roles'] = measure([compute_team_member_roles] * repeat)
+        results['rebuild_rbac_evaluations'] = measure([lambda: call_command('rebuild_rbac_evaluations', stdout=StringIO())] * repeat)
+
+        for model in (Inventory, UUIDModel):
+            queryset = model.access_qs(user).filter(organization__name__startswith='benchmark').order_by('pk')
+            if not queryset.exists():
+                raise CommandError(f'Benchmark user can not see any {model._meta.model_name}, data was not set up correctly')
+            results[f'access_qs_{model._meta.model_name}'] = measure([lambda qs=queryset: (qs.count(), list(qs[:25]))] * repeat)
+
+            sample = list(model.objects.filter(organization__name__startswith='benchmark').order_by('pk')[:25])
+
+            def check_sample(objs=sample):
+                invalidate_evaluation_caches()  # so every run queries the database
+                for obj in objs:
+                    user.has_obj_perm(obj, 'change')
+
+            results[f'has_obj_perm_{model._meta.model_name}'] = measure([check_sample] * repeat)
+        return results
+
+    def handle(self, *args, **options):
+        if min(options['organizations'], options['objects'], options['team_depth'], options['repeat']) < 1 or options['users_per_team'] < 0:
+            raise CommandError('--organizations, --objects, --team-depth, and --repeat must be positive')
+
+        parameters = {key: options[key] for key in ('organizations', 'objects', 'team_depth', 'users_per_team', 'repeat')}
+        with rolled_back_transaction():
+            user, setup_seconds = timed(self.create_data, options['organizations'], options['objects'], options['team_depth'], options['users_per_team'])
+            data = {
+                'database': connection.vendor,
+                'parameters': parameters,
+                'setup_seconds': round(setup_seconds, 3),
+                'scale': self.get_scale(),
+                'results': self.run_benchmarks(user, options['repeat']),
+            }
+
+        text = json.dumps(data, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(text + '\n')
+            for name, result in data['results'].items():
+                self.stdout.write(f'{name}: {result["median_ms"]:.2f} ms median, {result["queries"]} queries')
+            self.stdout.write(f'Results written to {options["output"]}')
+        else:
+            self.stdout.write(text)
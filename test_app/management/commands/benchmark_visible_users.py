@@ -0,0 +1,74 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from ansible_base.rbac import rbac_batch
+from ansible_base.rbac.models import ObjectRole, RoleDefinition
+from ansible_base.rbac.policies import visible_users
+from test_app.benchmark import rolled_back_transaction, time_query, timed
+from test_app.models import Organization, User
+
+
+def combined_visible_users(request_user):
+    "The prior form of visible_users, an IN subquery and other conditions combined as querysets, with DISTINCT"
+    org_cls = apps.get_model(settings.ANSIBLE_BASE_ORGANIZATION_MODEL)
+    object_id_fd = ObjectRole._meta.get_field('object_id')
+    members_of_visible_orgs = ObjectRole.objects.filter(
+        role_definition__permissions__codename='member_organization', object_id__in=org_cls.access_ids_qs(request_user, 'view', cast_field=object_id_fd)
+    ).values('users')
+    queryset = User.objects.filter(pk__in=members_of_visible_orgs)
+    queryset = queryset | User.objects.filter(is_superuser=True)
+    queryset = queryset | User.objects.filter(pk=request_user.id)
+    return queryset.distinct()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the query of visible_users for an organization admin with the prior form that combined querysets with DISTINCT, '
+        'using the configured database. Data is created in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=10, help='Number of organizations to create')
+        parser.add_argument('--users', type=int, default=200, help='Number of member users to create in each organization')
+        parser.add_argument('--repeat', type=int, default=5, help='Number of times to time each query, the median time is shown')
+        parser.add_argument('--explain', action='store_true', help='Show the query plan for each form')
+
+    def create_data(self, org_ct: int, user_ct: int) -> User:
+        "Creates organizations with members, and an admin of some organizations, which are also members of others"
+        orgs = Organization.objects.bulk_create([Organization(name=f'benchmark-org-{i}') for i in range(org_ct)])
+        users = User.objects.bulk_create([User(username=f'benchmark-user-{i}-{j}') for i in range(org_ct) for j in range(user_ct)])
+        admin = User.objects.create(username='benchmark-admin')
+
+        member_rd = RoleDefinition.objects.managed.org_member
+        admin_rd = RoleDefinition.objects.managed.org_admin
+        with rbac_batch():
+            for i, org in enumerate(orgs):
+                for user in users[i * user_ct : (i + 1) * user_ct]:  # noqa: E203
+                    member_rd.give_permission(user, org)
+                # users that are members of several organizations
+                member_rd.give_permission(users[0], org)
+                if i % 3 == 0:
+                    admin_rd.give_permission(admin, org)
+        return admin
+
+    def handle(self, *args, **options):
+        # org admins can see all users by default, which would skip the query being compared
+        with rolled_back_transaction(), override_settings(ORG_ADMINS_CAN_SEE_ALL_USERS=False):
+            admin, setup_seconds = timed(self.create_data, options['organizations'], options['users'])
+            self.stdout.write(f'Created data in {setup_seconds:.2f} seconds, database: {connection.vendor}')
+
+            results = {}
+            for name, func in (('combined', combined_visible_users), ('semi-join', visible_users)):
+                queryset = func(admin).filter(username__startswith='benchmark').order_by('username')
+                count_ms = time_query(queryset.count, options['repeat'])
+                page_ms = time_query(lambda: list(queryset[:25]), options['repeat'])
+                results[name] = set(queryset.values_list('pk', flat=True))
+                self.stdout.write(f'{name}: {len(results[name])} users, count {count_ms:.2f} ms, page {page_ms:.2f} ms')
+                if options['explain']:
+                    self.stdout.write(queryset.explain())
+
+        if results['combined'] != results['semi-join']:
+            raise CommandError('Query forms gave different results')
@@ -0,0 +1,141 @@
+from unittest import mock
+
+import pytest
+from rest_framework.exceptions import ValidationError
+
+from ansible_base.lib.utils.response import get_relative_url
+from ansible_base.rbac import caching
+from ansible_base.rbac.api.views import RoleTeamAssignmentViewSet
+from ansible_base.rbac.models import RoleDefinition, RoleUserAssignment
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.models import Inventory, Team, User, UUIDModel
+
+
+@pytest.fixture
+def users():
+    return [User.objects.create(username=f'bulk-user-{i}') for i in range(3)]
+
+
+@pytest.mark.django_db
+def test_bulk_create_user_assignments(admin_api_client, users, inv_rd, inventory):
+    url = get_relative_url('roleuserassignment-bulk-create')
+    assignments = [{'user': user.pk, 'role_definition': inv_rd.pk, 'object_id': inventory.pk} for user in users]
+    assignments.append({'user': users[0].pk, 'role_definition': inv_rd.pk + 100, 'object_id': inventory.pk})
+
+    with mock.patch.object(caching, 'compute_object_role_permissions', wraps=caching.compute_object_role_permissions) as mck:
+        response = admin_api_client.post(url, data={'assignments': assignments}, format='json')
+    assert response.status_code == 200, response.data
+    mck.assert_called_once()  # evaluations are updated once for the whole request
+
+    results = response.data['results']
+    assert [result['status'] for result in results] == [201, 201, 201, 400]
+    assert 'role_definition' in results[3]['errors']
+    assert results[0]['data']['user'] == users[0].pk
+    for user in users:
+        assert user.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_bulk_create_permission_per_object(user_api_client, user, inv_rd, view_inv_rd, organization):
+    inventories = [Inventory.objects.create(name=f'bulk-inv-{i}', organization=organization) for i in range(3)]
+    inv_rd.give_permission(user, inventories[0])
+    view_inv_rd.give_permission(user, inventories[1])
+    url = get_relative_url('roleuserassignment-bulk-create')
+    assignments = [
+        {'user': user.pk, 'role_definition': inv_rd.pk, 'object_id': inventories[0].pk},
+        {'user': user.pk, 'role_definition': inv_rd.pk, 'object_id': inventories[1].pk},
+        {'user': user.pk, 'role_definition': view_inv_rd.pk, 'object_id': inventories[1].pk},
+        {'user': user.pk, 'role_definition': inv_rd.pk, 'object_id': inventories[2].pk},
+    ]
+
+    response = user_api_client.post(url, data={'assignments': assignments}, format='json')
+    assert response.status_code == 200, response.data
+    # no change permission to inventories[1], not visible to user inventories[2]
+    assert [result['status'] for result in response.data['results']] == [201, 403, 403, 400]
+    assert not user.has_obj_perm(inventories[1], 'change')
+
+
+@pytest.mark.django_db
+def test_bulk_create_failed_item_updates_discarded(admin_api_client, rando, organization, member_rd, inv_rd, inventory):
+    teams = [Team.objects.create(name=f'bulk-team-{i}', organization=organization) for i in range(2)]
+    member_rd.give_permission(rando, teams[0])
+    url = get_relative_url('roleteamassignment-bulk-create')
+    assignments = [
+        {'team': teams[0].pk, 'role_definition': inv_rd.pk, 'object_id': inventory.pk},
+        {'team': teams[0].pk, 'role_definition': member_rd.pk, 'object_id': teams[1].pk},
+    ]
+
+    perform_create = RoleTeamAssignmentViewSet.perform_create
+
+    def fail_after_assignment(self, serializer):
+        perform_create(self, serializer)
+        if serializer.validated_data['role_definition'] == member_rd:
+            raise ValidationError('failed after the assignment was made')
+
+    with mock.patch.object(RoleTeamAssignmentViewSet, 'perform_create', fail_after_assignment):
+        with mock.patch.object(caching, 'compute_team_member_roles', wraps=caching.compute_team_member_roles) as mck:
+            response = admin_api_client.post(url, data={'assignments': assignments}, format='json')
+    assert response.status_code == 200, response.data
+    assert [result['status'] for result in response.data['results']] == [201, 400]
+
+    # team membership from the rolled back item is not recomputed
+    mck.assert_not_called()
+    assert rando.has_obj_perm(inventory, 'change')
+    assert not rando.has_obj_perm(teams[1], 'member')
+
+
+@pytest.mark.django_db
+def test_bulk_delete_user_assignments(admin_api_client, users, inv_rd, inventory):
+    for user in users[:2]:
+        inv_rd.give_permission(user, inventory)
+    url = get_relative_url('roleuserassignment-bulk-delete')
+    assignments = [{'user': user.pk, 'role_definition': inv_rd.pk, 'object_id': inventory.pk} for user in users]
+
+    response = admin_api_client.post(url, data={'assignments': assignments}, format='json')
+    assert response.status_code == 200, response.data
+    assert [result['status'] for result in response.data['results']] == [204, 204, 400]
+    assert not RoleUserAssignment.objects.filter(role_definition=inv_rd).exists()
+    for user in users:
+        assert not user.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_bulk_uuid_model_assignments(admin_api_client, users, organization):
+    uuid_rd = RoleDefinition.objects.create_from_permissions(
+        permissions=['view_uuidmodel', 'change_uuidmodel'],
+        name='bulk-uuid-rd',
+        content_type=permission_registry.content_type_model.objects.get_for_model(UUIDModel),
+    )
+    uuid_objs = [UUIDModel.objects.create(organization=organization) for i in range(2)]
+    assignments = [{'user': user.pk, 'role_definition': uuid_rd.pk, 'object_id': str(obj.pk)} for user, obj in zip(users, uuid_objs)]
+
+    response = admin_api_client.post(get_relative_url('roleuserassignment-bulk-create'), data={'assignments': assignments}, format='json')
+    assert response.status_code == 200, response.data
+    assert [result['status'] for result in response.data['results']] == [201, 201]
+    assert users[0].has_obj_perm(uuid_objs[0], 'change')
+
+    # an assignment made outside of the bulk endpoint is found the same way
+    uuid_rd.give_permission(users[2], uuid_objs[0])
+    assignments.append({'user': users[2].pk, 'role_definition': uuid_rd.pk, 'object_id': str(uuid_objs[0].pk)})
+    response = admin_api_client.post(get_relative_url('roleuserassignment-bulk-delete'), data={'assignments': assignments}, format='json')
+    assert response.status_code == 200, response.data
+    assert [result['status'] for result in response.data['results']] == [204, 204, 204]
+    assert not RoleUserAssignment.objects.filter(role_definition=uuid_rd).exists()
+    assert not users[2].has_obj_perm(uuid_objs[0], 'change')
+
+
+@pytest.mark.django_db
+def test_bulk_create_team_assignments(admin_api_client, team, rando, member_rd, inv_rd, inventory):
+    member_rd.give_permission(rando, team)
+    url = get_relative_url('roleteamassignment-bulk-create')
+    response = admin_api_client.post(url, data={'assignments': [{'team': team.pk, 'role_definition': inv_rd.pk, 'object_id': inventory.pk}]}, format='json')
+    assert response.status_code == 200, response.data
+    assert response.data['results'][0]['status'] == 201
+    assert rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_bulk_assignments_empty(admin_api_client):
+    url = get_relative_url('roleuserassignment-bulk-create')
+    response = admin_api_client.post(url, data={'assignments': []}, format='json')
+    assert response.status_code == 400, response.data
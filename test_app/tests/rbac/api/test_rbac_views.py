@@ -3,6 +3,8 @@ from django.test.utils import override_settings
 
 from ansible_base.lib.utils.response import get_relative_url
 from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.permission_registry import permission_registry
+from ansible_base.rbac.validators import combine_values, permissions_allowed_for_role
 
 
 @pytest.mark.django_db
@@ -182,6 +184,37 @@ def test_role_metadata_view(user_api_client):
     assert 'aap.change_collectionimport' in allowed_permissions['aap.namespace']
 
 
+@pytest.mark.django_db
+def test_role_metadata_conditional_get(user_api_client, django_assert_max_num_queries):
+    url = get_relative_url('role-metadata')
+    response = user_api_client.get(url)
+    assert response.status_code == 200
+    etag = response['ETag']
+    assert response['Last-Modified']
+
+    with django_assert_max_num_queries(3):  # only authentication, no permission queries
+        response = user_api_client.get(url)
+    assert response['ETag'] == etag
+
+    response = user_api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert response['ETag'] == etag
+
+    response = user_api_client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_role_metadata_matches_permissions(user_api_client):
+    allowed_permissions = user_api_client.get(get_relative_url('role-metadata')).data['allowed_permissions']
+    for cls in permission_registry.all_registered_models:
+        expected = []
+        for codename in combine_values(permissions_allowed_for_role(cls)):
+            perm = permission_registry.permission_qs.get(codename=codename)
+            expected.append(f'{permission_registry.get_resource_prefix(perm.content_type.model_class())}.{codename}')
+        assert sorted(allowed_permissions[f'{permission_registry.get_resource_prefix(cls)}.{cls._meta.model_name}']) == sorted(expected)
+
+
 @override_settings(ANSIBLE_BASE_ALLOW_CUSTOM_ROLES=False)
 def test_role_definitions_post_disabled_by_settings(admin_api_client):
     url = get_relative_url('roledefinition-list')
@@ -354,3 +354,11 @@ class TestRelationshipBasedAssignment:
         assert set(visible_users(user).values_list('id', flat=True)) == {admin_user.id, user.id}
         assert set(visible_users(user, always_show_superusers=False).values_list('id', flat=True)) == {user.id}
         assert set(visible_users(user, always_show_self=False).values_list('id', flat=True)) == {admin_user.id}
+
+    @override_settings(ORG_ADMINS_CAN_SEE_ALL_USERS=False)
+    def test_visible_users_single_query(self, admin_user, user, organization, org_member_rd):
+        org_member_rd.give_permission(user, organization)
+        queryset = visible_users(user, queryset=User.objects.filter(is_superuser=False))
+        assert not queryset.query.distinct
+        # filters of the given queryset apply to superusers and self as well
+        assert set(queryset) == {user}
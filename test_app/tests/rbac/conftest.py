@@ -1,11 +1,19 @@
 import pytest
 from django.contrib.auth import get_user_model
+from django.db import connection
 
 from ansible_base.rbac import permission_registry
 from ansible_base.rbac.models import RoleDefinition
 from test_app.models import Inventory, Organization
 
 
+@pytest.fixture
+def multiprocess_db(transactional_db):
+    "For commands with --workers, whose processes make their own connections and need to see committed data"
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        pytest.skip('Worker processes can not share an in-memory sqlite3 database')
+
+
 @pytest.fixture
 def rando():
     return get_user_model().objects.create(username='rando')
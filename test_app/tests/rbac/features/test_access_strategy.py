@@ -0,0 +1,70 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.models import CollectionImport, Inventory, Namespace, Organization, Team, UUIDModel
+
+
+@pytest.fixture
+def org_rd():
+    return RoleDefinition.objects.create_from_permissions(
+        permissions=['view_organization', 'view_inventory', 'change_inventory', 'view_uuidmodel', 'view_namespace', 'view_collectionimport'],
+        name='org-strategy-role',
+        content_type=permission_registry.content_type_model.objects.get_for_model(Organization),
+    )
+
+
+@pytest.fixture
+def rbac_objects(rando, inv_rd, member_rd, org_rd):
+    orgs = [Organization.objects.create(name=f'strategy-org-{i}') for i in range(3)]
+    for org in orgs:
+        for i in range(2):
+            Inventory.objects.create(name=f'{org.name}-inv-{i}', organization=org)
+            UUIDModel.objects.create(organization=org)
+            namespace = Namespace.objects.create(name=f'{org.name}-ns-{i}', organization=org)
+            CollectionImport.objects.create(name=f'{namespace.name}-col', namespace=namespace)
+    team = Team.objects.create(name='strategy-team', organization=orgs[0])
+    member_rd.give_permission(rando, team)
+    # same permissions from several roles, which gives duplicate evaluation entries
+    org_rd.give_permission(rando, orgs[0])
+    org_rd.give_permission(team, orgs[0])
+    org_rd.give_permission(team, orgs[1])
+    inv_rd.give_permission(rando, Inventory.objects.filter(organization=orgs[2]).first())
+
+
+def access_results(user):
+    return (
+        sorted(Inventory.access_qs(user, 'change').values_list('pk', flat=True)),
+        sorted(Inventory.access_qs(user, 'view', queryset=Inventory.objects.filter(name__endswith='-0')).values_list('pk', flat=True)),
+        sorted(UUIDModel.access_qs(user).values_list('pk', flat=True)),
+        sorted(CollectionImport.access_qs(user).values_list('pk', flat=True)),
+        Inventory.access_qs(user, 'delete').count(),
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('storage', ['object', 'parent'])
+def test_exists_same_results(rbac_objects, rando, storage):
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE=storage):
+        if storage == 'parent':
+            from ansible_base.rbac.caching import compute_object_role_permissions
+
+            compute_object_role_permissions()
+        in_results = access_results(rando)
+        assert in_results[0] and in_results[2] and in_results[3]  # sanity
+        with override_settings(ANSIBLE_BASE_ACCESS_QS_STRATEGY='exists'):
+            assert access_results(rando) == in_results
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_ACCESS_QS_STRATEGY_BY_MODEL={'test_app.inventory': 'exists'})
+def test_exists_strategy_by_model(rbac_objects, rando):
+    with CaptureQueriesContext(connection) as captured:
+        Inventory.access_qs(rando).count()
+        Organization.access_qs(rando).count()
+    inv_sql, org_sql = [query['sql'] for query in captured.captured_queries[-2:]]
+    assert 'EXISTS' in inv_sql
+    assert 'DISTINCT' not in inv_sql
+    assert 'EXISTS' not in org_sql
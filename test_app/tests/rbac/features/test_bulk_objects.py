@@ -0,0 +1,102 @@
+import pytest
+from django.test.utils import override_settings
+
+from ansible_base.rbac import bulk_objects_created, bulk_parent_changed, rbac_batch
+from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.models import CollectionImport, Inventory, Namespace, Organization, Team
+
+
+@pytest.fixture
+def org_collection_rd():
+    return RoleDefinition.objects.create_from_permissions(
+        permissions=['view_organization', 'view_namespace', 'view_collectionimport'],
+        name='org-collection-viewer',
+        content_type=permission_registry.content_type_model.objects.get_for_model(Organization),
+    )
+
+
+def bulk_inventories(organization, count=5):
+    return Inventory.objects.bulk_create([Inventory(name=f'bulk-inv-{i}', organization=organization) for i in range(count)])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('storage', ['object', 'parent'])
+def test_bulk_created_objects(rando, organization, org_inv_rd, storage):
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE=storage):
+        org_inv_rd.give_permission(rando, organization)
+        invs = bulk_inventories(organization)
+        bulk_objects_created(Inventory, invs)
+        assert set(Inventory.access_qs(rando, 'change')) == set(invs)
+        assert all(rando.has_obj_perm(inv, 'delete') for inv in invs)
+
+
+@pytest.mark.django_db
+def test_bulk_created_query_count(rando, organization, org_inv_rd, django_assert_max_num_queries):
+    org_inv_rd.give_permission(rando, organization)
+    invs = bulk_inventories(organization, count=50)
+    # number of queries depends on the affected roles, not on the number of objects
+    with django_assert_max_num_queries(20):
+        bulk_objects_created(Inventory, invs)
+    assert Inventory.access_qs(rando).count() == 50
+
+
+@pytest.mark.django_db
+def test_bulk_created_nested_objects(rando, organization, team, member_rd, org_collection_rd):
+    member_rd.give_permission(rando, team)
+    org_collection_rd.give_permission(team, organization)
+    namespace = Namespace.objects.create(name='bulk-namespace', organization=organization)
+    collections = CollectionImport.objects.bulk_create([CollectionImport(name=f'bulk-col-{i}', namespace=namespace) for i in range(3)])
+    assert not CollectionImport.access_qs(rando).exists()
+
+    bulk_objects_created(CollectionImport, collections)
+    assert set(CollectionImport.access_qs(rando)) == set(collections)
+
+
+@pytest.mark.django_db
+def test_bulk_created_in_batch(rando, organization, org_inv_rd):
+    with rbac_batch():
+        org_inv_rd.give_permission(rando, organization)
+        invs = bulk_inventories(organization)
+        bulk_objects_created(Inventory, invs)
+    assert set(Inventory.access_qs(rando, 'change')) == set(invs)
+
+
+@pytest.mark.django_db
+def test_bulk_created_teams(rando, organization, member_rd):
+    org_member_rd = RoleDefinition.objects.create_from_permissions(
+        permissions=['member_team', 'view_team', 'view_organization'],
+        name='org-team-member',
+        content_type=permission_registry.content_type_model.objects.get_for_model(Organization),
+        managed=True,
+    )
+    org_member_rd.give_permission(rando, organization)
+    teams = Team.objects.bulk_create([Team(name=f'bulk-team-{i}', organization=organization) for i in range(3)])
+    bulk_objects_created(Team, teams)
+    assert all(rando.has_obj_perm(team, 'member_team') for team in teams)
+
+
+@pytest.mark.django_db
+def test_bulk_update_parent(rando, organization, org_inv_rd):
+    other_org = Organization.objects.create(name='other-bulk-org')
+    org_inv_rd.give_permission(rando, organization)
+    bulk_objects_created(Inventory, bulk_inventories(other_org))
+    assert not Inventory.access_qs(rando).exists()
+
+    invs = list(Inventory.objects.filter(organization=other_org))
+    for inv in invs:
+        inv.organization = organization
+    Inventory.objects.bulk_update(invs, ['organization'])
+    bulk_parent_changed(Inventory, invs)
+    assert set(Inventory.access_qs(rando, 'change')) == set(invs)
+
+    # moving back, with QuerySet.update and the old parent id given
+    Inventory.objects.filter(pk__in=[inv.pk for inv in invs]).update(organization=other_org)
+    bulk_parent_changed(Inventory, Inventory.objects.filter(pk__in=[inv.pk for inv in invs]), old_parent_ids=[organization.pk])
+    assert not Inventory.access_qs(rando).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_unsaved_objects(organization):
+    with pytest.raises(ValueError):
+        bulk_objects_created(Inventory, [Inventory(name='not-saved', organization=organization)])
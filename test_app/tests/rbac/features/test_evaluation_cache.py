@@ -0,0 +1,54 @@
+import pytest
+from django.test.utils import override_settings
+
+from ansible_base.rbac.evaluations import get_evaluation_cache
+from test_app.models import Organization, User
+
+
+@pytest.mark.django_db
+def test_repeated_checks_cached(rando, inventory, inv_rd, django_assert_num_queries):
+    inv_rd.give_permission(rando, inventory)
+    assert rando.has_obj_perm(inventory, 'change')
+    assert not rando.has_obj_perm(inventory, 'delete')
+    with django_assert_num_queries(0):
+        for _ in range(3):
+            assert rando.has_obj_perm(inventory, 'change')
+            assert not rando.has_obj_perm(inventory, 'delete')
+
+    cache = get_evaluation_cache(rando)
+    assert cache.misses == 2
+    assert cache.hits == 6
+
+
+@pytest.mark.django_db
+def test_cache_cleared_by_assignment(rando, inventory, inv_rd):
+    assert not rando.has_obj_perm(inventory, 'change')
+    inv_rd.give_permission(rando, inventory)
+    assert rando.has_obj_perm(inventory, 'change')
+    inv_rd.remove_permission(rando, inventory)
+    assert not rando.has_obj_perm(inventory, 'change')
+    assert get_evaluation_cache(rando).hits == 0
+
+
+@pytest.mark.django_db
+def test_cache_cleared_by_team_membership(rando, team, inventory, inv_rd, member_rd):
+    inv_rd.give_permission(team, inventory)
+    # another object for the same user, like in a different request
+    other_rando = User.objects.get(pk=rando.pk)
+    assert not rando.has_obj_perm(inventory, 'change')
+
+    member_rd.give_permission(other_rando, team)
+    assert rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE='parent')
+def test_cache_cleared_by_moving_object(rando, inventory, org_inv_rd):
+    "In parent storage mode, evaluation entries do not change when an object moves, but permissions do"
+    other_org = Organization.objects.create(name='cache-org')
+    org_inv_rd.give_permission(rando, other_org)
+    assert not rando.has_obj_perm(inventory, 'change')
+
+    inventory.organization = other_org
+    inventory.save()
+    assert rando.has_obj_perm(inventory, 'change')
@@ -0,0 +1,120 @@
+import logging
+from contextlib import contextmanager
+from io import StringIO
+from unittest import mock
+
+import pytest
+from django.core.management import call_command
+from django.test.utils import override_settings
+
+from ansible_base.lib.utils.response import get_relative_url
+from ansible_base.rbac import rbac_batch
+from ansible_base.rbac.instrumentation import current_trigger, format_labels, rbac_recompute_finished, recompute_metrics, recompute_trigger
+from ansible_base.rbac.management.commands.RBAC_checks import Command as RBACChecksCommand
+from ansible_base.rbac.triggers import post_migration_rbac_setup
+from test_app.models import Inventory
+
+
+@contextmanager
+def capture_recomputes():
+    events = []
+
+    def receiver(sender, stats, **kwargs):
+        events.append(stats)
+
+    rbac_recompute_finished.connect(receiver)
+    try:
+        yield events
+    finally:
+        rbac_recompute_finished.disconnect(receiver)
+
+
+@pytest.fixture
+def metrics():
+    recompute_metrics.reset()
+    with override_settings(ANSIBLE_BASE_RBAC_METRICS=True):
+        yield recompute_metrics
+    recompute_metrics.reset()
+
+
+def test_outermost_trigger():
+    assert current_trigger() == 'other'
+    with recompute_trigger('post_migrate'):
+        with recompute_trigger('assignment'):
+            assert current_trigger() == 'post_migrate'
+    assert current_trigger() == 'other'
+
+
+@pytest.mark.django_db
+def test_assignment_recompute_stats(rando, inventory, inv_rd):
+    with capture_recomputes() as events:
+        inv_rd.give_permission(rando, inventory)
+    object_events = [stats for stats in events if stats.kind == 'object_roles']
+    assert len(object_events) == 1
+    assert object_events[0].trigger == 'assignment'
+    assert object_events[0].roles == 1
+    assert object_events[0].added == 2  # view and change permission
+    assert object_events[0].duration > 0
+
+
+@pytest.mark.django_db
+def test_team_recompute_stats(rando, team, member_rd):
+    with capture_recomputes() as events:
+        member_rd.give_permission(rando, team)
+    team_events = [stats for stats in events if stats.kind == 'team_members']
+    assert [stats.trigger for stats in team_events] == ['assignment']
+    assert team_events[0].teams == 1
+    assert team_events[0].added == 1
+
+
+@pytest.mark.django_db
+def test_other_triggers(rando, organization, org_inv_rd):
+    with capture_recomputes() as events:
+        with rbac_batch():
+            org_inv_rd.give_permission(rando, organization)
+        Inventory.objects.create(name='instrumented-inv', organization=organization)
+        post_migration_rbac_setup(sender=None)
+    assert [stats.trigger for stats in events if stats.kind == 'object_roles'] == ['batch', 'parent_change', 'post_migrate']
+
+
+@pytest.mark.django_db
+def test_slow_recompute_warning(rando, inventory, inv_rd, caplog):
+    with override_settings(ANSIBLE_BASE_RBAC_SLOW_RECOMPUTE_SECONDS=0):
+        with caplog.at_level(logging.WARNING, logger='ansible_base.rbac.instrumentation'):
+            inv_rd.give_permission(rando, inventory)
+    assert 'Slow RBAC recompute of object_roles' in caplog.text
+    assert 'trigger: assignment' in caplog.text
+
+
+@pytest.mark.django_db
+def test_metrics_view(admin_api_client, rando, inventory, inv_rd, metrics):
+    inv_rd.give_permission(rando, inventory)
+    response = admin_api_client.get(get_relative_url('rbac-metrics'))
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = response.content.decode()
+    assert 'dab_rbac_recompute_added_total{kind="object_roles",trigger="assignment"} 2' in text
+    assert 'dab_rbac_recompute_duration_seconds_count{kind="object_roles",trigger="assignment"} 1' in text
+    assert 'dab_rbac_recompute_duration_seconds_bucket{kind="object_roles",trigger="assignment",le="+Inf"} 1' in text
+    assert '# TYPE dab_rbac_team_graph_teams gauge' in text
+
+
+@pytest.mark.django_db
+def test_metrics_view_access(admin_api_client, user_api_client, metrics):
+    assert user_api_client.get(get_relative_url('rbac-metrics')).status_code == 403
+    with override_settings(ANSIBLE_BASE_RBAC_METRICS=False):
+        assert admin_api_client.get(get_relative_url('rbac-metrics')).status_code == 404
+
+
+def test_format_labels_escaped():
+    assert format_labels({'kind': 'a\\b "c"\nd'}) == '{kind="a\\\\b \\"c\\"\\nd"}'
+    assert format_labels({}) == ''
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('repair', [True, False])
+def test_rbac_checks_trigger(repair):
+    triggers = []
+    with mock.patch.object(RBACChecksCommand, 'check_orphans', lambda self, options: triggers.append(current_trigger())):
+        call_command('RBAC_checks', *(['--repair'] if repair else []), stdout=StringIO())
+    assert triggers == ['repair' if repair else 'other']
@@ -0,0 +1,95 @@
+import pytest
+from django.test.utils import override_settings
+
+from ansible_base.rbac.caching import compute_object_role_permissions
+from ansible_base.rbac.models import RoleDefinition, RoleEvaluation, RoleUserAssignment
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.models import CollectionImport, Inventory, Namespace, Organization
+
+
+@pytest.fixture
+def org_collection_rd():
+    return RoleDefinition.objects.create_from_permissions(
+        permissions=['change_collectionimport', 'add_collectionimport', 'view_collectionimport', 'view_namespace', 'view_organization'],
+        name='collection-manager',
+        content_type=permission_registry.content_type_model.objects.get_for_model(Organization),
+    )
+
+
+@pytest.fixture
+def collections(organization):
+    namespaces = [Namespace.objects.create(name=f'parent-ns-{i}', organization=organization) for i in range(2)]
+    return [CollectionImport.objects.create(name=f'parent-col-{i}', namespace=namespaces[i % 2]) for i in range(4)]
+
+
+def test_parent_paths():
+    assert permission_registry.get_parent_paths(CollectionImport) == [('namespace', Namespace), ('namespace__organization', Organization)]
+    assert permission_registry.get_parent_paths(Inventory) == [('organization', Organization)]
+    assert permission_registry.get_parent_paths(Organization) == []
+
+
+def evaluation_results(user, organization):
+    namespace = Namespace.objects.filter(organization=organization).first()
+    collection = CollectionImport.objects.filter(namespace=namespace).first()
+    return (
+        set(CollectionImport.access_ids_qs(user, 'change')),
+        set(Namespace.access_ids_qs(user, 'add_collectionimport')),
+        set(Organization.access_ids_qs(user, 'view_namespace')),
+        user.has_obj_perm(collection, 'change'),
+        user.has_obj_perm(namespace, 'add_collectionimport'),
+        user.has_obj_perm(namespace, 'view_collectionimport'),
+        user.has_obj_perm(organization, 'view_namespace'),
+        set(RoleEvaluation.get_permissions(user, namespace)),
+        set(RoleEvaluation.get_permissions(user, collection)),
+    )
+
+
+@pytest.mark.django_db
+def test_parent_storage_same_results(rando, organization, collections, org_collection_rd):
+    org_collection_rd.give_permission(rando, organization)
+    object_results = evaluation_results(rando, organization)
+    object_row_ct = RoleEvaluation.objects.count()
+
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE='parent'):
+        compute_object_role_permissions()
+        assert RoleEvaluation.objects.count() < object_row_ct
+        assert evaluation_results(rando, organization) == object_results
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE='parent')
+def test_create_child_no_evaluation_writes(rando, organization, collections, org_collection_rd, django_assert_max_num_queries):
+    org_collection_rd.give_permission(rando, organization)
+    row_ct = RoleEvaluation.objects.count()
+    namespace = collections[0].namespace
+
+    with django_assert_max_num_queries(2):
+        collection = CollectionImport.objects.create(name='new-collection', namespace=namespace)
+    assert RoleEvaluation.objects.count() == row_ct
+    assert rando.has_obj_perm(collection, 'change')
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE='parent')
+def test_move_child_object(rando, org_collection_rd):
+    orgs = [Organization.objects.create(name=f'parent-org-{i}') for i in range(2)]
+    namespace = Namespace.objects.create(name='moving-ns', organization=orgs[0])
+    collection = CollectionImport.objects.create(name='moving-col', namespace=namespace)
+    org_collection_rd.give_permission(rando, orgs[1])
+    assert not rando.has_obj_perm(collection, 'change')
+
+    namespace.organization = orgs[1]
+    namespace.save()
+    assert rando.has_obj_perm(collection, 'change')
+    assert list(CollectionImport.access_qs(rando, 'change')) == [collection]
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE='parent')
+def test_visible_assignments_from_parent(rando, organization, inventory, org_inv_rd, inv_rd):
+    other_user = permission_registry.user_model.objects.create(username='other-user')
+    assignment = inv_rd.give_permission(other_user, inventory)
+    assert assignment not in RoleUserAssignment.visible_items(rando)
+
+    org_inv_rd.give_permission(rando, organization)
+    assert assignment in RoleUserAssignment.visible_items(rando)
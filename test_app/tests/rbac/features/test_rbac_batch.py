@@ -0,0 +1,95 @@
+from unittest import mock
+
+import pytest
+from django.db import transaction
+from django.test.utils import override_settings
+
+from ansible_base.rbac import rbac_batch
+from ansible_base.rbac.caching import compute_object_role_permissions, compute_team_member_roles
+from ansible_base.rbac.models import RoleEvaluation
+from test_app.models import Inventory, Team
+
+
+def evaluation_data():
+    return set(RoleEvaluation.objects.values_list('role__object_id', 'role__role_definition_id', 'codename', 'content_type_id', 'object_id'))
+
+
+def make_assignments(rando, organization, member_rd, org_inv_rd, inv_rd, org_team_member_rd):
+    teams = [Team.objects.create(name=f'batch-team-{i}', organization=organization) for i in range(3)]
+    inventories = [Inventory.objects.create(name=f'batch-inv-{i}', organization=organization) for i in range(3)]
+    # chain of team membership is built before the teams are given any permissions
+    member_rd.give_permission(rando, teams[0])
+    member_rd.give_permission(teams[0], teams[1])
+    member_rd.give_permission(teams[1], teams[2])
+    inv_rd.give_permission(teams[2], inventories[0])
+    org_inv_rd.give_permission(teams[1], organization)
+    org_team_member_rd.give_permission(teams[2], organization)
+    inv_rd.give_permission(rando, inventories[1])
+    inv_rd.remove_permission(rando, inventories[1])
+    return teams, inventories
+
+
+@pytest.mark.django_db
+def test_batch_same_as_unbatched(rando, organization, member_rd, org_inv_rd, inv_rd, org_team_member_rd):
+    with rbac_batch():
+        teams, inventories = make_assignments(rando, organization, member_rd, org_inv_rd, inv_rd, org_team_member_rd)
+        assert not rando.has_obj_perm(inventories[0], 'change')  # not computed yet
+
+    assert rando.has_obj_perm(inventories[0], 'change')
+    assert rando.has_obj_perm(inventories[2], 'change')
+    assert rando.has_obj_perm(teams[2], 'member')
+    batch_data = evaluation_data()
+
+    RoleEvaluation.objects.all().delete()
+
+    compute_team_member_roles()
+    compute_object_role_permissions()
+    assert evaluation_data() == batch_data
+
+
+@pytest.mark.django_db
+def test_batch_does_one_recompute(rando, organization, member_rd, org_inv_rd, inv_rd, org_team_member_rd):
+    with mock.patch('ansible_base.rbac.caching.compute_object_role_permissions') as compute_mck:
+        with mock.patch('ansible_base.rbac.triggers.compute_object_role_permissions') as trigger_mck:
+            with rbac_batch():
+                with rbac_batch():
+                    make_assignments(rando, organization, member_rd, org_inv_rd, inv_rd, org_team_member_rd)
+                compute_mck.assert_not_called()  # inner batch does not apply updates
+            compute_mck.assert_called_once()
+            trigger_mck.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_batch_exception_in_transaction(rando, inventory, inv_rd):
+    with pytest.raises(ValueError):
+        with transaction.atomic():
+            with rbac_batch():
+                inv_rd.give_permission(rando, inventory)
+                raise ValueError('something went wrong')
+    assert not rando.has_obj_perm(inventory, 'change')
+
+    # state of the batch was cleared by the error
+    with rbac_batch():
+        pass
+    assert not RoleEvaluation.objects.exists()
+
+
+@pytest.mark.django_db
+def test_batch_exception_keeps_prior_changes(rando, inventory, inv_rd):
+    with pytest.raises(ValueError):
+        with rbac_batch():
+            inv_rd.give_permission(rando, inventory)
+            raise ValueError('something went wrong')
+    # assignment was saved, so the evaluations are still updated
+    assert rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('engine', ['python', 'sql'])
+def test_batch_role_deleted_later(rando, inventory, inv_rd, engine):
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_ENGINE=engine):
+        with rbac_batch():
+            inv_rd.give_permission(rando, inventory)
+            inv_rd.remove_permission(rando, inventory)
+    assert not rando.has_obj_perm(inventory, 'change')
+    assert not RoleEvaluation.objects.exists()
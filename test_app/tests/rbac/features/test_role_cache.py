@@ -0,0 +1,99 @@
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.test.utils import override_settings
+
+from ansible_base.rbac.models import RoleDefinition
+from ansible_base.rbac.role_cache import get_user_role_data
+from test_app.models import User
+
+
+@pytest.fixture(autouse=True)
+def role_cache():
+    # database ids are reused between tests, so entries from other tests could look valid
+    with override_settings(ANSIBLE_BASE_RBAC_CACHE_NAME='default'):
+        caches['default'].clear()
+        yield caches['default']
+        caches['default'].clear()
+
+
+@pytest.fixture
+def global_change_rd():
+    return RoleDefinition.objects.create_from_permissions(permissions=['change_inventory', 'view_inventory'], name='global-change-inventory', content_type=None)
+
+
+def reload(user):
+    "Another object for the same user, like a user in a later request or a different process"
+    return User.objects.get(pk=user.pk)
+
+
+@pytest.mark.django_db
+def test_global_permissions_cached(rando, inventory, global_change_rd, django_assert_num_queries):
+    global_change_rd.give_global_permission(rando)
+    assert rando.singleton_permissions() == {'change_inventory', 'view_inventory'}
+
+    rando = reload(rando)
+    with django_assert_num_queries(0):
+        assert rando.singleton_permissions() == {'change_inventory', 'view_inventory'}
+        assert rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_role_ids_used_in_evaluation(rando, inventory, inv_rd, django_assert_num_queries):
+    assignment = inv_rd.give_permission(rando, inventory)
+    assert get_user_role_data(rando)['role_ids'] == [assignment.object_role_id]
+
+    rando = reload(rando)
+    with django_assert_num_queries(1) as captured:
+        assert rando.has_obj_perm(inventory, 'change')
+    assert 'roleuserassignment' not in captured.captured_queries[0]['sql']
+
+
+@pytest.mark.django_db
+def test_object_role_changes(rando, inventory, inv_rd):
+    assert not reload(rando).has_obj_perm(inventory, 'change')
+    inv_rd.give_permission(rando, inventory)
+    assert reload(rando).has_obj_perm(inventory, 'change')
+    inv_rd.remove_permission(rando, inventory)
+    assert not reload(rando).has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_team_global_role_changes(rando, team, inventory, member_rd, global_change_rd):
+    member_rd.give_permission(rando, team)
+    assert not reload(rando).has_obj_perm(inventory, 'change')
+
+    global_change_rd.give_global_permission(team)
+    assert reload(rando).has_obj_perm(inventory, 'change')
+
+    global_change_rd.remove_global_permission(team)
+    assert not reload(rando).has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_ALLOW_CUSTOM_TEAM_ROLES=True)
+def test_team_membership_changes(rando, organization, team, inventory, global_change_rd):
+    global_change_rd.give_global_permission(team)
+    assert not reload(rando).has_obj_perm(inventory, 'change')
+
+    # membership to the team from an organization role
+    org_team_member_rd = RoleDefinition.objects.create_from_permissions(
+        permissions=['member_team', 'view_team', 'view_organization'], name='org-team-member', content_type=ContentType.objects.get_for_model(organization)
+    )
+    org_team_member_rd.give_permission(rando, organization)
+    assert reload(rando).has_obj_perm(inventory, 'change')
+
+    team.delete()
+    assert not reload(rando).has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_global_role_definition_changes(rando, inventory, global_change_rd):
+    global_change_rd.give_global_permission(rando)
+    assert not reload(rando).has_obj_perm(inventory, 'delete')
+
+    global_change_rd.permissions.add(global_change_rd.permissions.model.objects.get(codename='delete_inventory'))
+    assert reload(rando).has_obj_perm(inventory, 'delete')
+
+    global_change_rd.delete()
+    assert not reload(rando).has_obj_perm(inventory, 'change')
@@ -1,6 +1,8 @@
 import pytest
 
 from ansible_base.rbac import permission_registry
+from ansible_base.rbac.models import RoleDefinition, RoleUserAssignment
+from test_app.models import Team, User
 
 
 @pytest.mark.django_db
@@ -71,3 +73,77 @@ def test_add_organization_member_to_relationship(rando, organization, org_member
     object_role = org_member_rd.object_roles.first()
     assert rando in object_role.users.all()
     assert rando.has_obj_perm(organization, 'member')
+
+
+@pytest.mark.django_db
+def test_add_many_users_to_relationship(team, inventory, inv_rd, member_rd, django_assert_max_num_queries):
+    inv_rd.give_permission(team, inventory)
+    users = User.objects.bulk_create([User(username=f'tracked-user-{i}') for i in range(30)])
+    # number of queries does not depend on the number of users
+    with django_assert_max_num_queries(40):
+        team.users.add(*users)
+    assert RoleUserAssignment.objects.filter(role_definition=member_rd, object_id=str(team.pk)).count() == 30
+    assert all(user.has_obj_perm(inventory, 'change_inventory') for user in users)
+
+    team.users.remove(*users[:10])
+    assert not users[0].has_obj_perm(inventory, 'change_inventory')
+    assert users[10].has_obj_perm(inventory, 'change_inventory')
+
+    team.users.clear()
+    assert not any(user.has_obj_perm(inventory, 'change_inventory') for user in users)
+    assert not member_rd.object_roles.exists()
+
+
+@pytest.mark.django_db
+def test_reverse_relationship_many_teams(rando, organization, member_rd):
+    teams = [Team.objects.create(name=f'tracked-team-{i}', organization=organization) for i in range(3)]
+    rando.teams.add(*teams)
+    assert all(rando.has_obj_perm(team, 'member_team') for team in teams)
+    assert member_rd.object_roles.count() == 3
+
+    rando.teams.remove(teams[0])
+    assert not rando.has_obj_perm(teams[0], 'member_team')
+    assert rando.has_obj_perm(teams[1], 'member_team')
+
+    rando.teams.clear()
+    assert not any(rando.has_obj_perm(team, 'member_team') for team in teams)
+    assert not member_rd.object_roles.exists()
+
+
+@pytest.mark.django_db
+def test_reverse_team_parents(rando, organization, member_rd):
+    parent_team = Team.objects.create(name='parent-team', organization=organization)
+    child_teams = [Team.objects.create(name=f'child-team-{i}', organization=organization) for i in range(2)]
+    member_rd.give_permission(rando, parent_team)
+
+    parent_team.team_children.add(*child_teams)
+    assert all(rando.has_obj_perm(team, 'member_team') for team in child_teams)
+
+    parent_team.team_children.clear()
+    assert not any(rando.has_obj_perm(team, 'member_team') for team in child_teams)
+
+
+@pytest.mark.django_db
+def test_tracker_role_definition_cached(team, rando, member_rd, django_assert_num_queries):
+    tracker = permission_registry._trackers[member_rd.name]
+    tracker.clear_role_definition()
+    assert tracker.get_role_definition() == member_rd
+    with django_assert_num_queries(1):
+        assert tracker.get_role_definition() == member_rd
+
+    member_rd.save()
+    assert tracker._role_definition_id is None
+
+
+@pytest.mark.django_db
+def test_tracker_role_definition_replaced_elsewhere(team, rando, member_rd):
+    tracker = permission_registry._trackers[member_rd.name]
+    assert tracker.get_role_definition() == member_rd
+    # like another process replacing the role definition, which does not send signals to this one
+    RoleDefinition.objects.filter(pk=member_rd.pk).update(name='old-team-member')
+    new_rd = RoleDefinition.objects.create(name=member_rd.name, content_type=member_rd.content_type)
+    new_rd.permissions.set(member_rd.permissions.all())
+    assert tracker.get_role_definition() == new_rd
+
+    team.users.add(rando)
+    assert RoleUserAssignment.objects.filter(role_definition=new_rd, user=rando).exists()
@@ -0,0 +1,152 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ansible_base.rbac import rbac_batch
+from ansible_base.rbac.caching import compute_object_role_permissions
+from ansible_base.rbac.models import RoleDefinition, RoleEvaluation, RoleEvaluationUUID, UserObjectPermission, UserObjectPermissionUUID
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.models import Inventory, Organization, Team, UUIDModel
+
+
+def user_evaluation_data():
+    data = set()
+    for user_eval_cls in (UserObjectPermission, UserObjectPermissionUUID):
+        data.update(user_eval_cls.objects.values_list('user_id', 'codename', 'content_type_id', 'object_id'))
+    return data
+
+
+def expected_user_evaluation_data():
+    "Same data as the per-user tables should have, obtained from the role evaluations"
+    data = set()
+    for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+        data.update(eval_cls.objects.filter(role__users__isnull=False).values_list('role__users', 'codename', 'content_type_id', 'object_id'))
+    return data
+
+
+@pytest.fixture
+def per_user():
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_PER_USER=True):
+        yield
+
+
+@pytest.fixture
+def org_uuid_rd():
+    return RoleDefinition.objects.create_from_permissions(
+        permissions=['view_organization', 'view_uuidmodel', 'change_uuidmodel', 'view_inventory'],
+        name='org-uuid-manager',
+        content_type=permission_registry.content_type_model.objects.get_for_model(Organization),
+    )
+
+
+@pytest.fixture
+def rbac_objects(rando, organization, team, inventory, member_rd, inv_rd, org_uuid_rd):
+    UUIDModel.objects.create(organization=organization)
+    member_rd.give_permission(rando, team)
+    org_uuid_rd.give_permission(team, organization)
+    inv_rd.give_permission(rando, inventory)
+
+
+@pytest.mark.django_db
+def test_entries_match_role_evaluations(per_user, rbac_objects, rando):
+    data = user_evaluation_data()
+    assert data == expected_user_evaluation_data()
+    assert any(entry[0] == rando.pk and entry[2] == permission_registry.content_type_model.objects.get_for_model(UUIDModel).id for entry in data)
+
+
+@pytest.mark.django_db
+def test_same_results(rbac_objects, rando, organization, inventory):
+    uuid_obj = UUIDModel.objects.first()
+    role_results = (set(Inventory.access_ids_qs(rando, 'change')), set(UUIDModel.access_qs(rando, 'change')), rando.has_obj_perm(uuid_obj, 'change'))
+    assert not UserObjectPermission.objects.exists()
+
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_PER_USER=True):
+        compute_object_role_permissions()
+        assert user_evaluation_data() == expected_user_evaluation_data()
+        assert (
+            set(Inventory.access_ids_qs(rando, 'change')),
+            set(UUIDModel.access_qs(rando, 'change')),
+            rando.has_obj_perm(uuid_obj, 'change'),
+        ) == role_results
+
+
+@pytest.mark.django_db
+def test_single_table_query(per_user, rbac_objects, rando, inventory):
+    with CaptureQueriesContext(connection) as captured:
+        assert list(Inventory.access_ids_qs(rando, 'change')) == [(inventory.pk,)]
+    sql = captured.captured_queries[-1]['sql']
+    assert 'userobjectpermission' in sql
+    assert 'roleuserassignment' not in sql
+    assert 'DISTINCT' not in sql
+
+
+@pytest.mark.django_db
+def test_assignment_changes(per_user, rando, inventory, inv_rd):
+    inv_rd.give_permission(rando, inventory)
+    assert UserObjectPermission.objects.filter(user=rando, object_id=inventory.pk, codename='change_inventory').exists()
+    assert rando.has_obj_perm(inventory, 'change')
+
+    inv_rd.remove_permission(rando, inventory)
+    assert not UserObjectPermission.objects.filter(user=rando).exists()
+    assert not rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_team_changes(per_user, rando, organization, inventory, inv_rd, member_rd):
+    team = Team.objects.create(name='per-user-team', organization=organization)
+    inv_rd.give_permission(team, inventory)
+    member_rd.give_permission(rando, team)
+    assert rando.has_obj_perm(inventory, 'change')
+
+    inv_rd.remove_permission(team, inventory)
+    assert not rando.has_obj_perm(inventory, 'change')
+    assert user_evaluation_data() == expected_user_evaluation_data()
+
+    inv_rd.give_permission(team, inventory)
+    team.delete()
+    assert not rando.has_obj_perm(inventory, 'change')
+    assert user_evaluation_data() == expected_user_evaluation_data()
+
+
+@pytest.mark.django_db
+def test_object_deletion(per_user, rbac_objects, rando, organization, inventory):
+    inv_ct = permission_registry.content_type_model.objects.get_for_model(inventory)
+    assert UserObjectPermission.objects.filter(content_type_id=inv_ct.id, object_id=inventory.pk).exists()
+    inventory.delete()
+    assert not UserObjectPermission.objects.filter(content_type_id=inv_ct.id, object_id=inventory.pk).exists()
+    assert user_evaluation_data() == expected_user_evaluation_data()
+
+    organization.delete()
+    assert user_evaluation_data() == expected_user_evaluation_data()
+
+
+@pytest.mark.django_db
+def test_role_definition_deletion(per_user, rando, inventory, inv_rd):
+    inv_rd.give_permission(rando, inventory)
+    assert UserObjectPermission.objects.filter(user=rando).exists()
+    inv_rd.delete()
+    assert not UserObjectPermission.objects.filter(user=rando).exists()
+    rando = permission_registry.user_model.objects.get(pk=rando.pk)
+    assert not rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_team_role_definition_deletion(per_user, rando, team, inventory, inv_rd, member_rd):
+    inv_rd.give_permission(team, inventory)
+    member_rd.give_permission(rando, team)
+    assert rando.has_obj_perm(inventory, 'change')
+    inv_rd.delete()
+    assert user_evaluation_data() == expected_user_evaluation_data()
+    assert not RoleEvaluation.objects.filter(role__users=rando, codename='change_inventory').exists()
+    rando = permission_registry.user_model.objects.get(pk=rando.pk)
+    assert not rando.has_obj_perm(inventory, 'change')
+
+
+@pytest.mark.django_db
+def test_batch_defers_user_updates(per_user, rando, inventory, inv_rd):
+    inv_rd.give_permission(rando, inventory)
+    with rbac_batch():
+        inv_rd.remove_permission(rando, inventory)
+        # the per-user evaluations are updated with the other updates when the batch exits
+        assert UserObjectPermission.objects.filter(user=rando).exists()
+    assert not UserObjectPermission.objects.filter(user=rando).exists()
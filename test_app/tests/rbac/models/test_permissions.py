@@ -1,6 +1,9 @@
 import pytest
 from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from ansible_base.rbac.models import DABPermission, clear_permission_ids, get_permission_ids
 from test_app.models import Inventory, ProxyInventory
 
 
@@ -10,3 +13,15 @@ def test_inventory_permissions_duplicated():
     view_inv_perms = Permission.objects.filter(codename='view_inventory')
     assert view_inv_perms.count() == 2
     assert set(perm.content_type.model_class() for perm in view_inv_perms) == set([Inventory, ProxyInventory])
+
+
+@pytest.mark.django_db
+def test_permission_ids_missing_codename():
+    clear_permission_ids()
+    assert get_permission_ids('view_inventory') == list(DABPermission.objects.filter(codename='view_inventory').order_by('id').values_list('id', flat=True))
+    assert get_permission_ids('not_a_permission') == []
+    # the mapping is not loaded again for codenames already found missing
+    with CaptureQueriesContext(connection) as captured:
+        assert get_permission_ids('not_a_permission') == []
+        assert get_permission_ids('view_inventory')
+    assert len(captured.captured_queries) == 0
@@ -1,11 +1,13 @@
+import logging
+
 import pytest
 from django.contrib.contenttypes.models import ContentType
 from rest_framework.exceptions import ValidationError
 
-from ansible_base.rbac import permission_registry
+from ansible_base.rbac import permission_registry, triggers
 from ansible_base.rbac.models import DABPermission, ObjectRole, RoleDefinition, RoleEvaluation
 from ansible_base.rbac.validators import validate_permissions_for_model
-from test_app.models import ExampleEvent, Organization
+from test_app.models import ExampleEvent, Inventory, Organization
 
 
 @pytest.mark.django_db
@@ -106,3 +108,20 @@ def test_change_role_definition_member_permission(organization, inventory, org_t
     # Adding it back restores them
     member_rd.permissions.add(member_perm)
     assert [u.has_obj_perm(inventory, 'change') for u in (team_user, org_team_user)] == [True, True]
+
+
+@pytest.mark.django_db
+def test_change_role_definition_permission_batches(organization, inv_rd, caplog, monkeypatch):
+    monkeypatch.setattr(triggers, 'ROLE_CHANGE_BATCH_SIZE', 2)
+    users = []
+    for i in range(5):
+        inventory = Inventory.objects.create(name=f'batch-inv-{i}', organization=organization)
+        user = permission_registry.user_model.objects.create(username=f'batch-user-{i}')
+        inv_rd.give_permission(user, inventory)
+        users.append((user, inventory))
+
+    with caplog.at_level(logging.INFO, logger='ansible_base.rbac.triggers'):
+        inv_rd.permissions.add(permission_registry.permission_qs.get(codename='delete_inventory'))
+    assert all(user.has_obj_perm(inventory, 'delete') for user, inventory in users)
+    progress = [record.getMessage() for record in caplog.records if record.getMessage().startswith('Updated permissions for')]
+    assert progress == [f'Updated permissions for {done} of 5 object roles of role definition {inv_rd.name}' for done in (2, 4, 5)]
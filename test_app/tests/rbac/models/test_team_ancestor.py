@@ -0,0 +1,70 @@
+import pytest
+
+from ansible_base.rbac.caching import compute_team_member_roles
+from ansible_base.rbac.models import ObjectRole, TeamAncestor
+from test_app.models import Team
+
+
+def ancestor_data():
+    return set(TeamAncestor.objects.values_list('team_id', 'ancestor_team_id', 'depth'))
+
+
+@pytest.fixture
+def team_chain(organization):
+    return [Team.objects.create(name=f'chain-team-{i}', organization=organization) for i in range(4)]
+
+
+@pytest.mark.django_db
+def test_team_ancestor_chain(team_chain, member_rd):
+    for parent_team, child_team in zip(team_chain[:-1], team_chain[1:]):
+        member_rd.give_permission(parent_team, child_team)
+
+    assert set(TeamAncestor.objects.filter(team=team_chain[3]).values_list('ancestor_team_id', 'depth')) == {
+        (team_chain[2].id, 1),
+        (team_chain[1].id, 2),
+        (team_chain[0].id, 3),
+    }
+    assert set(TeamAncestor.objects.filter(ancestor_team=team_chain[0]).values_list('team_id', flat=True)) == {team.id for team in team_chain[1:]}
+
+    # break the chain in the middle
+    member_rd.remove_permission(team_chain[1], team_chain[2])
+    assert set(TeamAncestor.objects.filter(team=team_chain[3]).values_list('ancestor_team_id', 'depth')) == {(team_chain[2].id, 1)}
+
+    # A shortcut link should give the shortest depth
+    member_rd.give_permission(team_chain[0], team_chain[2])
+    assert set(TeamAncestor.objects.filter(team=team_chain[3]).values_list('ancestor_team_id', 'depth')) == {(team_chain[2].id, 1), (team_chain[0].id, 2)}
+
+
+@pytest.mark.django_db
+def test_team_ancestor_loop(team_chain, member_rd):
+    for parent_team, child_team in zip(team_chain, team_chain[1:] + team_chain[:1]):
+        member_rd.give_permission(parent_team, child_team)
+
+    assert TeamAncestor.objects.filter(team=team_chain[0], ancestor_team=team_chain[0], depth=4).exists()
+    assert TeamAncestor.objects.count() == 16
+
+    team_chain[2].delete()
+    assert not TeamAncestor.objects.filter(ancestor_team_id=team_chain[1].id, team_id=team_chain[3].id).exists()
+
+
+@pytest.mark.django_db
+def test_team_ancestor_incremental_matches_global(organization, team_chain, member_rd, org_team_member_rd):
+    member_rd.give_permission(team_chain[0], team_chain[1])
+    member_rd.give_permission(team_chain[1], team_chain[2])
+    # team gets membership to all teams in the organization, including itself
+    org_assignment = org_team_member_rd.give_permission(team_chain[3], organization)
+    member_rd.give_permission(team_chain[2], team_chain[3])
+
+    incremental_data = ancestor_data()
+    assert (team_chain[2].id, team_chain[3].id, 1) in incremental_data
+    assert (team_chain[3].id, team_chain[0].id, 3) in incremental_data
+
+    TeamAncestor.objects.all().delete()
+    compute_team_member_roles()
+    assert ancestor_data() == incremental_data
+
+    org_team_member_rd.remove_permission(team_chain[3], organization)
+    assert not ObjectRole.objects.filter(id=org_assignment.object_role_id).exists()
+    incremental_data = ancestor_data()
+    compute_team_member_roles()
+    assert ancestor_data() == incremental_data
@@ -2,9 +2,12 @@ from io import StringIO
 
 import pytest
 from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
 
-from ansible_base.rbac.management.commands.RBAC_checks import Command
-from ansible_base.rbac.models import ObjectRole, RoleDefinition
+from ansible_base.rbac.management.commands.RBAC_checks import Command, histogram
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, UserObjectPermission
 from test_app.models import Inventory
 
 
@@ -26,3 +29,91 @@ def test_role_definition_wrong_model(organization):
     rd, _ = RoleDefinition.objects.get_or_create(name='foo-def', permissions=['view_organization'])
     orole = ObjectRole.objects.create(object_id=inventory.id, content_type=ContentType.objects.get_for_model(inventory), role_definition=rd)
     assert f"Object role {orole} has permission view_organization for an unlike content type" in run_and_get_output()
+
+
+def run_command(*args):
+    out = StringIO()
+    try:
+        call_command('RBAC_checks', *args, stdout=out)
+    except CommandError:
+        return (out.getvalue(), False)
+    return (out.getvalue(), True)
+
+
+@pytest.fixture
+def out_of_date_role(rando, organization, inventory, org_inv_rd):
+    assignment = org_inv_rd.give_permission(rando, organization)
+    RoleEvaluation.objects.filter(role=assignment.object_role, codename='change_inventory').delete()
+    return assignment.object_role
+
+
+@pytest.mark.django_db
+def test_out_of_date_evaluations(out_of_date_role, rando, inventory):
+    output, success = run_command()
+    assert not success
+    assert f'Object role {out_of_date_role} does not have up-to-date role evaluations cached' in output
+    assert '(1 missing, 0 extra)' in output
+    assert not rando.has_obj_perm(inventory, 'change')
+
+    output, success = run_command('--repair', '--batch-size=1')
+    assert success, output
+    assert 'Repaired 1 object roles, added 1 and deleted 0 role evaluations' in output
+    assert rando.has_obj_perm(inventory, 'change')
+    assert run_command()[1]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_out_of_date_evaluations_workers(multiprocess_db, out_of_date_role, rando, inventory):
+    output, success = run_command('--workers=2')
+    assert not success
+    assert f'Object role {out_of_date_role} does not have up-to-date role evaluations cached' in output
+
+    output, success = run_command('--workers=2', '--repair')
+    assert success, output
+    assert 'Repaired 1 object roles, added 1 and deleted 0 role evaluations' in output
+    assert rando.has_obj_perm(inventory, 'change')
+    assert run_command('--workers=2')[1]
+
+
+@pytest.mark.django_db
+def test_orphaned_roles(rando, organization, inventory, inv_rd):
+    assignment = inv_rd.give_permission(rando, inventory)
+    # delete the inventory without sending signals
+    Inventory.objects.filter(pk=inventory.pk)._raw_delete(using='default')
+
+    output, success = run_command()
+    assert not success
+    assert f'Object role {assignment.object_role} has been orphaned' in output
+    assert ObjectRole.objects.filter(pk=assignment.object_role_id).exists()
+
+    output, success = run_command('--repair')
+    assert success, output
+    assert 'Deleted 1 orphaned object roles' in output
+    assert not ObjectRole.objects.filter(pk=assignment.object_role_id).exists()
+
+
+@pytest.mark.django_db
+def test_orphaned_roles_per_user(rando, organization, inventory, inv_rd):
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_PER_USER=True):
+        inv_rd.give_permission(rando, inventory)
+        Inventory.objects.filter(pk=inventory.pk)._raw_delete(using='default')
+        assert UserObjectPermission.objects.filter(user=rando).exists()
+
+        output, success = run_command('--repair')
+        assert success, output
+        assert not UserObjectPermission.objects.filter(user=rando).exists()
+
+
+@pytest.mark.django_db
+def test_scale_metrics(rando, organization, inventory, org_inv_rd, inv_rd):
+    org_inv_rd.give_permission(rando, organization)
+    inv_rd.give_permission(rando, inventory)
+    output, success = run_command()
+    assert success, output
+    evaluation_ct = RoleEvaluation.objects.count()
+    assert f'2 object roles, {evaluation_ct} role evaluations' in output
+    assert '1-9: 2 roles' in output
+
+
+def test_histogram():
+    assert histogram({1: 0, 2: 5, 3: 12, 4: 999}, 6) == [('0', 3), ('1-9', 1), ('10-99', 1), ('100-999', 1)]
@@ -0,0 +1,84 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from ansible_base.rbac.management.commands.rebuild_rbac_evaluations import get_partitions
+from ansible_base.rbac.models import ObjectRole, RoleEvaluation
+from test_app.models import Inventory
+
+
+def evaluation_data():
+    return set(RoleEvaluation.objects.values_list('role_id', 'codename', 'content_type_id', 'object_id'))
+
+
+@pytest.fixture
+def many_roles(rando, organization, inv_rd, org_inv_rd, member_rd, team):
+    for i in range(5):
+        inventory = Inventory.objects.create(name=f'rebuild-inv-{i}', organization=organization)
+        inv_rd.give_permission(rando, inventory)
+    org_inv_rd.give_permission(team, organization)
+    member_rd.give_permission(rando, team)
+
+
+@pytest.mark.django_db
+def test_get_partitions(many_roles):
+    role_ids = sorted(ObjectRole.objects.values_list('id', flat=True))
+    partitions = get_partitions(3)
+    assert len(partitions) == 3
+    assert partitions[0][0] == role_ids[0]
+    assert partitions[-1][1] == role_ids[-1]
+    for prior, partition in zip(partitions, partitions[1:]):
+        assert partition[0] == prior[1] + 1
+
+
+@pytest.mark.django_db
+def test_get_partitions_no_roles():
+    assert get_partitions(4) == []
+
+
+@pytest.mark.django_db
+def test_rebuild_evaluations(many_roles, tmp_path):
+    expected = evaluation_data()
+    RoleEvaluation.objects.all().delete()
+
+    out = StringIO()
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+    call_command('rebuild_rbac_evaluations', '--partitions=3', '--batch-size=2', f'--checkpoint={checkpoint_path}', stdout=out)
+    assert evaluation_data() == expected
+    assert f'Rebuilt evaluations for {ObjectRole.objects.count()} object roles, added {len(expected)} and deleted 0 evaluations' in out.getvalue()
+    assert 'rows/second' in out.getvalue()
+
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    assert sorted(checkpoint['completed']) == sorted(checkpoint['partitions'])
+
+
+@pytest.mark.django_db
+def test_rebuild_evaluations_resume(many_roles, tmp_path):
+    partitions = get_partitions(2)
+    checkpoint_path = tmp_path / 'checkpoint.json'
+    checkpoint_path.write_text(json.dumps({'partitions': partitions, 'completed': [partitions[0]]}))
+    RoleEvaluation.objects.all().delete()
+
+    out = StringIO()
+    call_command('rebuild_rbac_evaluations', f'--checkpoint={checkpoint_path}', '--resume', stdout=out)
+    assert 'Resuming with 1 of 2 id ranges already finished' in out.getvalue()
+    # roles in the finished range were skipped
+    assert not RoleEvaluation.objects.filter(role_id__lte=partitions[0][1]).exists()
+    assert RoleEvaluation.objects.filter(role_id__gte=partitions[1][0]).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rebuild_evaluations_workers(multiprocess_db, many_roles):
+    expected = evaluation_data()
+    RoleEvaluation.objects.filter(codename='change_inventory').delete()
+    missing_ct = len(expected) - len(evaluation_data())
+    stale_role = ObjectRole.objects.first()
+    RoleEvaluation.objects.create(role=stale_role, codename='delete_inventory', content_type_id=stale_role.content_type_id, object_id=0)
+
+    out = StringIO()
+    call_command('rebuild_rbac_evaluations', '--workers=2', '--batch-size=2', stdout=out)
+    assert evaluation_data() == expected
+    assert f'added {missing_ct} and deleted 1 evaluations' in out.getvalue()
@@ -2,8 +2,8 @@ import pytest
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
 
-from ansible_base.rbac.migrations._utils import give_permissions
-from ansible_base.rbac.models import DABPermission, RoleTeamAssignment, RoleUserAssignment
+from ansible_base.rbac.migrations._utils import backfill_evaluation_permissions, give_permissions
+from ansible_base.rbac.models import DABPermission, RoleEvaluation, RoleTeamAssignment, RoleUserAssignment
 from ansible_base.rbac.permission_registry import permission_registry
 from test_app.models import Team, User
 
@@ -28,3 +28,15 @@ def test_give_permissions_by_id(organization, inventory, inv_rd):
 def test_permission_migration():
     "These are expected to be created via a post_migrate signal just like auth.Permission"
     assert len(DABPermission.objects.order_by('content_type').values_list('content_type').distinct()) == len(permission_registry.all_registered_models)
+
+
+@pytest.mark.django_db
+def test_backfill_evaluation_permissions(rando, inventory, inv_rd):
+    inv_rd.give_permission(rando, inventory)
+    expected = set(RoleEvaluation.objects.values_list('id', 'permission_id'))
+    RoleEvaluation.objects.update(permission=None)
+
+    backfill_evaluation_permissions(apps, None)
+    assert set(RoleEvaluation.objects.values_list('id', 'permission_id')) == expected
+    for evaluation in RoleEvaluation.objects.select_related('permission'):
+        assert evaluation.permission.codename == evaluation.codename
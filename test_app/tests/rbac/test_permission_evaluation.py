@@ -28,6 +28,20 @@ def test_org_inv_permissions_user(rando, inventory, org_inv_change_rd):
     assert list(Inventory.access_qs(rando)) == [inventory]
 
 
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_EVALUATIONS_USE_PERMISSION_ID=True)
+def test_evaluations_by_permission_id(rando, inventory, org_inv_change_rd):
+    org_inv_change_rd.give_permission(rando, inventory.organization)
+    assert not RoleEvaluation.objects.filter(permission__isnull=True).exists()
+    change_inventory = permission_registry.permission_qs.get(codename='change_inventory')
+    assert RoleEvaluation.objects.filter(permission=change_inventory, object_id=inventory.id).exists()
+
+    assert rando.has_obj_perm(inventory, 'change_inventory')
+    assert not rando.has_obj_perm(inventory, 'delete_inventory')
+    assert set(Inventory.access_qs(rando, 'change')) == set([inventory])
+    assert list(Inventory.access_qs(rando, 'delete')) == []
+
+
 @pytest.mark.django_db
 def test_org_inv_permissions_team(team, inventory, org_inv_change_rd):
     "We support using team as actor in model methods like MyModel.access_qs(team) but do not attach has_obj_perm"
@@ -112,6 +126,24 @@ def test_visible_items():
     assert set(RoleUserAssignment.visible_items(u3)) == set([inv_1])
 
 
+@pytest.mark.django_db
+def test_visible_items_system_role(rando, inventory, org_inv_rd, django_assert_num_queries):
+    org_assignment = org_inv_rd.give_permission(rando, inventory.organization)
+    other_user = permission_registry.user_model.objects.create(username='other-user')
+    other_org = Organization.objects.create(name='other-org')
+    other_assignment = org_inv_rd.give_permission(other_user, other_org)
+    inv_auditor = RoleDefinition.objects.create_from_permissions(permissions=['view_inventory'], name='inventory-auditor', content_type=None)
+    global_assignment = inv_auditor.give_global_permission(rando)
+
+    rando.singleton_permissions()  # answered from the user object, or shared role cache, after this
+    with django_assert_num_queries(1):
+        visible = set(RoleUserAssignment.visible_items(rando))
+    # all inventory assignments and global assignments are visible, but not other organization assignments
+    assert org_assignment in visible
+    assert global_assignment in visible
+    assert other_assignment not in visible
+
+
 @pytest.mark.django_db
 @override_settings(ANSIBLE_BASE_BYPASS_SUPERUSER_FLAGS=['is_superuser'])
 def test_superuser_can_do_anything(inventory):
@@ -139,3 +171,55 @@ def test_superuser_flag_not_considered(inventory):
 )
 def test_is_add_perm(codename, expect):
     assert is_add_perm(codename) is expect
+
+
+@pytest.mark.django_db
+def test_has_obj_perms(rando, organization, inv_rd, django_assert_num_queries):
+    inventories = [Inventory.objects.create(name=f'bulk-check-{i}', organization=organization) for i in range(4)]
+    for inventory in inventories[:2]:
+        inv_rd.give_permission(rando, inventory)
+    rando.singleton_permissions()  # cached on the user separately
+
+    with django_assert_num_queries(1):
+        assert rando.has_obj_perms(inventories, 'change') == {inv.pk: bool(i < 2) for i, inv in enumerate(inventories)}
+    # results are saved for later has_obj_perm calls
+    with django_assert_num_queries(0):
+        assert rando.has_obj_perm(inventories[0], 'change')
+        assert not rando.has_obj_perm(inventories[3], 'change')
+
+
+@pytest.mark.django_db
+def test_has_obj_perms_superuser(admin_user, organization):
+    inventories = [Inventory.objects.create(name=f'bulk-check-{i}', organization=organization) for i in range(2)]
+    assert admin_user.has_obj_perms(inventories, 'delete') == {inv.pk: True for inv in inventories}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('storage', ['object', 'parent'])
+def test_get_permissions_bulk(rando, organization, inv_rd, org_inv_change_rd, storage):
+    other_org = Organization.objects.create(name='bulk-perms-org')
+    inventories = [Inventory.objects.create(name=f'bulk-perms-{i}', organization=org) for i, org in enumerate([organization, organization, other_org])]
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_STORAGE=storage):
+        org_inv_change_rd.give_permission(rando, organization)
+        inv_rd.give_permission(rando, inventories[2])
+        permissions = rando.get_permissions_bulk(inventories)
+        for obj in inventories:
+            assert permissions[obj.pk] == set(RoleEvaluation.get_permissions(rando, obj)), obj
+        assert rando.get_permissions_bulk([organization])[organization.pk] == set(RoleEvaluation.get_permissions(rando, organization))
+    assert permissions[inventories[0].pk] == {'change_inventory', 'view_inventory'}
+
+
+@pytest.mark.django_db
+def test_bulk_methods_mixed_models(rando, organization, inventory):
+    # results are keyed by pk, which objects of different models can share
+    with pytest.raises(RuntimeError, match='same model'):
+        rando.has_obj_perms([organization, inventory], 'view')
+    with pytest.raises(RuntimeError, match='same model'):
+        rando.get_permissions_bulk([organization, inventory])
+
+
+@pytest.mark.django_db
+def test_get_permissions_bulk_superuser(admin_user, inventory):
+    permissions = admin_user.get_permissions_bulk([inventory])
+    assert {'change_inventory', 'delete_inventory', 'view_inventory'} <= permissions[inventory.pk]
+    assert 'add_inventory' not in permissions[inventory.pk]
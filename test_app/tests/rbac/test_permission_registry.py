@@ -0,0 +1,61 @@
+import pytest
+from django.contrib.contenttypes.models import ContentType
+
+from ansible_base.lib.utils.models import is_add_perm
+from ansible_base.rbac.models import DABPermission
+from ansible_base.rbac.permission_registry import model_codenames, permission_registry
+from ansible_base.rbac.validators import codenames_allowed_for_role, combine_values, permissions_allowed_for_role, validate_codename_for_model
+from test_app.models import CollectionImport, Inventory, Organization, User
+
+
+def test_index_matches_model_metadata():
+    for cls in permission_registry.all_registered_models:
+        assert permission_registry.get_child_models(cls) == permission_registry.walk_child_models(cls)
+        assert permission_registry.get_parent_paths(cls) == permission_registry.walk_parent_paths(cls)
+        assert list(permission_registry.get_codenames(cls)) == model_codenames(cls)
+
+
+def test_allowed_permissions_from_index():
+    for cls in permission_registry.all_registered_models:
+        expected = {cls: [codename for codename in model_codenames(cls) if not is_add_perm(codename)]}
+        for path, child_cls in permission_registry.walk_child_models(cls):
+            expected[child_cls] = model_codenames(child_cls)
+        assert dict(permissions_allowed_for_role(cls)) == expected
+        assert codenames_allowed_for_role(cls) == combine_values(expected)
+
+    system_codenames = codenames_allowed_for_role(None)
+    assert 'view_team' in system_codenames
+    assert 'member_team' not in system_codenames
+    assert 'change_inventory' in system_codenames
+
+
+def test_allowed_permissions_copy():
+    permissions_allowed_for_role(Organization)[Organization].append('fake_codename')
+    assert 'fake_codename' not in permissions_allowed_for_role(Organization)[Organization]
+    with pytest.raises(TypeError):
+        permission_registry.index.child_models['organization'] = ()
+
+
+def test_is_registered():
+    assert permission_registry.is_registered(Inventory)
+    assert permission_registry.is_registered(Inventory(name='foo'))
+    assert not permission_registry.is_registered(User)
+
+
+def test_validate_codename_from_index():
+    assert validate_codename_for_model('view', Inventory) == 'view_inventory'
+    assert validate_codename_for_model('test_app.view_collectionimport', Organization) == 'view_collectionimport'
+    assert validate_codename_for_model('add_namespace', Organization) == 'add_namespace'
+    with pytest.raises(RuntimeError):
+        validate_codename_for_model('view_collectionimport', Inventory)
+    with pytest.raises(RuntimeError):
+        validate_codename_for_model('view_organization', CollectionImport)
+
+
+@pytest.mark.django_db
+def test_content_type_ids(django_assert_num_queries):
+    permission_registry.clear_database_ids()
+    assert permission_registry.content_type_id(Inventory) == ContentType.objects.get_for_model(Inventory).id
+    with django_assert_num_queries(0):
+        assert permission_registry.content_type_id(Inventory(name='foo')) == ContentType.objects.get_for_model(Inventory).id
+    assert set(permission_registry.permission_qs.values_list('id', flat=True)) == set(DABPermission.objects.values_list('id', flat=True))
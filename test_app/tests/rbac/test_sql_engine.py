@@ -0,0 +1,108 @@
+import pytest
+from django.test.utils import override_settings
+
+from ansible_base.rbac.caching import compute_object_role_permissions
+from ansible_base.rbac.models import ObjectRole, RoleDefinition, RoleEvaluation, RoleEvaluationUUID
+from ansible_base.rbac.permission_registry import permission_registry
+from test_app.models import CollectionImport, Inventory, Namespace, Organization, Team, UUIDModel
+
+
+def evaluation_data():
+    data = set()
+    for eval_cls in (RoleEvaluation, RoleEvaluationUUID):
+        data.update(eval_cls.objects.values_list('role_id', 'codename', 'content_type_id', 'object_id'))
+    return data
+
+
+@pytest.fixture
+def org_everything_rd():
+    return RoleDefinition.objects.create_from_permissions(
+        permissions=[
+            'view_organization',
+            'view_inventory',
+            'change_inventory',
+            'add_uuidmodel',
+            'view_uuidmodel',
+            'view_namespace',
+            'add_collectionimport',
+            'view_collectionimport',
+        ],
+        name='org-everything',
+        content_type=permission_registry.content_type_model.objects.get_for_model(Organization),
+    )
+
+
+@pytest.fixture
+def rbac_objects(rando, org_everything_rd, member_rd, inv_rd):
+    orgs = [Organization.objects.create(name=f'sql-org-{i}') for i in range(2)]
+    teams = [Team.objects.create(name=f'sql-team-{i}', organization=orgs[i]) for i in range(2)]
+    for org in orgs:
+        for i in range(3):
+            Inventory.objects.create(name=f'inv-{i}', organization=org)
+            UUIDModel.objects.create(organization=org)
+            namespace = Namespace.objects.create(name=f'{org.name}-namespace-{i}', organization=org)
+            CollectionImport.objects.create(name=f'{namespace.name}-collection', namespace=namespace)
+    member_rd.give_permission(rando, teams[0])
+    member_rd.give_permission(teams[0], teams[1])
+    org_everything_rd.give_permission(teams[1], orgs[0])
+    org_everything_rd.give_permission(rando, orgs[1])
+    inv_rd.give_permission(teams[0], Inventory.objects.filter(organization=orgs[1]).first())
+    return orgs
+
+
+@pytest.mark.django_db
+def test_sql_engine_matches_python_engine(rbac_objects):
+    python_data = evaluation_data()
+    assert len(python_data) > 50  # sanity
+    assert any(isinstance(entry[3], type(UUIDModel.objects.first().pk)) for entry in python_data)
+
+    RoleEvaluation.objects.all().delete()
+    RoleEvaluationUUID.objects.all().delete()
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_ENGINE='sql'):
+        compute_object_role_permissions()
+    assert evaluation_data() == python_data
+
+
+@pytest.mark.django_db
+def test_sql_engine_removes_stale_entries(rbac_objects):
+    python_data = evaluation_data()
+    role = ObjectRole.objects.filter(content_type_id=permission_registry.org_ct_id).first()
+    inv_ct = permission_registry.content_type_model.objects.get_for_model(Inventory)
+    RoleEvaluation.objects.create(role=role, codename='delete_inventory', content_type_id=inv_ct.id, object_id=Inventory.objects.first().id)
+    RoleEvaluation.objects.create(role=role, codename='view_inventory', content_type_id=inv_ct.id, object_id=Inventory.objects.order_by('-id').first().id + 100)
+    RoleEvaluation.objects.filter(role=role, codename='view_organization').delete()
+    assert evaluation_data() != python_data
+
+    with override_settings(ANSIBLE_BASE_EVALUATIONS_ENGINE='sql'):
+        compute_object_role_permissions()
+    assert evaluation_data() == python_data
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_EVALUATIONS_ENGINE='sql')
+def test_sql_engine_assignment_flow(rando, organization, org_everything_rd):
+    inventory = Inventory.objects.create(name='inv', organization=organization)
+    uuid_obj = UUIDModel.objects.create(organization=organization)
+    org_everything_rd.give_permission(rando, organization)
+    assert rando.has_obj_perm(inventory, 'change')
+    assert rando.has_obj_perm(uuid_obj, 'view')
+    assert rando.has_obj_perm(organization, 'add_uuidmodel')
+
+    other_org = Organization.objects.create(name='other-org')
+    inventory.organization = other_org
+    inventory.save()
+    assert not rando.has_obj_perm(inventory, 'change')
+
+    org_everything_rd.remove_permission(rando, organization)
+    assert not rando.has_obj_perm(uuid_obj, 'view')
+    assert not RoleEvaluationUUID.objects.exists()
+
+
+@pytest.mark.django_db
+@override_settings(ANSIBLE_BASE_EVALUATIONS_ENGINE='sql')
+def test_sql_engine_skips_deleted_roles(rando, inventory, inv_rd):
+    assignment = inv_rd.give_permission(rando, inventory)
+    object_role = assignment.object_role
+    ObjectRole.objects.filter(pk=object_role.pk).delete()
+    compute_object_role_permissions(object_roles=[object_role])
+    assert not RoleEvaluation.objects.exists()
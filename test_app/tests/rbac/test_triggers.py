@@ -2,12 +2,14 @@ from unittest.mock import MagicMock
 
 import pytest
 from django.apps import apps
-from django.test.utils import override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 
+from ansible_base.rbac.caching import compute_object_role_permissions, compute_team_member_roles
 from ansible_base.rbac.models import ObjectRole, RoleEvaluation, RoleTeamAssignment, RoleUserAssignment
 from ansible_base.rbac.permission_registry import permission_registry
 from ansible_base.rbac.triggers import dab_post_migrate, post_migration_rbac_setup
-from test_app.models import Inventory, Organization
+from test_app.models import Inventory, Organization, Team
 
 
 @pytest.mark.django_db
@@ -172,3 +174,55 @@ def test_delete_signals_team_organization(organization, inventory, team, org_inv
         assert not RoleEvaluation.objects.filter(**org_gfk).exists()
 
     assert not RoleEvaluation.objects.filter(**inv_gfk).exists()
+
+
+@pytest.mark.django_db
+def test_incremental_team_member_roles(rando, member_rd):
+    orgs = [Organization.objects.create(name=f'org-{i}') for i in range(2)]
+    teams = [[Team.objects.create(name=f'team-{i}-{j}', organization=orgs[i]) for j in range(3)] for i in range(2)]
+    for org_teams in teams:
+        member_rd.give_permission(org_teams[0], org_teams[1])
+        member_rd.give_permission(org_teams[1], org_teams[2])
+    assignment = member_rd.give_permission(rando, teams[0][0])
+    assert set(assignment.object_role.provides_teams.all()) == set(teams[0])
+
+    # Mess up data of the unrelated organization, incremental update should not touch it
+    other_role = ObjectRole.objects.get(content_type_id=permission_registry.team_ct_id, object_id=teams[1][1].id)
+    teams[1][2].member_roles.remove(other_role)
+
+    teams[0][2].member_roles.clear()
+    compute_team_member_roles(object_roles=[assignment.object_role])
+    assert assignment.object_role in teams[0][2].member_roles.all()
+    assert other_role not in teams[1][2].member_roles.all()
+
+    # Global recompute fixes everything
+    compute_team_member_roles()
+    assert other_role in teams[1][2].member_roles.all()
+
+
+@pytest.mark.django_db
+def test_recompute_queries_do_not_scale_with_roles(rando, team, member_rd, org_inv_rd):
+    member_rd.give_permission(rando, team)
+
+    def add_org(i):
+        org = Organization.objects.create(name=f'query-org-{i}')
+        for j in range(2):
+            Inventory.objects.create(name=f'query-inv-{i}-{j}', organization=org)
+        org_inv_rd.give_permission(rando, org)
+        org_inv_rd.give_permission(team, org)
+
+    def count_rebuild_queries():
+        expected = set(RoleEvaluation.objects.values_list('role_id', 'codename', 'object_id'))
+        RoleEvaluation.objects.all().delete()
+        with CaptureQueriesContext(connection) as ctx:
+            compute_object_role_permissions()
+        assert set(RoleEvaluation.objects.values_list('role_id', 'codename', 'object_id')) == expected
+        return len(ctx.captured_queries)
+
+    for i in range(2):
+        add_org(i)
+    small_ct = count_rebuild_queries()
+
+    for i in range(2, 8):
+        add_org(i)
+    assert count_rebuild_queries() == small_ct
@@ -0,0 +1,35 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from test_app.models import Organization
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'command,args,expected',
+    [
+        ('benchmark_access_qs', ['--organizations=3', '--inventories=4', '--explain'], ['in: 8 objects', 'exists: 8 objects']),
+        # the admin of organizations 0 and 3 sees their 6 members, and the admin
+        ('benchmark_visible_users', ['--organizations=4', '--users=3', '--explain'], ['combined: 7 users', 'semi-join: 7 users']),
+        (
+            'benchmark_rbac',
+            ['--organizations=2', '--objects=3', '--team-depth=2', '--users-per-team=1'],
+            ['"rebuild_rbac_evaluations"', '"has_obj_perm_uuidmodel"'],
+        ),
+    ],
+)
+def test_benchmark_command(command, args, expected):
+    out = StringIO()
+    call_command(command, '--repeat=1', *args, stdout=out)
+    output = out.getvalue()
+    for text in expected:
+        assert text in output
+    if command == 'benchmark_rbac':
+        data = json.loads(output)
+        for result in data['results'].values():
+            assert result['runs'] == 1
+            assert result['queries'] > 0
+    assert not Organization.objects.filter(name__startswith='benchmark').exists()  # rolled back